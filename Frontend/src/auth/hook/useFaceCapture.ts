@@ -11,6 +11,10 @@ declare global {
 }
 
 export type PositionData = { x: number; y: number; scale: number }
+// Face box normalized (0-1) to the captured frame; lets the backend skip detection
+export type FaceBox = { x: number; y: number; width: number; height: number }
+
+const clamp01 = (v: number) => Math.min(1, Math.max(0, v))
 
 function computePositionFromBox(box: { xMin: number; yMin: number; xMax: number; yMax: number }, vw: number, vh: number): PositionData {
   const cx = (box.xMin + box.xMax) / 2 / vw
@@ -237,7 +241,7 @@ export function useFaceCapture() {
     return () => document.removeEventListener('visibilitychange', onVis)
   }, [faceReady])
 
-  function doCapture(): { imageB64: string; position: PositionData } | null {
+  function doCapture(): { imageB64: string; position: PositionData; box: FaceBox | null } | null {
     const v = videoRef.current
     const c = canvasRef.current
     const overlay = overlayRef.current
@@ -253,6 +257,7 @@ export function useFaceCapture() {
     const box = lastBoxRef.current
     // Map box (overlay coords) into normalized coords relative to visible content rectangle
     let position: PositionData = { x: 0.5, y: 0.5, scale: 0.25 }
+    let faceBox: FaceBox | null = null
     if (box) {
       const rect = v.getBoundingClientRect()
       const ovW = Math.max(1, Math.round(rect.width))
@@ -264,22 +269,32 @@ export function useFaceCapture() {
       const offsetY = (ovH - contentH) / 2
       const norm = { xMin: box.xMin - offsetX, yMin: box.yMin - offsetY, xMax: box.xMax - offsetX, yMax: box.yMax - offsetY }
       position = computePositionFromBox(norm as any, contentW, contentH)
+      const x = clamp01(norm.xMin / contentW)
+      const y = clamp01(norm.yMin / contentH)
+      faceBox = {
+        x,
+        y,
+        width: clamp01(norm.xMax / contentW) - x,
+        height: clamp01(norm.yMax / contentH) - y,
+      }
     }
-    return { imageB64, position }
+    return { imageB64, position, box: faceBox }
   }
 
   async function captureMulti(n = 5, delayMs = 220) {
     const frames: string[] = []
     const positions: PositionData[] = []
+    const boxes: (FaceBox | null)[] = []
     for (let i = 0; i < n; i++) {
       const shot = doCapture()
       if (shot) {
         frames.push(shot.imageB64)
         positions.push(shot.position)
+        boxes.push(shot.box)
       }
       if (i < n - 1) await new Promise((r) => setTimeout(r, delayMs))
     }
-    return { frames, positions }
+    return { frames, positions, boxes }
   }
 
   return { videoRef, canvasRef, overlayRef, ready, error, faceReady, status, capture: doCapture, captureMulti }
@@ -20,7 +20,7 @@ const FacialRecognitionView: React.FC<FacialRecognitionViewProps> = ({ isLoading
     if (!shot) return;
     try {
       setLocalLoading(true);
-      const resp = await loginFacial(shot.imageB64);
+      const resp = await loginFacial(shot.imageB64, shot.box);
       const tokens = resp?.tokens;
       const user = resp?.user;
       if (tokens?.access) {
@@ -1,4 +1,5 @@
 // Simple API client for backend facial auth
+import type { FaceBox } from '../auth/hook/useFaceCapture';
 
 const BASE_URL = (import.meta.env?.VITE_API_BASE as string) || 'http://127.0.0.1:8000/api';
 
@@ -24,10 +25,14 @@ export async function loginTraditional(email: string, password: string) {
   });
 }
 
-export async function loginFacial(imageB64: string) {
+export async function loginFacial(imageB64: string, faceBox?: FaceBox | null, dni?: string) {
   return request('/auth/facial-login/', {
     method: 'POST',
-    body: JSON.stringify({ facial_data: imageB64 }),
+    body: JSON.stringify({
+      facial_data: imageB64,
+      ...(faceBox ? { face_box: faceBox } : {}),
+      ...(dni ? { dni } : {}),
+    }),
   });
 }
 
@@ -38,11 +43,11 @@ export async function getProfile(accessToken: string) {
   });
 }
 
-export async function registerFacial(samples: string[], accessToken: string) {
+export async function registerFacial(samples: string[], accessToken: string, faceBoxes?: (FaceBox | null)[]) {
   return request('/auth/facial-register/', {
     method: 'POST',
     headers: { Authorization: `Bearer ${accessToken}` },
-    body: JSON.stringify({ facial_samples: samples }),
+    body: JSON.stringify({ facial_samples: samples, ...(faceBoxes ? { face_boxes: faceBoxes } : {}) }),
   });
 }
 
@@ -52,4 +57,12 @@ export async function checkPermission(permission: string, accessToken: string) {
     headers: { Authorization: `Bearer ${accessToken}` },
     body: JSON.stringify({ permission }),
   });
+}
+
+export async function checkPermissions(permissions: string[], accessToken: string) {
+  return request('/auth/permissions/', {
+    method: 'POST',
+    headers: { Authorization: `Bearer ${accessToken}` },
+    body: JSON.stringify({ permissions }),
+  });
 }
\ No newline at end of file
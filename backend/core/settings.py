@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -81,7 +82,9 @@ WSGI_APPLICATION = 'core.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        # DJANGO_DB_PATH permite apuntar a otra base (p. ej. la sembrada por
+        # `auth_load_test`) sin tocar este archivo
+        'NAME': os.environ.get('DJANGO_DB_PATH') or BASE_DIR / 'db.sqlite3',
     }
 }
 
@@ -133,7 +136,7 @@ AUTH_USER_MODEL = 'login_facial.Usuario'
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'login_facial.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -149,6 +152,80 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
 }
+# Caché por proceso de los usuarios autenticados por JWT (0 = desactivada);
+# se invalida al guardar/borrar un Usuario
+AUTH_USER_CACHE_SIZE = 4096
+AUTH_USER_CACHE_TTL = 30  # segundos
+# Segundos que se reutiliza el total aproximado del listado de usuarios (?count=1)
+USERS_COUNT_TTL = 60
+# Importación masiva de usuarios (CSV): filas por lote y procesos para
+# calcular los hashes de contraseña (0 = en el hilo de la petición)
+USERS_IMPORT_BATCH_SIZE = 1000
+USERS_IMPORT_WORKERS = 4
+# Filas máximas por importación vía API (se procesa dentro de la petición);
+# archivos mayores se importan con `manage.py import_users`
+USERS_IMPORT_MAX_ROWS = 5000
+
+# Reconocimiento facial
+# Segundos entre verificaciones de versión de la galería 1:N en memoria
+FACIAL_GALLERY_TTL = 30
+# Búsqueda 1:N: 'exact' (fuerza bruta vectorizada) o 'ivf' (aproximada)
+FACIAL_GALLERY_INDEX = 'exact'
+FACIAL_IVF_MIN_SIZE = 20000  # por debajo se usa búsqueda exacta
+FACIAL_IVF_NLIST = 0  # 0 = sqrt(n_muestras)
+FACIAL_IVF_NPROBE = 8
+# Directorio del snapshot en disco de la galería (facial_gallery_snapshot);
+# los workers lo mapean al arrancar si coincide con la versión en BD (None = sin snapshot)
+FACIAL_GALLERY_SNAPSHOT_DIR = None
+# Nombre de la galería en memoria compartida publicada por facial_gallery_owner
+# (un dueño por host; los workers la adjuntan en solo lectura). None = desactivada
+FACIAL_GALLERY_SHM_NAME = None
+# Pool de procesos para detección/encoding (0 = en el hilo de la petición)
+FACIAL_EMBEDDING_WORKERS = 0
+FACIAL_EMBEDDING_QUEUE_DEPTH = 8  # frames en espera además de los en proceso
+FACIAL_EMBEDDING_TIMEOUT = 10  # segundos
+# Caché de embeddings por hash del frame (0 = desactivada)
+FACIAL_EMBEDDING_CACHE_SIZE = 1024
+FACIAL_EMBEDDING_CACHE_TTL = 60  # segundos
+# Login facial 1:1 (con DNI o user_id): distancia máxima, más estricta que 1:N
+FACIAL_VERIFY_TOLERANCE = 0.5
+# Permitir login facial 1:N sin DNI. Activado por defecto en este proyecto
+# porque el frontend actual lo usa; sin este ajuste el código lo desactiva
+# y exige DNI o user_id (verificación 1:1)
+FACIAL_IDENTIFICATION_ENABLED = True
+# Pirámide de detección: decodificar reducido (1, 2, 4, 8) y/o limitar el
+# lado máximo de la imagen de detección (0 = sin límite). El encoding usa
+# siempre el recorte a resolución completa.
+FACIAL_DETECTION_SCALE = 1
+FACIAL_DETECTION_MAX_SIDE = 0
+# Cajas de rostro enviadas por el cliente: margen por lado (fracción de la
+# caja) y lado mínimo aceptado (fracción del lado menor del frame)
+FACIAL_BOX_HINT_PADDING = 0.1
+FACIAL_BOX_HINT_MIN_SIDE = 0.1
+# Tamaño máximo del cuerpo de las peticiones faciales (JSON, multipart u
+# octet-stream); se valida con Content-Length antes de parsear
+FACIAL_MAX_UPLOAD_BYTES = 5 * 1024 * 1024
+# Hilos para decodificar/detectar muestras de registro sin pool de procesos
+FACIAL_REGISTER_THREADS = 4
+# Auditoría de intentos faciales (SesionFacial) escrita en lotes por un hilo
+# de fondo; por encima de MAX_PENDING los intentos se descartan y se cuentan
+FACIAL_AUDIT_ENABLED = True
+FACIAL_AUDIT_BATCH_SIZE = 200
+FACIAL_AUDIT_FLUSH_INTERVAL = 1.0  # segundos
+FACIAL_AUDIT_MAX_PENDING = 10000
+# Control de admisión del trabajo de CPU de la autenticación (ver
+# login_facial/admission.py): cupos por pool (0 = núcleos del servidor), cola
+# máxima y plazo en segundos desde la llegada de la petición; si la espera
+# estimada lo excede se responde 429 con Retry-After
+AUTH_ADMISSION_ENABLED = True
+AUTH_HASH_CONCURRENCY = 0
+AUTH_HASH_QUEUE = 64
+AUTH_HASH_DEADLINE = 5.0
+AUTH_FACE_CONCURRENCY = 0
+AUTH_FACE_QUEUE = 32
+AUTH_FACE_DEADLINE = 8.0
+# IPs que pueden leer /api/metrics/ (formato Prometheus)
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
 
 # CORS Settings
 CORS_ALLOWED_ORIGINS = [
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from . import search
 from .models import Usuario, DatosFaciales, SesionFacial
 
 
@@ -27,6 +28,12 @@ class UsuarioAdmin(UserAdmin):
     )
     
     readonly_fields = ('created_at',)
+    
+    def get_search_results(self, request, queryset, search_term):
+        # Mismos campos que search_fields, resueltos con el índice de búsqueda
+        if not search_term.strip():
+            return queryset, False
+        return search.filter_queryset(queryset, search_term), False
 
 
 @admin.register(DatosFaciales)
@@ -0,0 +1,281 @@
+"""Control de admisión para el trabajo de CPU de la autenticación.
+
+El hash de contraseñas (login tradicional) y el cómputo de embeddings (login
+y registro facial) saturan la CPU. Sin límite, en una avalancha de logins
+todas las peticiones avanzan a la vez, ninguna termina a tiempo y todas
+vencen. Cada tipo de trabajo pasa por un `AdmissionPool` propio:
+
+- `concurrency` trabajos en curso como máximo (0 = núcleos del servidor).
+- Cola acotada (`queue`) ordenada por plazo (EDF): el plazo de cada trabajo
+  es la llegada de la petición (`request_started`) más `deadline` segundos;
+  una petición que ya consumió tiempo (p. ej. subiendo la imagen) pasa antes.
+- Rechazo rápido con `AdmissionRejected` (429 + `Retry-After`) si la cola está
+  llena o si la espera estimada (posición en cola x tiempo de servicio medio /
+  concurrencia) excede el plazo restante, o si el plazo vence esperando.
+
+Configuración por pool: `AUTH_HASH_*` y `AUTH_FACE_*` (`CONCURRENCY`, `QUEUE`,
+`DEADLINE`); `AUTH_ADMISSION_ENABLED = False` lo desactiva. La espera en cola
+se agrega a los `timings` de la vista (`hash_queue`, `face_queue`) y el
+estado de cada pool se expone como gauges en `/api/metrics/`.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from concurrent.futures import CancelledError, Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Optional
+
+from django.conf import settings
+
+from . import metrics
+
+# Llegada de la petición en curso (`time.monotonic()`), base de los plazos
+_request_started = contextvars.ContextVar('auth_request_started', default=None)
+
+
+class AdmissionRejected(Exception):
+    """El trabajo no se admitió a tiempo; reintentar en `retry_after` segundos."""
+
+    def __init__(self, pool: str, retry_after: float, reason: str):
+        super().__init__(f'{pool}: {reason}')
+        self.pool = pool
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.reason = reason
+
+
+@contextmanager
+def request_started(at: Optional[float] = None):
+    """Marca la llegada de la petición para calcular los plazos de admisión."""
+    token = _request_started.set(time.monotonic() if at is None else at)
+    try:
+        yield
+    finally:
+        _request_started.reset(token)
+
+
+class AdmissionPool:
+    """Semáforo con cola EDF, estimación de espera y rechazo anticipado."""
+
+    def __init__(self, name: str, concurrency: int, max_queue: int, deadline: float):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queue = []  # (plazo, orden, future)
+        self._order = itertools.count()
+        self.service_time = 0.0  # media móvil exponencial, segundos
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {'queue_full': 0, 'deadline': 0, 'expired': 0}
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    def estimated_wait(self, position: int) -> float:
+        return position * self.service_time / self.concurrency
+
+    def _reject(self, reason: str, retry_after: float):
+        self.rejected[reason] += 1
+        return AdmissionRejected(self.name, retry_after, reason)
+
+    def _ticket(self, deadline_at: float) -> Future:
+        """`Future` que se resuelve al obtener un cupo (inmediato si hay libres)."""
+        now = time.monotonic()
+        future = Future()
+        with self._lock:
+            if self._active < self.concurrency and not self._queue:
+                self._active += 1
+                self.admitted += 1
+                future.set_running_or_notify_cancel()
+                future.set_result(None)
+                return future
+            wait = self.estimated_wait(len(self._queue) + 1)
+            if len(self._queue) >= self.max_queue:
+                raise self._reject('queue_full', wait)
+            if wait > deadline_at - now:
+                raise self._reject('deadline', wait)
+            heapq.heappush(self._queue, (deadline_at, next(self._order), future))
+        return future
+
+    def _abandon(self, future: Future) -> bool:
+        """El que esperaba venció su plazo: `True` si se retiró de la cola.
+
+        `False` significa que recibió el cupo justo a tiempo y debe usarlo.
+        """
+        if not future.cancel():
+            return False
+        with self._lock:
+            self.rejected['expired'] += 1
+            queue = [entry for entry in self._queue if entry[2] is not future]
+            if len(queue) != len(self._queue):
+                heapq.heapify(queue)
+                self._queue = queue
+        return True
+
+    def _release(self, service: Optional[float]):
+        now = time.monotonic()
+        with self._lock:
+            if service is not None:
+                self.service_time = service if not self.service_time else 0.8 * self.service_time + 0.2 * service
+            while self._queue:
+                deadline_at, _, future = heapq.heappop(self._queue)
+                if deadline_at <= now:
+                    future.cancel()  # vencido: su dueño lo cuenta al despertar
+                    continue
+                if future.set_running_or_notify_cancel():
+                    self.admitted += 1
+                    future.set_result(None)  # el cupo pasa directo al siguiente
+                    return
+            self._active -= 1
+
+    def _deadline_at(self) -> float:
+        started = _request_started.get()
+        return (time.monotonic() if started is None else started) + self.deadline
+
+    def _expired(self, future: Future):
+        """Tras vencer la espera: `AdmissionRejected`, o `None` si igual obtuvo el cupo."""
+        if self._abandon(future) or future.cancelled():
+            return AdmissionRejected(self.name, self.estimated_wait(self.queued + 1), 'expired')
+        return None
+
+    def _started(self, timings, queued_at) -> float:
+        started = time.monotonic()
+        if timings is not None:
+            timings[f'{self.name}_queue'] = (started - queued_at) * 1000
+        return started
+
+    @contextmanager
+    def admit(self, timings: Optional[dict] = None):
+        """Ejecuta el bloque con un cupo del pool; lanza `AdmissionRejected`."""
+        deadline_at = self._deadline_at()
+        queued_at = time.monotonic()
+        future = self._ticket(deadline_at)
+        try:
+            future.result(timeout=max(0.0, deadline_at - queued_at))
+        except (FutureTimeoutError, CancelledError):
+            rejected = self._expired(future)
+            if rejected is not None:
+                raise rejected
+        started = self._started(timings, queued_at)
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - started)
+
+    @asynccontextmanager
+    async def aadmit(self, timings: Optional[dict] = None):
+        """Versión asíncrona de `admit` (espera sin ocupar un hilo)."""
+        deadline_at = self._deadline_at()
+        queued_at = time.monotonic()
+        future = self._ticket(deadline_at)
+        if not future.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)),
+                                       max(0.0, deadline_at - queued_at))
+            except asyncio.TimeoutError:
+                rejected = self._expired(future)
+                if rejected is not None:
+                    raise rejected
+            except asyncio.CancelledError:
+                # Petición cancelada (cliente desconectado): devolver el cupo si llegó
+                if not future.cancel():
+                    self._release(None)
+                raise
+        started = self._started(timings, queued_at)
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - started)
+
+    def stats(self) -> dict:
+        return {
+            'active': self._active,
+            'queued': len(self._queue),
+            'concurrency': self.concurrency,
+            'service_time': self.service_time,
+            'admitted': self.admitted,
+            'rejected': dict(self.rejected),
+        }
+
+
+_pools: Dict[str, AdmissionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name: str) -> Optional[AdmissionPool]:
+    """Pool compartido del proceso (`hash` o `face`), o `None` si está desactivado."""
+    if not getattr(settings, 'AUTH_ADMISSION_ENABLED', True):
+        return None
+    pool = _pools.get(name)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(name)
+            if pool is None:
+                prefix = f'AUTH_{name.upper()}_'
+                pool = _pools[name] = AdmissionPool(
+                    name,
+                    concurrency=int(getattr(settings, prefix + 'CONCURRENCY', 0)) or os.cpu_count() or 1,
+                    max_queue=int(getattr(settings, prefix + 'QUEUE', 32)),
+                    deadline=float(getattr(settings, prefix + 'DEADLINE', 5.0)),
+                )
+    return pool
+
+
+@contextmanager
+def admit(name: str, timings: Optional[dict] = None):
+    """`get_pool(name).admit(timings)`, o sin control si está desactivado."""
+    pool = get_pool(name)
+    if pool is None:
+        yield
+        return
+    with pool.admit(timings):
+        yield
+
+
+@asynccontextmanager
+async def aadmit(name: str, timings: Optional[dict] = None):
+    pool = get_pool(name)
+    if pool is None:
+        yield
+        return
+    async with pool.aadmit(timings):
+        yield
+
+
+def _pool_samples(read):
+    def samples():
+        return [({'pool': name}, read(pool)) for name, pool in sorted(_pools.items())] or None
+    return samples
+
+
+def _rejections():
+    return [
+        ({'pool': name, 'reason': reason}, count)
+        for name, pool in sorted(_pools.items()) for reason, count in pool.rejected.items()
+    ] or None
+
+
+metrics.register_gauge('auth_admission_active', 'Trabajos de CPU en curso por pool.',
+                       _pool_samples(lambda p: p.active))
+metrics.register_gauge('auth_admission_queued', 'Trabajos de CPU esperando cupo por pool.',
+                       _pool_samples(lambda p: p.queued))
+metrics.register_gauge('auth_admission_concurrency', 'Cupos de cada pool de admisión.',
+                       _pool_samples(lambda p: p.concurrency))
+metrics.register_gauge('auth_admission_service_seconds', 'Tiempo de servicio medio (EWMA) por pool.',
+                       _pool_samples(lambda p: p.service_time))
+metrics.register_gauge('auth_admission_admitted_total', 'Trabajos admitidos por pool.',
+                       _pool_samples(lambda p: p.admitted), kind='counter')
+metrics.register_gauge('auth_admission_rejected_total', 'Trabajos rechazados (429) por pool y motivo.',
+                       _rejections, kind='counter')
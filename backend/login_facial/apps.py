@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class LoginFacialConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'login_facial'
+
+    def ready(self):
+        from . import signals  # noqa: F401
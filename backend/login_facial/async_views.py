@@ -0,0 +1,306 @@
+"""Variantes asíncronas (ASGI) de los endpoints de autenticación.
+
+Bajo ASGI las vistas DRF síncronas ocupan un hilo durante todo el login
+(decodificación, encoding, consultas y JWT). Estas vistas `async def` mantienen
+el mismo contrato de entrada y salida que `LoginView`, `FacialLoginView` y
+`FacialRegisterView`, pero:
+
+- el trabajo de CPU (embeddings, hash de contraseñas) se espera en un
+  executor (o en el pool de procesos de `embedding_service` si está activo);
+- las consultas simples usan el ORM asíncrono (`aget`/`afirst`);
+- las operaciones transaccionales se delegan con `sync_to_async`.
+
+Así un proceso ASGI puede mantener cientos de subidas lentas en vuelo sin
+bloquear hilos.
+"""
+import asyncio
+import json
+import logging
+import time
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponseNotAllowed, JsonResponse
+from rest_framework import status
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+
+from . import admission, metrics
+from .admission import AdmissionRejected
+from .authentication import CachedJWTAuthentication
+from .embedding_service import (
+    EmbeddingServiceBusy, EmbeddingServiceTimeout, _embed_frame, get_embedding_service
+)
+from .embedding_cache import get_embedding_cache
+from .gallery import get_gallery
+from .parsers import max_upload_bytes
+from .serializers import (
+    FacialLoginSerializer, FacialRegisterSerializer, LoginSerializer, UserProfileSerializer
+)
+from .views import (
+    _active_users, _compute_embedding_from_b64, _compute_embeddings_batch, _embedding_cache_key,
+    _audit_attempt, _frame_bytes, _identification_enabled, _match_tolerance,
+    _save_facial_data, _stage, _verify_user, get_tokens_for_user
+)
+
+
+log = logging.getLogger('facial')
+
+
+def _async_endpoint(view):
+    """Marca la vista como exenta de CSRF (como las `APIView`), solo POST, y
+    registra en `metrics` su duración total y el código de respuesta."""
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'POST':
+            return HttpResponseNotAllowed(['POST'])
+        started = time.perf_counter()
+        with admission.request_started():
+            response = await view(request, *args, **kwargs)
+        metrics.observe(view.__name__, 'total', time.perf_counter() - started)
+        metrics.count_request(view.__name__, response.status_code)
+        return response
+    wrapper.csrf_exempt = True
+    wrapper.__name__ = view.__name__
+    wrapper.__doc__ = view.__doc__
+    return wrapper
+
+
+def _error(status_code, message=None, errors=None, **extra):
+    body = {'success': False}
+    if message is not None:
+        body['message'] = message
+    if errors is not None:
+        body['errors'] = errors
+    body.update(extra)
+    return JsonResponse(body, status=status_code)
+
+
+def _unavailable(exc):
+    if isinstance(exc, AdmissionRejected):
+        response = _error(status.HTTP_429_TOO_MANY_REQUESTS,
+                          f'Servidor ocupado, reintente en {exc.retry_after} s')
+        response['Retry-After'] = str(exc.retry_after)
+        return response
+    if isinstance(exc, EmbeddingServiceBusy):
+        response = _error(status.HTTP_503_SERVICE_UNAVAILABLE,
+                          'Servicio de reconocimiento facial saturado, reintente')
+        response['Retry-After'] = '1'
+        return response
+    return _error(status.HTTP_504_GATEWAY_TIMEOUT, 'Tiempo de procesamiento facial excedido')
+
+
+def _request_data(request, raw_field='facial_data', raw_many=False):
+    """Cuerpo de la petición como dict: JSON, multipart u octet-stream.
+
+    Retorna `(data, respuesta_error)`; valida `FACIAL_MAX_UPLOAD_BYTES`
+    con `Content-Length` antes de leer el cuerpo.
+    """
+    try:
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except (TypeError, ValueError):
+        length = 0
+    if length > max_upload_bytes():
+        return None, _error(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            'La imagen facial excede el tamaño permitido.')
+    content_type = request.content_type or ''
+    if content_type == 'multipart/form-data':
+        data = request.POST.copy()
+        data.update(request.FILES)
+        return data, None
+    if content_type == 'application/octet-stream':
+        return {raw_field: [request.body] if raw_many else request.body}, None
+    try:
+        return json.loads(request.body or b'{}'), None
+    except ValueError:
+        return None, _error(status.HTTP_400_BAD_REQUEST, 'JSON inválido')
+
+
+async def _run_cpu(fn, *args, **kwargs):
+    """Ejecuta `fn` en el executor por defecto del loop sin bloquearlo."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, partial(fn, *args, **kwargs))
+
+
+async def _acompute_embedding_uncached(frame_data, timings, face_box=None):
+    service = get_embedding_service()
+    async with admission.aadmit('face', timings):
+        if service is None:
+            embedding = await _run_cpu(_compute_embedding_from_b64, frame_data, timings, face_box=face_box)
+        else:
+            future = service.submit(_embed_frame, frame_data, face_box)
+            try:
+                embedding, stages = await asyncio.wait_for(asyncio.wrap_future(future), service.timeout)
+            except asyncio.TimeoutError:
+                future.cancel()
+                raise EmbeddingServiceTimeout('Tiempo de procesamiento facial excedido')
+            timings.update(stages)
+    if embedding is not None:
+        embedding.setflags(write=False)
+    return embedding
+
+
+async def _acompute_embedding(frame_data, timings, face_box=None):
+    """Versión asíncrona de `views._compute_embedding` (caché single-flight incluida)."""
+    try:
+        raw = _frame_bytes(frame_data)
+    except Exception:
+        return None
+    if raw is None:
+        return None
+    cache = get_embedding_cache()
+    if cache is None:
+        return await _acompute_embedding_uncached(raw, timings, face_box)
+    key = _embedding_cache_key(raw, face_box)
+    future, leader = cache.claim(key)
+    if not leader:
+        return await asyncio.wrap_future(future)
+    try:
+        embedding = await _acompute_embedding_uncached(raw, timings, face_box)
+    except BaseException as exc:
+        cache.fail(key, future, exc)
+        raise
+    cache.resolve(key, future, embedding)
+    return embedding
+
+
+async def _aauthenticate_jwt(request):
+    """Usuario del header `Authorization: Bearer`, o `None` si no es válido.
+
+    Usa `CachedJWTAuthentication` (misma validación y caché que las vistas DRF).
+    """
+    try:
+        result = await sync_to_async(CachedJWTAuthentication().authenticate)(request)
+    except (AuthenticationFailed, TokenError):
+        return None
+    return result[0] if result else None
+
+
+@_async_endpoint
+async def login_async(request):
+    """Login tradicional con email y contraseña (ASGI).
+
+    Usa `LoginSerializer` (y por lo tanto `authenticate` con los
+    `AUTHENTICATION_BACKENDS` y la señal `user_login_failed`) en un hilo,
+    dentro del cupo de hash del control de admisión.
+    """
+    data, error = _request_data(request)
+    if error:
+        return error
+    serializer = LoginSerializer(data=data)
+    try:
+        async with admission.aadmit('hash'):
+            valid = await sync_to_async(serializer.is_valid)()
+    except AdmissionRejected as exc:
+        return _unavailable(exc)
+    if not valid:
+        return _error(status.HTTP_400_BAD_REQUEST, errors=serializer.errors)
+
+    user = serializer.validated_data['user']
+    return JsonResponse({
+        'success': True,
+        'message': 'Login exitoso',
+        'tokens': get_tokens_for_user(user),
+        'user': UserProfileSerializer(user).data
+    })
+
+
+@_async_endpoint
+async def facial_login_async(request):
+    """Login facial 1:1 (con DNI o user_id) o 1:N (ASGI)."""
+    data, error = _request_data(request, 'facial_data')
+    if error:
+        return error
+    serializer = FacialLoginSerializer(data=data)
+    if not serializer.is_valid():
+        return _error(status.HTTP_400_BAD_REQUEST, errors=serializer.errors)
+    dni = serializer.validated_data.get('dni')
+    user_id = serializer.validated_data.get('user_id')
+    if not (dni or user_id) and not _identification_enabled():
+        return _error(status.HTTP_400_BAD_REQUEST,
+                      errors={'dni': ['Se requiere DNI o user_id para el login facial']})
+
+    timings = {}
+    modo = '1:1' if (dni or user_id) else '1:N'
+    try:
+        face_encoding = await _acompute_embedding(
+            serializer.validated_data['facial_data'], timings, serializer.validated_data.get('face_box')
+        )
+    except (AdmissionRejected, EmbeddingServiceBusy, EmbeddingServiceTimeout) as exc:
+        _audit_attempt(request, 'error', modo=modo, dni=dni, user_id=user_id, motivo=type(exc).__name__)
+        return _unavailable(exc)
+    if face_encoding is None:
+        _audit_attempt(request, 'fallido', modo=modo, dni=dni, user_id=user_id, motivo='sin_rostro')
+        return _error(status.HTTP_400_BAD_REQUEST, 'No se pudo procesar la imagen facial')
+
+    best_match = None
+    best_distance = float('inf')
+    try:
+        with _stage(timings, 'match'):
+            if dni or user_id:
+                best_match, best_distance = await sync_to_async(_verify_user)(face_encoding, dni, user_id)
+            else:
+                match_id, best_distance = await sync_to_async(get_gallery().identify)(face_encoding, _match_tolerance())
+                if match_id is not None:
+                    best_match = await _active_users().filter(pk=match_id).afirst()
+    except Exception:
+        log.exception('facial_login_async: error al consultar la galería')
+        _audit_attempt(request, 'error', modo=modo, dni=dni, user_id=user_id, motivo='galeria')
+        return _error(status.HTTP_401_UNAUTHORIZED, 'No se encontró coincidencia facial')
+    finally:
+        metrics.record_timings('facial_login_async', timings)
+
+    if best_match is None:
+        _audit_attempt(request, 'fallido', modo=modo, dni=dni, user_id=user_id,
+                       motivo='sin_coincidencia', distancia=best_distance)
+        return _error(status.HTTP_401_UNAUTHORIZED, 'No se encontró coincidencia facial')
+    confianza = max(0, 1 - best_distance)
+    _audit_attempt(request, 'exitoso', best_match, confianza, modo=modo, distancia=best_distance)
+    return JsonResponse({
+        'success': True,
+        'message': 'Login facial exitoso',
+        'tokens': get_tokens_for_user(best_match),
+        'user': UserProfileSerializer(best_match).data,
+        'confidence': confianza
+    })
+
+
+@_async_endpoint
+async def facial_register_async(request):
+    """Registro facial del usuario autenticado por JWT (ASGI)."""
+    user = await _aauthenticate_jwt(request)
+    if user is None:
+        return JsonResponse(
+            {'detail': 'Las credenciales de autenticación no se proveyeron o son inválidas.'},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+    data, error = _request_data(request, 'facial_samples', raw_many=True)
+    if error:
+        return error
+    serializer = FacialRegisterSerializer(data=data)
+    if not serializer.is_valid():
+        return _error(status.HTTP_400_BAD_REQUEST, errors=serializer.errors)
+
+    try:
+        async with admission.aadmit('face'):
+            embeddings, failed_samples = await _run_cpu(
+                _compute_embeddings_batch,
+                serializer.validated_data['facial_samples'],
+                serializer.validated_data.get('face_boxes'),
+            )
+    except (AdmissionRejected, EmbeddingServiceBusy, EmbeddingServiceTimeout) as exc:
+        return _unavailable(exc)
+    embeddings = [emb for emb in embeddings if emb is not None]
+    if not embeddings:
+        return _error(status.HTTP_400_BAD_REQUEST, 'No se pudieron procesar las muestras faciales',
+                      failed_samples=failed_samples)
+
+    try:
+        await sync_to_async(_save_facial_data)(user, embeddings)
+    except Exception:
+        log.exception('facial_register_async: error al guardar datos faciales')
+        return _error(status.HTTP_500_INTERNAL_SERVER_ERROR, 'Error interno del servidor')
+    return JsonResponse({
+        'success': True,
+        'message': 'Registro facial completado exitosamente',
+        'samples_processed': len(embeddings),
+        'failed_samples': failed_samples
+    })
@@ -0,0 +1,180 @@
+"""Escritura diferida de la auditoría de intentos faciales (`SesionFacial`).
+
+Un INSERT síncrono por login añadiría al camino crítico la contención del
+lock de escritura de SQLite. En su lugar las vistas encolan cada intento en
+memoria (`enqueue` no bloquea ni toca la BD) y un hilo de fondo los escribe
+con `bulk_create` por lotes:
+
+- `FACIAL_AUDIT_BATCH_SIZE`: registros por INSERT; al alcanzarse se
+  despierta al hilo sin esperar el intervalo.
+- `FACIAL_AUDIT_FLUSH_INTERVAL`: segundos máximos que un registro espera.
+- `FACIAL_AUDIT_MAX_PENDING`: memoria acotada; por encima los intentos se
+  descartan y se cuentan en `dropped`.
+- Al terminar el proceso (`atexit`) se escribe lo pendiente.
+
+Cada lote actualiza en la misma transacción los agregados de
+`ResumenSesionFacial` (ver `rollups`).
+"""
+import atexit
+import logging
+import threading
+from collections import deque
+from typing import Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+
+from . import metrics
+
+
+log = logging.getLogger('facial')
+
+
+class AuditWriter:
+    """Buffer acotado de registros de `SesionFacial` con vaciado por lotes."""
+
+    def __init__(self, batch_size: int = 200, flush_interval: float = 1.0,
+                 max_pending: int = 10000, background: bool = True):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.background = background
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def enqueue(self, **fields) -> bool:
+        """Encola un registro (kwargs de `SesionFacial`); `False` si se descartó."""
+        with self._cond:
+            if len(self._buffer) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._buffer.append(fields)
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+        if self.background and self._thread is None:
+            self._start()
+        return True
+
+    def _start(self):
+        with self._cond:
+            if self._thread is not None or self._stopping:
+                return
+            self._thread = threading.Thread(target=self._run, name='facial-audit', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(
+                        lambda: self._stopping or len(self._buffer) >= self.batch_size,
+                        timeout=self.flush_interval,
+                    )
+                    stopping = self._stopping
+                self.flush()
+                close_old_connections()
+                if stopping:
+                    return
+        finally:
+            connections.close_all()  # solo las conexiones de este hilo
+
+    def _take(self):
+        with self._cond:
+            count = min(self.batch_size, len(self._buffer))
+            return [self._buffer.popleft() for _ in range(count)]
+
+    def flush(self) -> int:
+        """Escribe todo lo pendiente en lotes; retorna los registros escritos."""
+        from .models import SesionFacial
+        from .rollups import aplicar
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch = self._take()
+                if not batch:
+                    return written
+                try:
+                    sesiones = [SesionFacial(**fields) for fields in batch]
+                    with transaction.atomic():
+                        SesionFacial.objects.bulk_create(sesiones)
+                        aplicar(sesiones)
+                except Exception:
+                    self.failed += len(batch)
+                    log.exception(f'audit: no se pudieron escribir {len(batch)} registros')
+                    continue
+                written += len(batch)
+                self.written += len(batch)
+
+    def stop(self, timeout: float = 5.0):
+        """Detiene el hilo de fondo y escribe lo pendiente."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        if self._buffer:
+            self.flush()
+
+    def stats(self) -> dict:
+        return {
+            'pending': self.pending,
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
+
+
+_writer: Optional[AuditWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_audit_writer() -> Optional[AuditWriter]:
+    """Writer compartido del proceso, o `None` si la auditoría está desactivada."""
+    global _writer
+    if not getattr(settings, 'FACIAL_AUDIT_ENABLED', True):
+        return None
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = AuditWriter(
+                    batch_size=int(getattr(settings, 'FACIAL_AUDIT_BATCH_SIZE', 200)),
+                    flush_interval=float(getattr(settings, 'FACIAL_AUDIT_FLUSH_INTERVAL', 1.0)),
+                    max_pending=int(getattr(settings, 'FACIAL_AUDIT_MAX_PENDING', 10000)),
+                )
+    return _writer
+
+
+@atexit.register
+def _flush_on_exit():
+    if _writer is not None:
+        try:
+            _writer.stop()
+        except Exception:
+            log.exception('audit: error al vaciar la auditoría al salir')
+
+
+def _writer_stat(key):
+    def read():
+        return None if _writer is None else _writer.stats()[key]
+    return read
+
+
+metrics.register_gauge('facial_audit_pending', 'Intentos de auditoría en memoria sin escribir.',
+                       _writer_stat('pending'))
+metrics.register_gauge('facial_audit_written_total', 'Intentos de auditoría escritos en BD.',
+                       _writer_stat('written'), kind='counter')
+metrics.register_gauge('facial_audit_dropped_total', 'Intentos descartados por buffer lleno.',
+                       _writer_stat('dropped'), kind='counter')
+metrics.register_gauge('facial_audit_failed_total', 'Intentos perdidos por error al escribir.',
+                       _writer_stat('failed'), kind='counter')
@@ -0,0 +1,160 @@
+"""Autenticación JWT con caché de usuarios por proceso.
+
+`JWTAuthentication` consulta `Usuario` por clave primaria en cada petición
+autenticada; el dashboard dispara varias por página. `CachedJWTAuthentication`
+guarda el usuario cargado en una LRU con TTL por id:
+
+- `AUTH_USER_CACHE_SIZE` entradas (0 la desactiva) con expiración
+  `AUTH_USER_CACHE_TTL` segundos, que acota lo que dura un cambio hecho con
+  `QuerySet.update()` (no emite señales).
+- Las señales `post_save`/`post_delete` de `Usuario` invalidan la entrada, así
+  que un cambio de `rol`, `estado` o contraseña aplica en la siguiente petición.
+- Cada petición recibe una copia del usuario cacheado: las vistas pueden
+  modificarla sin afectar a otras peticiones.
+
+Las validaciones de `JWTAuthentication.get_user` (usuario activo, token
+revocado por cambio de contraseña) se aplican también a los hits.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from . import metrics
+
+
+class UserCache:
+    """LRU con TTL de usuarios por id, segura entre hilos.
+
+    `generation` se incrementa en cada invalidación: quien carga un usuario
+    de la BD lo guarda con la generación leída antes de la consulta y el
+    guardado se descarta si hubo una invalidación entretanto (así una carga
+    lenta no re-cachea datos anteriores a un `save`).
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        key = str(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return copy.copy(entry[1])
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, user, generation: int):
+        key = str(key)
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, copy.copy(user))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """Elimina un usuario (o todos si `key` es `None`)."""
+        with self._lock:
+            self.generation += 1
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(key), None)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+_cache: Optional[UserCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_user_cache() -> Optional[UserCache]:
+    """Caché compartida del proceso, o `None` si está desactivada."""
+    global _cache
+    maxsize = int(getattr(settings, 'AUTH_USER_CACHE_SIZE', 4096))
+    if maxsize <= 0:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = UserCache(
+                    maxsize=maxsize,
+                    ttl=float(getattr(settings, 'AUTH_USER_CACHE_TTL', 30)),
+                )
+    return _cache
+
+
+def check_user(user, validated_token):
+    """Mismas validaciones que `JWTAuthentication.get_user` tras cargar al usuario."""
+    if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+        raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+    if api_settings.CHECK_REVOKE_TOKEN:
+        if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+    return user
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """`JWTAuthentication` que resuelve el usuario desde `UserCache`."""
+
+    def get_user(self, validated_token):
+        cache = get_user_cache()
+        if cache is None:
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_('Token contained no recognizable user identification')) from e
+
+        user = cache.get(user_id)
+        if user is None:
+            generation = cache.generation
+            try:
+                user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found') from e
+            cache.put(user_id, user, generation)
+        return check_user(user, validated_token)
+
+
+def _cache_stat(key):
+    def read():
+        cache = get_user_cache()
+        return None if cache is None else cache.stats()[key]
+    return read
+
+
+metrics.register_gauge('auth_user_cache_entries', 'Usuarios en la caché de autenticación JWT.',
+                       _cache_stat('size'))
+metrics.register_gauge('auth_user_cache_hit_ratio', 'Fracción de peticiones JWT resueltas sin consultar la BD.',
+                       _cache_stat('hit_rate'))
@@ -0,0 +1,272 @@
+"""Importación masiva de usuarios desde CSV.
+
+Crear usuarios uno a uno con `UsuarioCreateSerializer` cuesta, por fila, una
+consulta de unicidad, un hash PBKDF2 en el hilo de la petición y dos `save()`.
+`import_users` procesa el CSV en streaming y por lotes de `batch_size`:
+
+1. Valida cada fila (DNI de 8 dígitos, email, rol, estado, longitudes).
+2. Detecta duplicados dentro del archivo con sets y contra la BD con una
+   consulta `IN` por lote para DNI y otra para email.
+3. Envía los hashes de contraseña del lote a un pool de procesos compartido
+   por las importaciones del proceso (`USERS_IMPORT_WORKERS`, 0 = en línea);
+   mientras se calculan, se inserta el lote anterior. En `dry_run` no se
+   calcula ningún hash.
+4. Inserta con `bulk_create` en una transacción por lote e indexa los nuevos
+   usuarios para la búsqueda. Si otra escritura gana la carrera por un DNI o
+   email, el lote se reintenta fila a fila y solo esas filas fallan.
+
+Retorna un reporte con totales y errores por línea; `progress` recibe el
+avance tras cada lote.
+"""
+import atexit
+import csv
+import io
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from . import search
+from .embedding_service import init_worker
+from .models import Usuario
+
+log = logging.getLogger('facial')
+
+REQUIRED = ('dni', 'nombres', 'apellidos', 'email')
+OPTIONAL = ('rol', 'estado', 'password')
+MAX_ERRORS = 1000  # errores detallados en el reporte; el resto solo se cuenta
+
+
+class ImportFormatError(ValueError):
+    """El CSV no tiene las columnas requeridas."""
+
+
+_pools = {}  # procesos -> ProcessPoolExecutor reutilizado entre importaciones
+_pools_lock = threading.Lock()
+
+
+def get_hash_pool(workers: int):
+    """Pool de procesos compartido para los hashes, o `None` si `workers` es 0."""
+    if workers <= 0:
+        return None
+    pool = _pools.get(workers)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(workers)
+            if pool is None:
+                start_method = getattr(settings, 'FACIAL_EMBEDDING_START_METHOD', None)
+                pool = _pools[workers] = ProcessPoolExecutor(
+                    max_workers=workers, initializer=init_worker,
+                    mp_context=multiprocessing.get_context(start_method) if start_method else None,
+                )
+    return pool
+
+
+@atexit.register
+def _shutdown_pools():
+    for pool in _pools.values():
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _max_length(field):
+    return Usuario._meta.get_field(field).max_length
+
+
+def validate_row(row):
+    """`(datos, errores)` de una fila ya leída del CSV."""
+    data = {k: (row.get(k) or '').strip() for k in REQUIRED + OPTIONAL}
+    errors = {}
+    if not (data['dni'].isdigit() and len(data['dni']) == 8):
+        errors['dni'] = ['DNI debe tener exactamente 8 dígitos']
+    email = Usuario.objects.normalize_email(data['email'])
+    try:
+        validate_email(email)
+        if len(email) > _max_length('email'):
+            raise ValidationError('email')
+    except ValidationError:
+        errors['email'] = ['Email inválido']
+    data['email'] = email
+    for field in ('nombres', 'apellidos'):
+        if not data[field]:
+            errors[field] = ['Este campo es requerido']
+        elif len(data[field]) > _max_length(field):
+            errors[field] = [f'Máximo {_max_length(field)} caracteres']
+    data['rol'] = data['rol'] or 'Analista'
+    if data['rol'] not in dict(Usuario.ROLES):
+        errors['rol'] = [f'Valor inválido. Válidos: {[c for c, _ in Usuario.ROLES]}']
+    data['estado'] = data['estado'] or 'Activo'
+    if data['estado'] not in dict(Usuario.ESTADOS):
+        errors['estado'] = [f'Valor inválido. Válidos: {[c for c, _ in Usuario.ESTADOS]}']
+    return data, errors
+
+
+def _text_stream(source):
+    """Acepta texto o binario (archivos subidos) y decodifica UTF-8 con o sin BOM."""
+    if isinstance(source, io.TextIOBase):
+        return source
+    return io.TextIOWrapper(source, encoding='utf-8-sig', newline='')
+
+
+def _batches(reader, size):
+    batch = []
+    for row in reader:
+        batch.append((reader.line_num, row))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class _Importer:
+    def __init__(self, batch_size, workers, dry_run, progress):
+        self.batch_size = batch_size
+        self.workers = workers
+        self.dry_run = dry_run
+        self.progress = progress
+        self.seen_dni = set()
+        self.seen_email = set()
+        self.report = {'total': 0, 'created': 0, 'failed': 0, 'errors': []}
+        self.pool = None
+
+    def error(self, line, errors):
+        self.report['failed'] += 1
+        if len(self.report['errors']) < MAX_ERRORS:
+            self.report['errors'].append({'line': line, 'errors': errors})
+
+    def validate(self, batch):
+        """Filas válidas del lote, sin duplicados en el archivo ni en la BD."""
+        rows = []
+        for line, row in batch:
+            data, errors = validate_row(row)
+            if not errors.get('dni') and data['dni'] in self.seen_dni:
+                errors['dni'] = ['DNI repetido en el archivo']
+            if not errors.get('email') and data['email'] in self.seen_email:
+                errors['email'] = ['Email repetido en el archivo']
+            self.seen_dni.add(data['dni'])
+            self.seen_email.add(data['email'])
+            if errors:
+                self.error(line, errors)
+            else:
+                rows.append((line, data))
+
+        dnis = set(Usuario.objects.filter(dni__in=[d['dni'] for _, d in rows]).values_list('dni', flat=True))
+        emails = set(Usuario.objects.filter(email__in=[d['email'] for _, d in rows]).values_list('email', flat=True))
+        valid = []
+        for line, data in rows:
+            errors = {}
+            if data['dni'] in dnis:
+                errors['dni'] = ['Ya existe un usuario con este DNI']
+            if data['email'] in emails:
+                errors['email'] = ['Ya existe un usuario con este email']
+            if errors:
+                self.error(line, errors)
+            else:
+                valid.append((line, data))
+        return valid
+
+    def hash_passwords(self, rows):
+        """Un `Future` por fila con el hash (o contraseña inutilizable)."""
+        futures = []
+        for _, data in rows:
+            password = data.pop('password') or None
+            if self.dry_run:
+                continue  # solo validación: el hash no se usa
+            if password is None or self.pool is None:
+                future = Future()
+                future.set_result(make_password(password))
+            else:
+                future = self.pool.submit(make_password, password)
+            futures.append(future)
+        return futures
+
+    def insert(self, rows, futures):
+        if self.dry_run:
+            self.report['created'] += len(rows)
+            return
+        users = []
+        for (line, data), future in zip(rows, futures):
+            users.append(Usuario(username=data['email'], password=future.result(), **data))
+        try:
+            with transaction.atomic():
+                created = Usuario.objects.bulk_create(users)
+        except IntegrityError:
+            created = []
+            for (line, _), user in zip(rows, users):
+                try:
+                    with transaction.atomic():
+                        user.save()
+                    created.append(user)
+                except IntegrityError:
+                    self.error(line, {'non_field_errors': ['DNI o email ya registrado']})
+        if created and created[0].pk is None:
+            ids = dict(Usuario.objects.filter(email__in=[u.email for u in created]).values_list('email', 'id'))
+            for user in created:
+                user.pk = ids.get(user.email)
+        search.index_users(created)
+        self.report['created'] += len(created)
+
+    def notify(self):
+        if self.progress:
+            self.progress({k: self.report[k] for k in ('total', 'created', 'failed')})
+
+    def run(self, stream):
+        reader = csv.DictReader(_text_stream(stream))
+        missing = [c for c in REQUIRED if c not in (reader.fieldnames or [])]
+        if missing:
+            raise ImportFormatError(f'Faltan columnas requeridas: {", ".join(missing)}')
+
+        if not self.dry_run:
+            self.pool = get_hash_pool(self.workers)
+        pending = None
+        futures = []
+        try:
+            for batch in _batches(reader, self.batch_size):
+                self.report['total'] += len(batch)
+                rows = self.validate(batch)
+                futures = self.hash_passwords(rows)
+                if pending is not None:
+                    self.insert(*pending)
+                pending = (rows, futures)
+                self.notify()
+            if pending is not None:
+                self.insert(*pending)
+                self.notify()
+        except BaseException:
+            # El pool es compartido: solo se cancelan los hashes de esta importación
+            for future in futures + (pending[1] if pending else []):
+                future.cancel()
+            raise
+        return self.report
+
+
+def count_lines(upload) -> int:
+    """Líneas de un archivo subido (cota superior de sus filas), sin decodificarlo."""
+    total = sum(chunk.count(b'\n') for chunk in upload.chunks())
+    upload.seek(0)
+    return total
+
+
+def import_users(stream, batch_size=None, workers=None, dry_run=False, progress=None):
+    """Importa usuarios desde un CSV (texto o binario); retorna el reporte.
+
+    Columnas requeridas: `dni`, `nombres`, `apellidos`, `email`; opcionales:
+    `rol`, `estado`, `password` (sin contraseña se crea inutilizable).
+    Lanza `ImportFormatError` si faltan columnas.
+    """
+    batch_size = batch_size or int(getattr(settings, 'USERS_IMPORT_BATCH_SIZE', 1000))
+    workers = int(getattr(settings, 'USERS_IMPORT_WORKERS', 4) if workers is None else workers)
+    started = time.perf_counter()
+    report = _Importer(max(1, batch_size), workers, dry_run, progress).run(stream)
+    report['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    report['dry_run'] = dry_run
+    log.info(f"bulk_import: {report['created']} creados, {report['failed']} con error "
+             f"de {report['total']} filas en {report['elapsed_ms']} ms")
+    return report
@@ -0,0 +1,137 @@
+"""Caché de embeddings por hash de contenido con de-duplicación single-flight.
+
+Los clientes reintentan el login facial ante timeouts y pueden reenviar el
+mismo frame varias veces. La caché guarda, por hash de los bytes decodificados
+de la imagen (más los parámetros que alteran el resultado), el embedding
+calculado o el resultado "sin rostro" (`None`).
+
+- LRU acotada a `FACIAL_EMBEDDING_CACHE_SIZE` entradas (0 la desactiva), con
+  expiración `FACIAL_EMBEDDING_CACHE_TTL` segundos.
+- Single-flight: peticiones concurrentes con la misma clave esperan el mismo
+  cómputo en curso en lugar de repetirlo. Funciona con hilos (`Future.result`)
+  y con asyncio (`asyncio.wrap_future`).
+- Contadores `hits`, `misses` y `coalesced` vía `stats()`.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Optional, Tuple
+
+from django.conf import settings
+
+
+def content_key(raw_bytes, *params) -> bytes:
+    """Clave de caché: blake2b de los bytes de la imagen y los parámetros."""
+    digest = hashlib.blake2b(raw_bytes, digest_size=16)
+    if params:
+        digest.update(repr(params).encode())
+    return digest.digest()
+
+
+class EmbeddingCache:
+    """LRU con TTL y coordinación single-flight, segura entre hilos."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: 'OrderedDict[bytes, Tuple[float, object]]' = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def claim(self, key) -> Tuple[Future, bool]:
+        """Retorna `(future, líder)` para `key`.
+
+        - Valor en caché: `future` ya resuelto y `líder=False` (hit).
+        - Cómputo en curso: el `future` de ese cómputo y `líder=False`.
+        - Si no: un `future` nuevo y `líder=True`; quien lo reciba debe llamar
+          a `resolve` o `fail`.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    future = Future()
+                    future.set_result(entry[1])
+                    return future, False
+                del self._entries[key]
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            self.misses += 1
+            future = Future()
+            self._inflight[key] = future
+            return future, True
+
+    def resolve(self, key, future: Future, value):
+        """Publica el resultado del líder y lo guarda en la caché."""
+        with self._lock:
+            self._inflight.pop(key, None)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        future.set_result(value)
+
+    def fail(self, key, future: Future, exc: BaseException):
+        """Propaga el error del líder a los que esperan, sin cachearlo."""
+        with self._lock:
+            self._inflight.pop(key, None)
+        future.set_exception(exc)
+
+    def get_or_compute(self, key, compute):
+        """Versión síncrona: retorna el valor cacheado o ejecuta `compute()` una vez."""
+        future, leader = self.claim(key)
+        if not leader:
+            return future.result()
+        try:
+            value = compute()
+        except BaseException as exc:
+            self.fail(key, future, exc)
+            raise
+        self.resolve(key, future, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'hit_rate': (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Caché compartida del proceso, o `None` si está desactivada."""
+    global _cache
+    maxsize = int(getattr(settings, 'FACIAL_EMBEDDING_CACHE_SIZE', 1024))
+    if maxsize <= 0:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache(
+                    maxsize=maxsize,
+                    ttl=float(getattr(settings, 'FACIAL_EMBEDDING_CACHE_TTL', 60)),
+                )
+    return _cache
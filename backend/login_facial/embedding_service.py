@@ -0,0 +1,199 @@
+"""Servicio de cómputo de embeddings en un pool de procesos.
+
+La detección HOG y `face_encodings` son CPU intensivas y retienen el GIL, por
+lo que ejecutarlas en el hilo de la petición serializa los logins faciales de
+cada worker WSGI. Este servicio envía los frames a un `ProcessPoolExecutor`
+acotado:
+
+- `FACIAL_EMBEDDING_WORKERS`: procesos del pool (0 desactiva el servicio y
+  el cómputo vuelve a hacerse en línea).
+- `FACIAL_EMBEDDING_QUEUE_DEPTH`: frames que pueden esperar además de los
+  que ya se están procesando; por encima se rechaza con `EmbeddingServiceBusy`.
+- `FACIAL_EMBEDDING_TIMEOUT`: segundos máximos de espera por resultado;
+  al vencer se lanza `EmbeddingServiceTimeout`.
+"""
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Optional
+
+from django.conf import settings
+
+
+log = logging.getLogger('facial')
+
+
+class EmbeddingServiceBusy(Exception):
+    """La cola del pool está llena; el frame no fue aceptado."""
+
+
+class EmbeddingServiceTimeout(Exception):
+    """El embedding no estuvo listo dentro del tiempo límite."""
+
+
+def init_worker():
+    """Prepara Django en procesos hijos arrancados con `spawn`/`forkserver`.
+
+    Inicializador público para cualquier `ProcessPoolExecutor` de la app.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    from django.apps import apps
+    if not apps.ready:
+        import django
+        django.setup()
+
+
+def _embed_frame(frame_data, face_box=None):
+    """Punto de entrada en el proceso hijo: frame -> `(embedding, timings)`."""
+    from .views import _compute_embedding_from_b64
+    timings = {}
+    return _compute_embedding_from_b64(frame_data, timings, face_box=face_box), timings
+
+
+def _embed_sample(frame_data, face_box=None):
+    """Punto de entrada en el proceso hijo: muestra de registro -> `(embedding, error)`.
+
+    Detecta y codifica en el worker, así el proceso que atiende la petición
+    no hace trabajo de CPU. `error` es `None`, `'decode_error'`, `'no_face'`
+    o `'encode_error'`.
+    """
+    from .views import _detect_sample, _encode_faces
+    crop, location, error = _detect_sample(frame_data, face_box=face_box)
+    if error:
+        return None, error
+    try:
+        embedding = _encode_faces([(crop, location)])[0]
+    except Exception as e:
+        log.exception(f'embed_sample: excepción {e}')
+        embedding = None
+    return embedding, None if embedding is not None else 'encode_error'
+
+
+class EmbeddingService:
+    """Pool de procesos acotado para calcular embeddings faciales."""
+
+    def __init__(self, workers: int, queue_depth: int = 0, timeout: float = 10.0,
+                 start_method: Optional[str] = None):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.timeout = timeout
+        self.start_method = start_method
+        self._slots = threading.BoundedSemaphore(workers + queue_depth)
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        """Frames aceptados que aún no terminan (en cola o en proceso)."""
+        return self._pending
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    ctx = multiprocessing.get_context(self.start_method) if self.start_method else None
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=ctx, initializer=init_worker
+                    )
+        return self._executor
+
+    def _release(self, _future=None):
+        with self._pending_lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def submit(self, fn, *args):
+        """Envía `fn(*args)` al pool; lanza `EmbeddingServiceBusy` si no hay cupo."""
+        if not self._slots.acquire(blocking=False):
+            raise EmbeddingServiceBusy('Cola de procesamiento facial llena')
+        with self._pending_lock:
+            self._pending += 1
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def wait(self, future, timeout: Optional[float] = None):
+        """Espera el resultado de `future` respetando el tiempo límite."""
+        try:
+            return future.result(timeout=self.timeout if timeout is None else timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise EmbeddingServiceTimeout('Tiempo de procesamiento facial excedido')
+
+    def map(self, fn, items, timeout: Optional[float] = None) -> list:
+        """`[fn(*args) for args in items]` en el pool, sin exceder los cupos libres.
+
+        Envía tantas tareas como cupos haya y repone una por cada resultado
+        recibido, de modo que un lote mayor que `workers + queue_depth` no se
+        rechaza. Lanza `EmbeddingServiceBusy` solo si no obtiene ningún cupo;
+        ante cualquier error cancela las tareas del lote aún pendientes.
+        """
+        results = [None] * len(items)
+        pending = deque()  # (posición, future) en vuelo, en orden de envío
+        queued = deque(enumerate(items))
+        try:
+            while queued or pending:
+                while queued:
+                    try:
+                        future = self.submit(fn, *queued[0][1])
+                    except EmbeddingServiceBusy:
+                        if not pending:
+                            raise
+                        break
+                    pending.append((queued.popleft()[0], future))
+                index, future = pending.popleft()
+                results[index] = self.wait(future, timeout)
+        except BaseException:
+            for _, future in pending:
+                future.cancel()
+            raise
+        return results
+
+    def compute(self, frame_data, face_box=None, timeout: Optional[float] = None):
+        """Calcula `(embedding, timings)` de `frame_data` en el pool (bloqueante)."""
+        return self.wait(self.submit(_embed_frame, frame_data, face_box), timeout)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_service: Optional[EmbeddingService] = None
+_service_lock = threading.Lock()
+
+
+def get_embedding_service() -> Optional[EmbeddingService]:
+    """Servicio compartido del proceso, o `None` si está desactivado."""
+    global _service
+    workers = int(getattr(settings, 'FACIAL_EMBEDDING_WORKERS', 0))
+    if workers <= 0:
+        return None
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = EmbeddingService(
+                    workers=workers,
+                    queue_depth=int(getattr(settings, 'FACIAL_EMBEDDING_QUEUE_DEPTH', 2 * workers)),
+                    timeout=float(getattr(settings, 'FACIAL_EMBEDDING_TIMEOUT', 10)),
+                    start_method=getattr(settings, 'FACIAL_EMBEDDING_START_METHOD', None),
+                )
+                log.debug(f'embedding_service: pool de {workers} procesos')
+    return _service
+
+
+@atexit.register
+def _shutdown_service():
+    if _service is not None:
+        _service.shutdown()
@@ -0,0 +1,398 @@
+"""Galería facial en memoria para identificación 1:N.
+
+Mantiene todos los embeddings activos de `DatosFaciales` en una matriz
+contigua `float32` (una fila por muestra) junto a un arreglo paralelo con el
+`usuario_id` de cada fila. La identificación se resuelve con una única
+operación matriz-vector y un `argmin`, sin instanciar objetos del ORM.
+
+Para galerías grandes se puede activar un índice aproximado IVF
+(`FACIAL_GALLERY_INDEX = 'ivf'`); por debajo de `FACIAL_IVF_MIN_SIZE`
+muestras se mantiene la búsqueda exacta. El índice se entrena en un hilo de
+fondo tras cada recarga, fuera del camino de las peticiones.
+
+La galería es local al proceso: se invalida por señales al guardar/eliminar
+`DatosFaciales` y, para detectar cambios hechos por otros procesos, compara
+periódicamente (`FACIAL_GALLERY_TTL` segundos) una marca de versión barata
+calculada en la base de datos. Si `FACIAL_GALLERY_SNAPSHOT_DIR` tiene un
+snapshot con la misma marca, se mapea desde disco en lugar de leer la tabla
+(ver `gallery_store`), y con `FACIAL_GALLERY_SHM_NAME` se adjunta la galería
+que el dueño del host publica en memoria compartida (ver `gallery_shm`).
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Count, Max, Q
+
+from .ann import IVFIndex
+
+try:
+    import numpy as np
+except Exception:  # pragma: no cover
+    np = None
+
+
+log = logging.getLogger('facial')
+
+
+class GallerySnapshot(NamedTuple):
+    """Estado inmutable de la galería; se reemplaza completo en cada recarga."""
+    matrix: 'np.ndarray'       # (n_muestras, dim) float32, C-contiguo
+    sq_norms: 'np.ndarray'     # (n_muestras,) normas al cuadrado de cada fila
+    user_ids: 'np.ndarray'     # (n_muestras,) int64, usuario de cada fila
+    version: tuple
+    index: Optional['IVFIndex'] = None  # índice aproximado opcional
+
+
+def gallery_version():
+    """Marca de versión de la tabla `datos_faciales` (una sola consulta agregada).
+
+    Cambia al crear, actualizar, activar/desactivar o eliminar registros.
+    """
+    from .models import DatosFaciales
+    agg = DatosFaciales.objects.aggregate(
+        total=Count('id'),
+        activos=Count('id', filter=Q(activo=True)),
+        ultima=Max('fecha_actualizacion'),
+    )
+    ultima = agg['ultima'].isoformat() if agg['ultima'] else None
+    return (agg['total'], agg['activos'], ultima)
+
+
+def build_snapshot(rows, version=()) -> GallerySnapshot:
+    """Construye un `GallerySnapshot` desde pares `(usuario_id, embeddings)`.
+
+    `embeddings` es la colección de muestras del usuario (matriz 2D o lista
+    de vectores). Los bloques cuya dimensión no coincide con la dominante se
+    descartan con un aviso.
+    """
+    blocks = []
+    owners = []
+    for user_id, embeddings in rows:
+        if embeddings is None or len(embeddings) == 0:
+            continue
+        block = np.asarray(embeddings, dtype=np.float32)
+        if block.ndim == 1:
+            block = block.reshape(1, -1)
+        blocks.append(block)
+        owners.append(user_id)
+
+    if not blocks:
+        return GallerySnapshot(
+            matrix=np.empty((0, 0), dtype=np.float32),
+            sq_norms=np.empty(0, dtype=np.float32),
+            user_ids=np.empty(0, dtype=np.int64),
+            version=version,
+        )
+
+    weights = {}
+    for block in blocks:
+        weights[block.shape[1]] = weights.get(block.shape[1], 0) + block.shape[0]
+    dim = max(weights, key=weights.get)
+    keep = [i for i, block in enumerate(blocks) if block.shape[1] == dim]
+    if len(keep) != len(blocks):
+        log.warning(f'gallery: {len(blocks) - len(keep)} usuarios descartados por dimensión != {dim}')
+
+    matrix = np.ascontiguousarray(np.concatenate([blocks[i] for i in keep]), dtype=np.float32)
+    user_ids = np.repeat(
+        np.asarray([owners[i] for i in keep], dtype=np.int64),
+        [blocks[i].shape[0] for i in keep],
+    )
+    sq_norms = np.einsum('ij,ij->i', matrix, matrix)
+    return GallerySnapshot(matrix=matrix, sq_norms=sq_norms, user_ids=user_ids, version=version)
+
+
+def needs_index(snapshot: GallerySnapshot) -> bool:
+    """`True` si la configuración pide un índice IVF para este snapshot."""
+    mode = getattr(settings, 'FACIAL_GALLERY_INDEX', 'exact')
+    min_size = int(getattr(settings, 'FACIAL_IVF_MIN_SIZE', 20000))
+    return mode == 'ivf' and snapshot.matrix.shape[0] >= min_size
+
+
+def build_index(snapshot: GallerySnapshot) -> GallerySnapshot:
+    """Adjunta un `IVFIndex` al snapshot si la configuración lo solicita."""
+    if not needs_index(snapshot):
+        return snapshot
+    started = time.perf_counter()
+    index = IVFIndex(
+        n_lists=int(getattr(settings, 'FACIAL_IVF_NLIST', 0)),
+        nprobe=int(getattr(settings, 'FACIAL_IVF_NPROBE', 8)),
+    ).fit(snapshot.matrix)
+    log.debug(
+        f'gallery: índice IVF con {index.n_lists} listas '
+        f'en {(time.perf_counter() - started) * 1000:.1f} ms'
+    )
+    return snapshot._replace(index=index)
+
+
+def nearest(snapshot: GallerySnapshot, live_emb, exact: bool = False) -> Tuple[Optional[int], float]:
+    """Retorna `(usuario_id, distancia_euclidiana)` de la muestra más cercana.
+
+    Usa ||a-b||² = ||a||² - 2·a·b + ||b||² para resolver toda la galería con un
+    único producto matriz-vector, o el índice IVF del snapshot si existe y no
+    se pide `exact`. Retorna `(None, inf)` si no hay candidatos.
+    """
+    matrix = snapshot.matrix
+    if matrix.shape[0] == 0 or live_emb is None:
+        return None, float('inf')
+    live = np.asarray(live_emb, dtype=np.float32).reshape(-1)
+    if live.shape[0] != matrix.shape[1]:
+        log.debug(f'gallery: dimensión viva {live.shape[0]} != galería {matrix.shape[1]}')
+        return None, float('inf')
+    if snapshot.index is not None and not exact:
+        row, sq_dist = snapshot.index.search(live)
+        if row is not None:
+            return int(snapshot.user_ids[row]), float(np.sqrt(sq_dist))
+    sq = snapshot.sq_norms - 2.0 * (matrix @ live) + float(live @ live)
+    idx = int(np.argmin(sq))
+    return int(snapshot.user_ids[idx]), float(np.sqrt(max(float(sq[idx]), 0.0)))
+
+
+class Match(NamedTuple):
+    """Resultado de comparar un embedding vivo con una colección."""
+    distance: float  # distancia euclidiana mínima
+    index: int       # fila de la muestra más cercana (-1 si no hay)
+    margin: float    # segunda distancia menos la mínima (inf con una muestra)
+
+
+NO_MATCH = Match(float('inf'), -1, float('inf'))
+
+
+class EmbeddingCollection:
+    """Muestras de un usuario apiladas en una matriz `float32` de solo lectura.
+
+    Guarda las normas al cuadrado (distancia euclidiana con un producto
+    matriz-vector, como `nearest`). `dims` recorta cada muestra a sus
+    primeras `dims` componentes.
+    """
+
+    def __init__(self, embeddings, dims: Optional[int] = None):
+        if len(embeddings) == 0:
+            matrix = np.empty((0, dims or 0), dtype=np.float32)
+        else:
+            matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(1, -1)
+        if dims is not None:
+            matrix = matrix[:, :dims]
+        self.matrix = np.ascontiguousarray(matrix)
+        self.sq_norms = np.einsum('ij,ij->i', self.matrix, self.matrix)
+        for array in (self.matrix, self.sq_norms):
+            array.setflags(write=False)
+        self.dims = dims
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def _live(self, live_emb):
+        live = np.asarray(live_emb, dtype=np.float32).reshape(-1)
+        if self.dims is not None:
+            live = live[:self.dims]
+        if live.shape[0] != self.matrix.shape[1]:
+            return None
+        return live
+
+    def nearest(self, live_emb) -> Match:
+        """Distancia mínima, fila y margen frente a la segunda más cercana."""
+        live = self._live(live_emb) if len(self) else None
+        if live is None:
+            return NO_MATCH
+        sq = self.sq_norms - 2.0 * (self.matrix @ live) + float(live @ live)
+        np.maximum(sq, 0.0, out=sq)
+        if len(self) == 1:
+            return Match(float(np.sqrt(sq[0])), 0, float('inf'))
+        first, second = np.argpartition(sq, 1)[:2]
+        if sq[second] < sq[first]:
+            first, second = second, first
+        best = float(np.sqrt(sq[first]))
+        return Match(best, int(first), float(np.sqrt(sq[second])) - best)
+
+COLLECTION_CACHE_SIZE = 1024
+_collections = OrderedDict()  # clave -> EmbeddingCollection, LRU
+_collections_lock = threading.Lock()
+
+
+def cached_collection(key, load, dims: Optional[int] = None) -> EmbeddingCollection:
+    """`EmbeddingCollection` compartida por el proceso para `key`.
+
+    `key` debe cambiar cuando cambian las muestras (p. ej. id del registro y
+    su `fecha_actualizacion`); `load()` retorna las muestras solo si falta.
+    """
+    key = (key, dims)
+    with _collections_lock:
+        collection = _collections.get(key)
+        if collection is not None:
+            _collections.move_to_end(key)
+            return collection
+    collection = EmbeddingCollection(load(), dims)
+    with _collections_lock:
+        _collections[key] = collection
+        while len(_collections) > COLLECTION_CACHE_SIZE:
+            _collections.popitem(last=False)
+    return collection
+
+
+def collection_for(owner, embeddings, dims: Optional[int] = None) -> EmbeddingCollection:
+    """`EmbeddingCollection` de `embeddings` cacheada en `owner`.
+
+    Se reconstruye si `embeddings` es otro objeto o cambió su longitud; no
+    detecta modificaciones de una muestra en su lugar.
+    """
+    cached = getattr(owner, '_embedding_collection', None)
+    if cached is not None and cached[0] is embeddings and cached[1] == len(embeddings) and cached[2] == dims:
+        return cached[3]
+    collection = EmbeddingCollection(embeddings, dims)
+    try:
+        owner._embedding_collection = (embeddings, len(embeddings), dims, collection)
+    except AttributeError:
+        pass
+    return collection
+
+
+def load_snapshot_from_db(version=()) -> GallerySnapshot:
+    """Construye la galería activa leyendo `datos_faciales` (sin índice).
+
+    Solo incluye usuarios que pueden iniciar sesión; como la marca de versión
+    no cubre los cambios de estado del usuario, las vistas revalidan además
+    al usuario encontrado.
+    """
+    from .models import DatosFaciales, unpack_embeddings
+    started = time.perf_counter()
+    rows = (
+        DatosFaciales.objects.filter(activo=True, usuario__is_active=True, usuario__estado='Activo')
+        .values_list('usuario_id', 'embeddings_blob', 'embedding_dim', 'embedding_dtype')
+        .iterator(chunk_size=2000)
+    )
+    snapshot = build_snapshot(
+        ((user_id, unpack_embeddings(blob, dim, dtype)) for user_id, blob, dim, dtype in rows),
+        version,
+    )
+    log.debug(
+        f'gallery: cargadas {snapshot.matrix.shape[0]} muestras '
+        f'en {(time.perf_counter() - started) * 1000:.1f} ms'
+    )
+    return snapshot
+
+
+class FacialGallery:
+    """Galería de embeddings activos, compartida por los hilos del proceso.
+
+    El índice IVF (k-means) se entrena en un hilo de fondo, nunca en la
+    petición: mientras se construye se sigue sirviendo la galería indexada
+    anterior o, si no la hay, la nueva con búsqueda exacta.
+    """
+
+    def __init__(self, ttl: Optional[float] = None):
+        self._lock = threading.Lock()
+        self._snapshot: Optional[GallerySnapshot] = None
+        self._checked_at = 0.0
+        self._ttl = ttl
+        self._stale = False
+        self._generation = 0  # generación de memoria compartida vista por última vez
+        self._building = None  # versión cuyo índice se entrena en segundo plano
+        self._builder: Optional[threading.Thread] = None
+
+    @property
+    def ttl(self) -> float:
+        if self._ttl is not None:
+            return self._ttl
+        return float(getattr(settings, 'FACIAL_GALLERY_TTL', 30))
+
+    def invalidate(self):
+        """Marca la galería como desactualizada; la siguiente consulta la recarga."""
+        with self._lock:
+            self._stale = True
+            self._checked_at = 0.0
+
+    def _load(self, version) -> GallerySnapshot:
+        from . import gallery_shm, gallery_store
+        snapshot = gallery_shm.load(version)
+        if snapshot is None:
+            snapshot = gallery_store.load(version)
+        if snapshot is None:
+            snapshot = load_snapshot_from_db(version)
+        return snapshot
+
+    def _start_index(self, snapshot: GallerySnapshot):
+        self._building = snapshot.version
+        self._builder = threading.Thread(
+            target=self._build_index, args=(snapshot,), name='facial-gallery-ivf', daemon=True
+        )
+        self._builder.start()
+
+    def _build_index(self, snapshot: GallerySnapshot):
+        try:
+            indexed = build_index(snapshot)
+        except Exception:
+            log.exception('gallery: fallo al construir el índice IVF; se usa búsqueda exacta')
+            indexed = snapshot
+        with self._lock:
+            if self._building != snapshot.version:
+                return  # ya se está indexando una versión más nueva
+            self._building = None
+            self._snapshot = indexed
+
+    def _published_generation(self) -> int:
+        from . import gallery_shm
+        reader = gallery_shm.get_reader()
+        return 0 if reader is None else reader.generation()
+
+    def snapshot(self) -> GallerySnapshot:
+        """Retorna la galería vigente, recargándola si cambió la versión en BD.
+
+        Con memoria compartida, una generación nueva publicada por el dueño
+        fuerza la verificación sin esperar el TTL.
+        """
+        snap = self._snapshot
+        now = time.monotonic()
+        generation = self._published_generation()
+        if snap is not None and now - self._checked_at < self.ttl and generation == self._generation:
+            return snap
+        with self._lock:
+            snap = self._snapshot
+            if snap is not None and now - self._checked_at < self.ttl and generation == self._generation:
+                return snap
+            self._generation = generation
+            version = gallery_version()
+            if snap is None or self._stale or (snap.version != version and self._building != version):
+                self._stale = False
+                fresh = self._load(version)
+                if needs_index(fresh):
+                    self._start_index(fresh)
+                    if snap is None or snap.index is None:
+                        self._snapshot = fresh
+                else:
+                    self._building = None
+                    self._snapshot = fresh
+                snap = self._snapshot
+            self._checked_at = time.monotonic()
+            return snap
+
+    def identify(self, live_emb, max_distance: float) -> Tuple[Optional[int], float]:
+        """Identifica al usuario más cercano si su distancia es `<= max_distance`.
+
+        Retorna `(usuario_id, distancia)`; `usuario_id` es `None` sin coincidencia.
+        """
+        user_id, distance = nearest(self.snapshot(), live_emb)
+        if user_id is None or distance > max_distance:
+            return None, distance
+        return user_id, distance
+
+    def current(self) -> Optional[GallerySnapshot]:
+        """Galería ya cargada, sin consultar la BD (`None` si aún no se cargó)."""
+        return self._snapshot
+
+    def __len__(self):
+        snap = self._snapshot
+        return 0 if snap is None else int(snap.matrix.shape[0])
+
+
+_gallery = FacialGallery()
+
+
+def get_gallery() -> FacialGallery:
+    """Galería compartida del proceso."""
+    return _gallery
@@ -0,0 +1,297 @@
+"""Galería facial en memoria compartida entre los workers de un mismo host.
+
+Con N workers WSGI cada proceso carga su propia copia de la galería. Con
+`FACIAL_GALLERY_SHM_NAME` configurado, un único proceso dueño por host
+(`python manage.py facial_gallery_owner`) publica la galería activa en
+segmentos de `multiprocessing.shared_memory` y los workers los adjuntan en
+solo lectura:
+
+- Un segmento por generación (`<nombre>_<pid>_<gen>`) con la matriz float32,
+  `sq_norms` y `user_ids` contiguos. Una vez publicado no se modifica.
+- Un segmento de control (`<nombre>_ctl`) con la generación vigente, su forma,
+  el nombre del segmento y la marca de versión de la BD, protegido por un
+  seqlock: el dueño incrementa el contador (impar) antes de escribir y otra
+  vez (par) al terminar; el lector reintenta si lo ve impar o si cambió
+  entre el inicio y el fin de la lectura. Así nunca se lee un estado a medias.
+- Al publicar la generación `g` el dueño elimina (`unlink`) la `g-2`. Los
+  workers que aún la tengan mapeada siguen leyéndola; sueltan cada segmento
+  cuando ya no quedan arreglos que lo referencien.
+
+Los workers comparan la marca de versión publicada con `gallery_version()`;
+si no coincide (el dueño aún no republicó), la galería se carga por la vía
+normal (snapshot en disco o BD). El índice IVF, si está activo, se sigue
+entrenando en cada proceso (en segundo plano, ver `FacialGallery`).
+"""
+import json
+import logging
+import os
+import struct
+import threading
+import time
+from typing import Optional
+
+from django.conf import settings
+
+from .gallery import GallerySnapshot
+
+try:
+    import numpy as np
+except Exception:  # pragma: no cover
+    np = None
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:  # pragma: no cover
+    shared_memory = None
+
+
+log = logging.getLogger('facial')
+
+# Segmento de control: seq, generación, filas, dimensión, largo del nombre,
+# largo de la versión; luego el nombre del segmento y la versión (JSON)
+_HEADER = struct.Struct('<QQQQII')
+_SEQ = struct.Struct('<Q')
+_NAME_MAX = 64
+_VERSION_MAX = 512
+CONTROL_SIZE = _HEADER.size + _NAME_MAX + _VERSION_MAX
+_READ_ATTEMPTS = 1000
+
+
+def shm_name() -> Optional[str]:
+    """Prefijo configurado (`FACIAL_GALLERY_SHM_NAME`), o `None` si está desactivado."""
+    if shared_memory is None:
+        return None
+    return getattr(settings, 'FACIAL_GALLERY_SHM_NAME', None) or None
+
+
+def _control_name(name):
+    return f'{name}_ctl'
+
+
+def _layout(rows, dim):
+    """Offsets de `sq_norms` y `user_ids` y tamaño total del segmento de datos."""
+    sq_offset = rows * dim * 4
+    ids_offset = sq_offset + rows * 4
+    ids_offset += -ids_offset % 8
+    return sq_offset, ids_offset, max(8, ids_offset + rows * 8)
+
+
+def _untrack(shm):
+    try:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except Exception:  # pragma: no cover
+        pass
+
+
+_owned = set()  # segmentos de datos creados (y registrados) por este proceso
+
+
+def _attach(name):
+    """Adjunta un segmento existente sin registrarlo en el `resource_tracker`.
+
+    En Python < 3.13 adjuntar también lo registra y el tracker lo eliminaría al
+    terminar el worker; solo el dueño debe eliminarlo.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        if shm.name not in _owned:
+            _untrack(shm)
+        return shm
+
+
+def read_control(buf):
+    """`(generación, filas, dim, segmento, versión)` consistente, o `None`.
+
+    `segmento` vacío indica que no hay galería publicada.
+    """
+    for attempt in range(_READ_ATTEMPTS):
+        seq = _SEQ.unpack_from(buf, 0)[0]
+        if seq & 1 == 0:
+            _, generation, rows, dim, name_len, version_len = _HEADER.unpack_from(buf, 0)
+            start = _HEADER.size
+            name = bytes(buf[start:start + min(name_len, _NAME_MAX)])
+            version = bytes(buf[start + _NAME_MAX:start + _NAME_MAX + min(version_len, _VERSION_MAX)])
+            if _SEQ.unpack_from(buf, 0)[0] == seq:
+                return generation, rows, dim, name.decode(), json.loads(version) if version else None
+        if attempt % 16 == 15:
+            time.sleep(0)
+    return None
+
+
+def write_control(buf, generation, rows, dim, segment, version):
+    """Publica una generación bajo el seqlock (un solo escritor: el dueño)."""
+    name = segment.encode()
+    payload = json.dumps(list(version)).encode()
+    if len(name) > _NAME_MAX or len(payload) > _VERSION_MAX:
+        raise ValueError('nombre de segmento o marca de versión demasiado largos')
+    seq = _SEQ.unpack_from(buf, 0)[0]
+    _SEQ.pack_into(buf, 0, seq + 1)
+    _HEADER.pack_into(buf, 0, seq + 1, generation, rows, dim, len(name), len(payload))
+    start = _HEADER.size
+    buf[start:start + len(name)] = name
+    buf[start + _NAME_MAX:start + _NAME_MAX + len(payload)] = payload
+    _SEQ.pack_into(buf, 0, seq + 2)
+
+
+class GalleryOwner:
+    """Proceso dueño: crea los segmentos y publica cada generación.
+
+    El segmento de control sobrevive al dueño (no queda en su
+    `resource_tracker`): al reiniciarse continúa la numeración y los workers
+    conservan su mapeo. Los segmentos de datos sí se eliminan al cerrar.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        try:
+            self.control = shared_memory.SharedMemory(name=_control_name(name), create=True, size=CONTROL_SIZE)
+            _untrack(self.control)
+            self.control.buf[:CONTROL_SIZE] = bytes(CONTROL_SIZE)
+        except FileExistsError:
+            self.control = _attach(_control_name(name))
+        published = read_control(self.control.buf)
+        self.generation = published[0] if published else 0
+        self._segments = []  # (generación, SharedMemory) publicados por este dueño
+
+    def publish(self, snapshot: GallerySnapshot) -> int:
+        """Copia `snapshot` a un segmento nuevo y lo publica; retorna la generación."""
+        rows = int(snapshot.matrix.shape[0])
+        dim = int(snapshot.matrix.shape[1]) if snapshot.matrix.ndim == 2 else 0
+        sq_offset, ids_offset, size = _layout(rows, dim)
+        generation = self.generation + 1
+        segment = shared_memory.SharedMemory(
+            name=f'{self.name}_{os.getpid()}_{generation}', create=True, size=size
+        )
+        _owned.add(segment.name)
+        try:
+            views = _views(segment.buf, rows, dim, sq_offset, ids_offset)
+            views[0][...] = snapshot.matrix
+            views[1][...] = snapshot.sq_norms
+            views[2][...] = snapshot.user_ids
+            del views
+            write_control(self.control.buf, generation, rows, dim, segment.name, snapshot.version)
+        except Exception:
+            _drop(segment)
+            raise
+        self.generation = generation
+        self._segments.append((generation, segment))
+        # Se conserva la generación anterior para los lectores que aún la adjuntan
+        while len(self._segments) > 2:
+            _drop(self._segments.pop(0)[1])
+        log.info(f'gallery_shm: generación {generation} publicada ({rows} muestras) en {segment.name}')
+        return generation
+
+    def close(self):
+        """Retira la galería publicada y elimina los segmentos de datos."""
+        if self.control.buf is None:
+            return
+        self.generation += 1
+        write_control(self.control.buf, self.generation, 0, 0, '', ())
+        for _, segment in self._segments:
+            _drop(segment)
+        self._segments = []
+        self.control.close()
+
+
+def _drop(segment):
+    segment.close()
+    segment.unlink()
+    _owned.discard(segment.name)
+
+
+def unlink(name: str):
+    """Elimina el segmento de control (desinstalación; con el dueño detenido)."""
+    control = shared_memory.SharedMemory(name=_control_name(name))
+    control.close()
+    control.unlink()
+
+
+def _views(buf, rows, dim, sq_offset, ids_offset):
+    matrix = np.ndarray((rows, dim), dtype=np.float32, buffer=buf, offset=0)
+    sq_norms = np.ndarray((rows,), dtype=np.float32, buffer=buf, offset=sq_offset)
+    user_ids = np.ndarray((rows,), dtype=np.int64, buffer=buf, offset=ids_offset)
+    return matrix, sq_norms, user_ids
+
+
+class GalleryReader:
+    """Lado del worker: adjunta la generación publicada en solo lectura."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._control = None
+        self._attached = {}  # nombre del segmento -> SharedMemory
+
+    def _control_buf(self):
+        if self._control is None:
+            self._control = _attach(_control_name(self.name))
+        return self._control.buf
+
+    def generation(self) -> int:
+        """Generación publicada (0 si no hay dueño o aún no publicó)."""
+        try:
+            published = read_control(self._control_buf())
+        except FileNotFoundError:
+            return 0
+        return published[0] if published else 0
+
+    def load(self, version) -> Optional[GallerySnapshot]:
+        """Galería publicada si su marca coincide con `version`, o `None`."""
+        with self._lock:
+            try:
+                published = read_control(self._control_buf())
+                if published is None:
+                    return None
+                generation, rows, dim, segment, published_version = published
+                if not segment:
+                    return None
+                if published_version != list(version):
+                    log.debug(f'gallery_shm: generación {generation} desactualizada')
+                    return None
+                shm = self._attached.get(segment)
+                if shm is None:
+                    shm = self._attached[segment] = _attach(segment)
+            except FileNotFoundError:
+                # Sin dueño, o la generación ya fue reemplazada y eliminada
+                return None
+            self._release_old(segment)
+        sq_offset, ids_offset, _ = _layout(rows, dim)
+        arrays = _views(shm.buf, rows, dim, sq_offset, ids_offset)
+        for array in arrays:
+            array.flags.writeable = False
+        matrix, sq_norms, user_ids = arrays
+        log.debug(f'gallery_shm: adjuntada la generación {generation} ({rows} muestras)')
+        return GallerySnapshot(matrix=matrix, sq_norms=sq_norms, user_ids=user_ids, version=version)
+
+    def _release_old(self, current):
+        # Un segmento con arreglos vivos no se puede cerrar (BufferError): se reintenta luego
+        for segment in [s for s in self._attached if s != current]:
+            try:
+                self._attached[segment].close()
+            except BufferError:
+                continue
+            del self._attached[segment]
+
+
+_readers = {}
+_readers_lock = threading.Lock()
+
+
+def get_reader() -> Optional[GalleryReader]:
+    """Lector compartido del proceso, o `None` si la memoria compartida está desactivada."""
+    name = shm_name()
+    if name is None:
+        return None
+    reader = _readers.get(name)
+    if reader is None:
+        with _readers_lock:
+            reader = _readers.setdefault(name, GalleryReader(name))
+    return reader
+
+
+def load(version) -> Optional[GallerySnapshot]:
+    """Galería publicada por el dueño del host para `version`, o `None`."""
+    reader = get_reader()
+    return None if reader is None else reader.load(version)
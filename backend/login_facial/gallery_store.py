@@ -0,0 +1,168 @@
+"""Snapshot en disco de la galería facial, compartido por los workers.
+
+Sin snapshot, cada worker reconstruye la galería al arrancar leyendo toda la
+tabla `datos_faciales` y desempaquetando cada blob. `export` escribe la
+galería activa en `FACIAL_GALLERY_SNAPSHOT_DIR`:
+
+    <dir>/v-<digest>/matrix.npy     (n_muestras, dim) float32
+    <dir>/v-<digest>/sq_norms.npy   (n_muestras,) float32
+    <dir>/v-<digest>/user_ids.npy   (n_muestras,) int64
+    <dir>/v-<digest>/manifest.json  marca de versión, forma y fecha
+    <dir>/current.json              apunta al directorio vigente
+
+Cada versión se escribe en un directorio temporal y se publica con
+`os.replace` (atómico), de modo que un lector nunca ve un snapshot a medias.
+`load` abre las matrices con `np.load(mmap_mode='r')`: los workers comparten
+las páginas del page cache y arrancan sin tocar la tabla. La consistencia la
+da la marca de versión de la BD (`gallery_version`): un snapshot cuya marca
+no coincide con la actual se ignora y la galería se carga desde la BD.
+
+Lo generan `python manage.py facial_gallery_snapshot` (una vez, o con
+`--watch` como proceso de fondo que reexporta al cambiar la versión).
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from django.conf import settings
+
+from .gallery import GallerySnapshot, gallery_version, load_snapshot_from_db
+
+try:
+    import numpy as np
+except Exception:  # pragma: no cover
+    np = None
+
+
+log = logging.getLogger('facial')
+
+CURRENT = 'current.json'
+MANIFEST = 'manifest.json'
+ARRAYS = ('matrix', 'sq_norms', 'user_ids')
+FORMAT = 1
+
+
+def snapshot_dir() -> Optional[str]:
+    """Directorio configurado (`FACIAL_GALLERY_SNAPSHOT_DIR`), o `None` si está desactivado."""
+    directory = getattr(settings, 'FACIAL_GALLERY_SNAPSHOT_DIR', None)
+    return str(directory) if directory else None
+
+
+def _version_key(version) -> list:
+    # La marca es una tupla; en JSON viaja como lista
+    return list(version)
+
+
+def _digest(version) -> str:
+    return hashlib.sha1(json.dumps(_version_key(version)).encode()).hexdigest()[:16]
+
+
+def _read_json(path):
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def _write_json(path, data):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as fh:
+        json.dump(data, fh)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+
+
+def export(directory: Optional[str] = None, snapshot: Optional[GallerySnapshot] = None,
+           keep: int = 2) -> dict:
+    """Escribe `snapshot` (o la galería activa de la BD) y lo publica como vigente.
+
+    Conserva las `keep` versiones más recientes; los workers que aún mapean
+    una versión borrada siguen leyéndola hasta soltarla. Retorna el manifiesto.
+    """
+    directory = directory or snapshot_dir()
+    if not directory:
+        raise ValueError('FACIAL_GALLERY_SNAPSHOT_DIR no está configurado')
+    os.makedirs(directory, exist_ok=True)
+    if snapshot is None:
+        snapshot = load_snapshot_from_db(gallery_version())
+
+    name = f'v-{_digest(snapshot.version)}'
+    manifest = {
+        'format': FORMAT,
+        'name': name,
+        'version': _version_key(snapshot.version),
+        'rows': int(snapshot.matrix.shape[0]),
+        'dim': int(snapshot.matrix.shape[1]) if snapshot.matrix.ndim == 2 else 0,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+    }
+    target = os.path.join(directory, name)
+    if not os.path.isdir(target):
+        tmp = tempfile.mkdtemp(prefix='.tmp-', dir=directory)
+        try:
+            for field in ARRAYS:
+                with open(os.path.join(tmp, f'{field}.npy'), 'wb') as fh:
+                    np.save(fh, np.ascontiguousarray(getattr(snapshot, field)), allow_pickle=False)
+                    fh.flush()
+                    os.fsync(fh.fileno())
+            _write_json(os.path.join(tmp, MANIFEST), manifest)
+            os.replace(tmp, target)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.isdir(target):  # otro exportador pudo publicarla primero
+                raise
+    _write_json(os.path.join(directory, CURRENT), {'name': name, 'version': manifest['version']})
+    _prune(directory, name, keep)
+    log.info(f"gallery_store: snapshot {name} con {manifest['rows']} muestras en {directory}")
+    return manifest
+
+
+def _prune(directory, current, keep):
+    versions = [
+        entry for entry in os.scandir(directory)
+        if entry.is_dir() and entry.name.startswith('v-') and entry.name != current
+    ]
+    versions.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in versions[max(0, keep - 1):]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def load(version, directory: Optional[str] = None) -> Optional[GallerySnapshot]:
+    """Snapshot vigente mapeado en memoria si su marca coincide con `version`.
+
+    Retorna `None` si no hay snapshot, está desactualizado o no se puede leer.
+    """
+    directory = directory or snapshot_dir()
+    if not directory:
+        return None
+    started = time.perf_counter()
+    try:
+        current = _read_json(os.path.join(directory, CURRENT))
+        if current.get('version') != _version_key(version):
+            log.debug(f"gallery_store: snapshot {current.get('name')} desactualizado")
+            return None
+        path = os.path.join(directory, current['name'])
+        manifest = _read_json(os.path.join(path, MANIFEST))
+        if manifest.get('format') != FORMAT or manifest.get('version') != _version_key(version):
+            return None
+        # Un arreglo vacío no se puede mapear; se lee normalmente
+        mmap_mode = 'r' if manifest['rows'] else None
+        arrays = {
+            field: np.load(os.path.join(path, f'{field}.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+            for field in ARRAYS
+        }
+    except (OSError, ValueError, KeyError) as exc:
+        log.warning(f'gallery_store: no se pudo leer el snapshot de {directory}: {exc}')
+        return None
+    if arrays['matrix'].shape[0] != manifest['rows'] or arrays['user_ids'].shape[0] != manifest['rows']:
+        log.warning(f"gallery_store: snapshot {manifest['name']} inconsistente con su manifiesto")
+        return None
+    log.debug(
+        f"gallery_store: snapshot {manifest['name']} mapeado ({manifest['rows']} muestras) "
+        f'en {(time.perf_counter() - started) * 1000:.1f} ms'
+    )
+    return GallerySnapshot(version=version, **arrays)
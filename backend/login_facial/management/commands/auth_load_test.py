@@ -0,0 +1,393 @@
+"""Generador de carga end-to-end para la API de autenticación.
+
+Siembra una base SQLite temporal con `--users` usuarios (contraseña común y
+rostro sintético registrado), levanta la app en un subproceso, ejecuta una
+mezcla ponderada de peticiones con `--concurrency` hilos durante `--duration`
+segundos y reporta por endpoint: peticiones, códigos HTTP, errores (5xx o
+fallo de conexión), throughput y latencias p50/p95/p99.
+
+- `--servers wsgi,asgi` compara despliegues: WSGI con `gunicorn` (o
+  `runserver --noreload` si no está instalado) y ASGI con `uvicorn` (o
+  `daphne`). Con `--async-views` los logins van a `auth/async/...` en ASGI.
+- `--seed-only --fixture f.json` solo siembra la base de `DJANGO_DB_PATH` y
+  guarda las credenciales; `--url http://host:puerto/api/ --fixture f.json`
+  ataca un servidor ya levantado sobre esa base.
+
+Ejemplo:
+    python manage.py auth_load_test --users 2000 --servers wsgi,asgi --concurrency 32 --duration 30
+"""
+import argparse
+import http.client
+import importlib.util
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+
+from login_facial import search
+from login_facial.management.commands.facial_benchmark import synthetic_face
+from login_facial.models import DatosFaciales, Usuario
+from login_facial.views import _compute_embedding_from_b64
+
+ENDPOINTS = ('login', 'facial-login', 'me', 'users')
+LOAD_DOMAIN = 'loadtest.local'
+
+
+def parse_mix(value):
+    """`'login=2,me=5'` -> `{'login': 2.0, 'me': 5.0}` (solo pesos positivos)."""
+    mix = {}
+    for part in value.split(','):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise CommandError(f'Endpoint desconocido en --mix: {name} (opciones: {", ".join(ENDPOINTS)})')
+        mix[name] = float(weight or 1)
+    mix = {k: v for k, v in mix.items() if v > 0}
+    if not mix:
+        raise CommandError('--mix no tiene endpoints con peso positivo')
+    return mix
+
+
+def seed_users(n, password, seed=0):
+    """Crea `n` usuarios de carga con un rostro sintético registrado cada uno.
+
+    Retorna el fixture de credenciales que usa el generador de carga.
+    """
+    hashed = make_password(password)  # un solo hash para todos: sembrar es O(n)
+    users = []
+    for i in range(n):
+        email = f'carga{i}@{LOAD_DOMAIN}'
+        users.append(Usuario(
+            email=email, username=email, dni=f'{90000000 + i}', nombres='Carga', apellidos=str(i),
+            password=hashed, face_registered=True, rol='Administrador' if i == 0 else 'Analista',
+        ))
+    Usuario.objects.bulk_create(users, batch_size=1000)
+    ids = dict(Usuario.objects.filter(email__endswith=f'@{LOAD_DOMAIN}').values_list('email', 'id'))
+    for user in users:
+        user.pk = ids[user.email]
+    search.index_users(users)  # bulk_create no emite señales
+
+    datos = []
+    for i, user in enumerate(users):
+        embedding = _compute_embedding_from_b64(synthetic_face(seed + i))
+        if embedding is None:
+            continue
+        registro = DatosFaciales(usuario_id=ids[user.email], posiciones=[])
+        registro.establecer_embeddings([embedding])
+        datos.append(registro)
+    DatosFaciales.objects.bulk_create(datos, batch_size=1000)
+    return {
+        'password': password,
+        'seed': seed,
+        'users': [{'email': u.email, 'dni': u.dni, 'face_seed': seed + i} for i, u in enumerate(users)],
+    }
+
+
+def summarize(records, elapsed):
+    """Agrega `(endpoint, status, segundos)` en métricas por endpoint."""
+    report = {}
+    for name in sorted({r[0] for r in records}):
+        rows = [r for r in records if r[0] == name]
+        ms = np.asarray([r[2] for r in rows], dtype=np.float64) * 1000
+        codes = {}
+        for _, code, _ in rows:
+            key = str(code) if code is not None else 'conn_error'
+            codes[key] = codes.get(key, 0) + 1
+        errors = sum(1 for _, code, _ in rows if code is None or code >= 500)
+        report[name] = {
+            'requests': len(rows),
+            'rps': round(len(rows) / elapsed, 2) if elapsed else None,
+            'errors': errors,
+            'error_rate': round(errors / len(rows), 4),
+            'non_2xx': sum(1 for _, code, _ in rows if code is None or not 200 <= code < 300),
+            'status': codes,
+            'p50_ms': round(float(np.percentile(ms, 50)), 2),
+            'p95_ms': round(float(np.percentile(ms, 95)), 2),
+            'p99_ms': round(float(np.percentile(ms, 99)), 2),
+            'max_ms': round(float(ms.max()), 2),
+        }
+    return report
+
+
+class _Client:
+    """Cliente HTTP/1.1 mínimo con una conexión keep-alive por hilo."""
+
+    def __init__(self, base_url, timeout=30.0):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.prefix = parts.path.rstrip('/') + '/'
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self, fresh=False):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or fresh:
+            if conn is not None:
+                conn.close()
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def request(self, method, path, body=None, token=None):
+        """Retorna `(status, cuerpo)`; reintenta una vez si el servidor cerró la conexión."""
+        headers = {'Accept': 'application/json'}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        for attempt in range(2):
+            conn = self._connection(fresh=attempt > 0)
+            try:
+                conn.request(method, self.prefix + path, body=payload, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+                if response.getheader('Connection', '').lower() == 'close':
+                    self._connection(fresh=True)
+                return response.status, data
+            except (ConnectionError, http.client.HTTPException):
+                if attempt:
+                    raise
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _server_command(kind, port, workers):
+    """Comando para levantar la app; retorna `(argv, nombre_del_servidor)`."""
+    manage = str(Path(settings.BASE_DIR) / 'manage.py')
+    bind = f'127.0.0.1:{port}'
+    if kind == 'wsgi':
+        if importlib.util.find_spec('gunicorn'):
+            return ([sys.executable, '-m', 'gunicorn', 'core.wsgi:application', '-b', bind,
+                     '-w', str(workers), '--threads', '8'], 'gunicorn')
+        return [sys.executable, manage, 'runserver', bind, '--noreload'], 'runserver'
+    if importlib.util.find_spec('uvicorn'):
+        return ([sys.executable, '-m', 'uvicorn', 'core.asgi:application', '--host', '127.0.0.1',
+                 '--port', str(port), '--workers', str(workers), '--log-level', 'warning'], 'uvicorn')
+    if importlib.util.find_spec('daphne'):
+        return ([sys.executable, '-m', 'daphne', '-b', '127.0.0.1', '-p', str(port),
+                 'core.asgi:application'], 'daphne')
+    raise CommandError('Para ASGI instale uvicorn o daphne')
+
+
+@contextmanager
+def _running_server(kind, env, workers, log_path):
+    """Levanta el servidor en un subproceso y espera a que acepte conexiones."""
+    port = _free_port()
+    argv, name = _server_command(kind, port, workers)
+    with open(log_path, 'ab') as log:
+        proc = subprocess.Popen(argv, cwd=settings.BASE_DIR, env=env, stdout=log, stderr=log)
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            if proc.poll() is not None:
+                raise CommandError(f'{name} terminó al arrancar (ver {log_path})')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise CommandError(f'{name} no respondió en 60 s (ver {log_path})')
+                time.sleep(0.2)
+        yield f'http://127.0.0.1:{port}/api/', name
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+class Command(BaseCommand):
+    help = 'Prueba de carga de auth/login, auth/facial-login, auth/me y users con percentiles de latencia'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500, help='Usuarios con rostro a sembrar')
+        parser.add_argument('--servers', default='wsgi', help='Despliegues a comparar: wsgi,asgi')
+        parser.add_argument('--server-workers', type=int, default=1, help='Procesos del servidor')
+        parser.add_argument('--async-views', action='store_true',
+                            help='En ASGI usar auth/async/login/ y auth/async/facial-login/')
+        parser.add_argument('--concurrency', type=int, default=16, help='Clientes concurrentes')
+        parser.add_argument('--duration', type=float, default=20, help='Segundos de carga por servidor')
+        parser.add_argument('--mix', default='login=2,facial-login=2,me=5,users=1',
+                            help='Pesos por endpoint (login, facial-login, me, users)')
+        parser.add_argument('--identify', action='store_true',
+                            help='Login facial 1:N (sin DNI) en lugar de verificación 1:1')
+        parser.add_argument('--frame-users', type=int, default=50,
+                            help='Usuarios distintos cuyos rostros se envían en el login facial')
+        parser.add_argument('--frame-variants', type=int, default=4,
+                            help='Capturas distintas por usuario (limita aciertos de caché)')
+        parser.add_argument('--url', help='Atacar un servidor ya levantado (requiere --fixture)')
+        parser.add_argument('--fixture', help='Archivo JSON de credenciales sembradas')
+        parser.add_argument('--seed-only', action='store_true',
+                            help='Solo sembrar la base actual y escribir --fixture')
+        parser.add_argument('--password', default='Carga.2024!', help=argparse.SUPPRESS)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true', help='Emitir el reporte como JSON')
+
+    def handle(self, *args, **options):
+        if options['seed_only']:
+            if not options['fixture']:
+                raise CommandError('--seed-only requiere --fixture')
+            if Usuario.objects.filter(email__endswith=f'@{LOAD_DOMAIN}').exists():
+                raise CommandError('La base ya contiene usuarios de carga')
+            fixture = seed_users(options['users'], options['password'], options['seed'])
+            Path(options['fixture']).write_text(json.dumps(fixture))
+            self.stdout.write(f"{len(fixture['users'])} usuarios sembrados")
+            return
+
+        mix = parse_mix(options['mix'])
+        if options['url']:
+            if not options['fixture']:
+                raise CommandError('--url requiere --fixture (generado con --seed-only)')
+            fixture = json.loads(Path(options['fixture']).read_text())
+            results = {'external': self.run_load(options['url'], fixture, mix, options, 'external')}
+        else:
+            results = self.run_local(mix, options)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.write_report(results)
+
+    def run_local(self, mix, options):
+        kinds = [k.strip() for k in options['servers'].split(',') if k.strip()]
+        if set(kinds) - {'wsgi', 'asgi'}:
+            raise CommandError('--servers acepta wsgi y/o asgi')
+        workdir = Path(tempfile.mkdtemp(prefix='auth_load_'))
+        env = dict(os.environ, DJANGO_DB_PATH=str(workdir / 'load.sqlite3'),
+                   DJANGO_SETTINGS_MODULE='core.settings', PYTHONUNBUFFERED='1')
+        manage = str(Path(settings.BASE_DIR) / 'manage.py')
+        fixture_path = workdir / 'fixture.json'
+
+        self.stderr.write(f'Sembrando {options["users"]} usuarios en {workdir}...')
+        for argv in (
+            [sys.executable, manage, 'migrate', '--noinput', '-v', '0'],
+            [sys.executable, manage, 'auth_load_test', '--seed-only', '--users', str(options['users']),
+             '--seed', str(options['seed']), '--fixture', str(fixture_path)],
+        ):
+            done = subprocess.run(argv, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+            if done.returncode != 0:
+                raise CommandError(f'Falló la siembra: {done.stderr.strip()[-2000:]}')
+        fixture = json.loads(fixture_path.read_text())
+
+        results = {}
+        for kind in kinds:
+            with _running_server(kind, env, options['server_workers'], workdir / f'{kind}.log') as (url, name):
+                self.stderr.write(f'{kind} ({name}) en {url}: {options["duration"]} s de carga...')
+                results[kind] = self.run_load(url, fixture, mix, options, kind)
+                results[kind]['server'] = name
+        return results
+
+    def run_load(self, base_url, fixture, mix, options, kind):
+        client = _Client(base_url)
+        rng = random.Random(options['seed'])
+        users = fixture['users']
+        password = fixture['password']
+        async_paths = options['async_views'] and kind == 'asgi'
+        login_path = 'auth/async/login/' if async_paths else 'auth/login/'
+        facial_path = 'auth/async/facial-login/' if async_paths else 'auth/facial-login/'
+
+        # Frames pre-generados: el costo de codificarlos no cuenta como latencia
+        face_users = rng.sample(users, min(options['frame_users'], len(users)))
+        frames = [
+            (user['dni'], synthetic_face(user['face_seed'], variant=v))
+            for user in face_users
+            for v in range(max(options['frame_variants'], 1))
+        ]
+
+        # Tokens para auth/me y users (también calienta el servidor)
+        tokens = []
+        for user in rng.sample(users, min(options['concurrency'], len(users))):
+            code, body = client.request('POST', login_path, {'email': user['email'], 'password': password})
+            if code != 200:
+                raise CommandError(f'No se pudo obtener token de calentamiento ({code}): {body[:200]!r}')
+            tokens.append(json.loads(body)['tokens']['access'])
+
+        def build(name, wrng, worker):
+            if name == 'login':
+                user = wrng.choice(users)
+                return 'POST', login_path, {'email': user['email'], 'password': password}, None
+            if name == 'facial-login':
+                dni, frame = wrng.choice(frames)
+                body = {'facial_data': frame}
+                if not options['identify']:
+                    body['dni'] = dni
+                return 'POST', facial_path, body, None
+            token = tokens[worker % len(tokens)]
+            return 'GET', 'auth/me/' if name == 'me' else 'users/', None, token
+
+        names, weights = list(mix), list(mix.values())
+        started = time.perf_counter()
+        deadline = started + options['duration']
+
+        def worker(index):
+            wrng = random.Random(options['seed'] * 1000 + index)
+            records = []
+            while time.perf_counter() < deadline:
+                name = wrng.choices(names, weights)[0]
+                method, path, body, token = build(name, wrng, index)
+                t0 = time.perf_counter()
+                try:
+                    code, _ = client.request(method, path, body, token)
+                except Exception:
+                    code = None
+                records.append((name, code, time.perf_counter() - t0))
+            client.close()
+            return records
+
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            records = [r for rs in pool.map(worker, range(options['concurrency'])) for r in rs]
+        elapsed = time.perf_counter() - started
+        total_errors = sum(1 for _, code, _ in records if code is None or code >= 500)
+        return {
+            'concurrency': options['concurrency'],
+            'duration_s': round(elapsed, 2),
+            'requests': len(records),
+            'rps': round(len(records) / elapsed, 2),
+            'error_rate': round(total_errors / len(records), 4) if records else None,
+            'endpoints': summarize(records, elapsed),
+        }
+
+    def write_report(self, results):
+        for kind, result in results.items():
+            self.stdout.write(
+                f"\n{kind} ({result.get('server', '-')}): {result['requests']} peticiones en "
+                f"{result['duration_s']} s -> {result['rps']} req/s, errores {result['error_rate']:.2%}"
+            )
+            self.stdout.write(
+                f"  {'endpoint':<13} {'reqs':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+                f"{'p99 ms':>8} {'errores':>8}  códigos"
+            )
+            for name, e in result['endpoints'].items():
+                codes = ' '.join(f'{c}:{n}' for c, n in sorted(e['status'].items()))
+                self.stdout.write(
+                    f"  {name:<13} {e['requests']:>6} {e['rps']:>8.1f} {e['p50_ms']:>8.1f} "
+                    f"{e['p95_ms']:>8.1f} {e['p99_ms']:>8.1f} {e['error_rate']:>8.2%}  {codes}"
+                )
@@ -0,0 +1,134 @@
+"""Reporte de recall vs. latencia del índice IVF de la galería facial.
+
+Construye el índice sobre los embeddings activos de `DatosFaciales` (o sobre
+una galería sintética con `--synthetic N`), genera consultas ruidosas a partir
+de muestras existentes y compara cada `nprobe` contra la búsqueda exacta.
+
+Ejemplo:
+    python manage.py facial_ann_report --synthetic 100000 --nprobe 1,4,8,16,32
+"""
+import json
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from login_facial.ann import IVFIndex
+from login_facial.gallery import build_snapshot, get_gallery, nearest
+
+
+def synthetic_gallery(n_users, dim=128, samples=1, seed=0):
+    """Galería sintética agrupada que imita la geometría de embeddings faciales.
+
+    Las identidades se reparten alrededor de centros comunes (la distancia
+    entre personas distintas queda muy por encima de 0.6) y cada muestra
+    extra de una persona añade un ruido pequeño.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 0.09, size=(64, dim)).astype(np.float32)
+    identities = centers[rng.integers(64, size=n_users)] + rng.normal(0, 0.05, size=(n_users, dim)).astype(np.float32)
+    rows = []
+    for uid in range(n_users):
+        block = identities[uid] + rng.normal(0, 0.01, size=(samples, dim)).astype(np.float32)
+        rows.append((uid + 1, block))
+    return build_snapshot(rows)
+
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) * 1000 if values else 0.0
+
+
+class Command(BaseCommand):
+    help = 'Mide recall y latencia del índice IVF frente a la búsqueda exacta'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--synthetic', type=int, default=0,
+                            help='Usar una galería sintética de N usuarios en lugar de la BD')
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--nlist', type=int, default=0, help='Listas IVF (0 = sqrt(n))')
+        parser.add_argument('--nprobe', default='1,2,4,8,16,32',
+                            help='Valores de nprobe separados por coma')
+        parser.add_argument('--tolerance', type=float, default=0.6,
+                            help='Umbral de coincidencia (igual que _compare_faces)')
+        parser.add_argument('--noise', type=float, default=0.03,
+                            help='Desviación del ruido gaussiano por dimensión en las consultas')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true', help='Emitir el reporte como JSON')
+
+    def handle(self, *args, **options):
+        if options['synthetic']:
+            snapshot = synthetic_gallery(options['synthetic'], seed=options['seed'])
+        else:
+            snapshot = get_gallery().snapshot()._replace(index=None)
+        n = snapshot.matrix.shape[0]
+        if n == 0:
+            raise CommandError('La galería está vacía')
+
+        rng = np.random.default_rng(options['seed'] + 1)
+        rows = rng.integers(n, size=options['queries'])
+        queries = snapshot.matrix[rows] + rng.normal(
+            0, options['noise'], size=(rows.size, snapshot.matrix.shape[1])
+        ).astype(np.float32)
+        tol = options['tolerance']
+
+        exact, exact_times = [], []
+        for q in queries:
+            started = time.perf_counter()
+            exact.append(nearest(snapshot, q, exact=True))
+            exact_times.append(time.perf_counter() - started)
+        exact_matches = [i for i, (_, dist) in enumerate(exact) if dist <= tol]
+
+        started = time.perf_counter()
+        index = IVFIndex(n_lists=options['nlist'], seed=options['seed']).fit(snapshot.matrix)
+        build_ms = (time.perf_counter() - started) * 1000
+        indexed = snapshot._replace(index=index)
+
+        report = {
+            'gallery_size': n,
+            'dim': int(snapshot.matrix.shape[1]),
+            'n_lists': index.n_lists,
+            'build_ms': round(build_ms, 1),
+            'tolerance': tol,
+            'queries': int(rows.size),
+            'exact': {
+                'mean_ms': round(float(np.mean(exact_times)) * 1000, 3),
+                'p95_ms': round(_percentile(exact_times, 95), 3),
+                'matches': len(exact_matches),
+            },
+            'ivf': [],
+        }
+        for nprobe in sorted({int(v) for v in options['nprobe'].split(',') if v.strip()}):
+            index.nprobe = nprobe
+            found, times = [], []
+            for q in queries:
+                started = time.perf_counter()
+                found.append(nearest(indexed, q))
+                times.append(time.perf_counter() - started)
+            same_user = sum(1 for a, b in zip(found, exact) if a[0] == b[0])
+            kept = sum(1 for i in exact_matches if found[i][0] == exact[i][0] and found[i][1] <= tol)
+            report['ivf'].append({
+                'nprobe': nprobe,
+                'recall_at_1': round(same_user / len(queries), 4),
+                'match_recall': round(kept / len(exact_matches), 4) if exact_matches else None,
+                'mean_ms': round(float(np.mean(times)) * 1000, 3),
+                'p95_ms': round(_percentile(times, 95), 3),
+            })
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(
+            f"Galería: {n} muestras x {report['dim']} dims, {index.n_lists} listas "
+            f"(construcción {report['build_ms']} ms)"
+        )
+        self.stdout.write(
+            f"Exacta: media {report['exact']['mean_ms']} ms, p95 {report['exact']['p95_ms']} ms, "
+            f"{len(exact_matches)}/{rows.size} consultas con distancia <= {tol}"
+        )
+        self.stdout.write(f"{'nprobe':>7} {'recall@1':>9} {'recall@tol':>11} {'media ms':>9} {'p95 ms':>8}")
+        for r in report['ivf']:
+            match_recall = '-' if r['match_recall'] is None else f"{r['match_recall']:.4f}"
+            self.stdout.write(
+                f"{r['nprobe']:>7} {r['recall_at_1']:>9.4f} {match_recall:>11} "
+                f"{r['mean_ms']:>9.3f} {r['p95_ms']:>8.3f}"
+            )
@@ -0,0 +1,329 @@
+"""Benchmark offline y reproducible del pipeline facial.
+
+Usa frames y galerías sintéticas (no necesita cámara ni datos reales) y mide:
+
+- `pipeline`: ms por etapa (`decode`, `downscale`, `detect`, `encode`) de un
+  frame de login, con p50/p95.
+- `matching`: búsqueda 1:N exacta (y opcionalmente IVF) sobre galerías de
+  `--sizes` usuarios.
+- `register`: throughput de registro (muestras/s) con `_compute_embeddings_batch`.
+- `load`: tiempo de carga de la galería desde JSON (formato anterior) frente
+  al blob binario actual.
+
+Cada sección reporta además el pico de memoria (`tracemalloc`, en una pasada
+aparte; `--no-memory` la omite). Con `--json` o `--output` el resultado es
+JSON con claves estables para compararlo entre commits; `--compare base.json`
+imprime la variación porcentual.
+
+Ejemplo:
+    python manage.py facial_benchmark --sizes 1000,10000,100000 --output bench.json
+    python manage.py facial_benchmark --compare bench.json
+"""
+import base64
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import cv2
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from login_facial.ann import IVFIndex
+from login_facial.gallery import build_snapshot, nearest
+from login_facial.management.commands.facial_ann_report import synthetic_gallery
+from login_facial.models import pack_embeddings, unpack_embeddings
+from login_facial.views import _compute_embedding_from_b64, _compute_embeddings_batch
+
+SECTIONS = ('pipeline', 'matching', 'register', 'load')
+STAGES = ('decode', 'downscale', 'detect', 'encode')
+
+
+def synthetic_face(seed=0, size=(480, 640), variant=0):
+    """Frame JPEG base64 con un rostro esquemático sobre fondo ruidoso.
+
+    `seed` fija la "identidad" (posición, tamaño y tono); `variant` añade un
+    ruido leve distinto para simular capturas sucesivas de la misma persona.
+    """
+    rng = np.random.default_rng(seed)
+    h, w = size
+    frame = rng.integers(40, 90, size=(h, w, 3), dtype=np.uint8)
+    cx, cy = w // 2 + int(rng.integers(-40, 40)), h // 2 + int(rng.integers(-30, 30))
+    rx, ry = w // 8, h // 5
+    skin = tuple(int(v) for v in rng.integers(120, 220, size=3))
+    cv2.ellipse(frame, (cx, cy), (rx, ry), 0, 0, 360, skin, -1)
+    for dx in (-rx // 2, rx // 2):
+        cv2.circle(frame, (cx + dx, cy - ry // 4), max(rx // 8, 2), (30, 30, 30), -1)
+    cv2.ellipse(frame, (cx, cy + ry // 2), (rx // 3, ry // 10), 0, 0, 180, (40, 40, 120), 2)
+    if variant:
+        jitter = np.random.default_rng([seed, variant]).integers(-4, 5, size=frame.shape)
+        frame = np.clip(frame.astype(np.int16) + jitter, 0, 255).astype(np.uint8)
+    ok, buf = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+    return 'data:image/jpeg;base64,' + base64.b64encode(buf.tobytes()).decode()
+
+
+def _ms_stats(seconds):
+    ms = np.asarray(seconds, dtype=np.float64) * 1000
+    return {
+        'mean_ms': round(float(ms.mean()), 3),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(ms, 95)), 3),
+    }
+
+
+def _measure(fn, memory=True):
+    """Ejecuta `fn()` y retorna `(resultado, pico_de_memoria_kb)`.
+
+    Los tiempos salen de una ejecución sin `tracemalloc` (que la ralentiza);
+    el pico se mide en una segunda ejecución trazada si `memory` es True.
+    """
+    result = fn()
+    if not memory:
+        return result, None
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, round(peak / 1024, 1)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Benchmark offline del pipeline facial, el matching 1:N, el registro y la carga de galería'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sections', default=','.join(SECTIONS),
+                            help=f'Secciones a ejecutar ({",".join(SECTIONS)})')
+        parser.add_argument('--sizes', default='1000,10000,100000',
+                            help='Tamaños de galería (usuarios) para matching y carga')
+        parser.add_argument('--frames', type=int, default=20, help='Frames sintéticos del pipeline')
+        parser.add_argument('--queries', type=int, default=200, help='Consultas 1:N por galería')
+        parser.add_argument('--users', type=int, default=10, help='Usuarios para el registro')
+        parser.add_argument('--samples', type=int, default=5, help='Muestras por registro')
+        parser.add_argument('--ivf', action='store_true', help='Medir también el índice IVF')
+        parser.add_argument('--no-memory', action='store_true',
+                            help='No medir el pico de memoria (evita la segunda pasada)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true', help='Emitir el reporte como JSON')
+        parser.add_argument('--output', help='Guardar el reporte JSON en este archivo')
+        parser.add_argument('--compare', help='Reporte JSON base contra el cual comparar')
+
+    def handle(self, *args, **options):
+        sections = [s.strip() for s in options['sections'].split(',') if s.strip()]
+        unknown = set(sections) - set(SECTIONS)
+        if unknown:
+            raise CommandError(f'Secciones desconocidas: {", ".join(sorted(unknown))}')
+        sizes = [int(v) for v in options['sizes'].split(',') if v.strip()]
+        options['memory'] = not options['no_memory']
+
+        report = {
+            'meta': {
+                'commit': _git_commit(),
+                'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'opencv': cv2.__version__,
+                'seed': options['seed'],
+            },
+        }
+        for section in sections:
+            report[section] = getattr(self, f'bench_{section}')(options, sizes)
+
+        payload = json.dumps(report, indent=2)
+        if options['output']:
+            Path(options['output']).write_text(payload + '\n')
+        if options['json']:
+            self.stdout.write(payload)
+        elif options['compare']:
+            self.write_comparison(json.loads(Path(options['compare']).read_text()), report)
+        else:
+            self.write_summary(report)
+
+    # --- Secciones -------------------------------------------------------
+
+    def bench_pipeline(self, options, sizes):
+        frames = [synthetic_face(options['seed'] + i) for i in range(options['frames'])]
+        _compute_embedding_from_b64(frames[0])  # calentar imports/caches de OpenCV
+
+        def run():
+            stages = {s: [] for s in STAGES}
+            totals, detected = [], 0
+            for frame in frames:
+                timings = {}
+                started = time.perf_counter()
+                emb = _compute_embedding_from_b64(frame, timings)
+                totals.append(time.perf_counter() - started)
+                detected += emb is not None
+                for stage in STAGES:
+                    stages[stage].append(timings.get(stage, 0.0) / 1000)
+            return stages, totals, detected
+
+        (stages, totals, detected), peak_kb = _measure(run, options['memory'])
+        return {
+            'frames': len(frames),
+            'detected': detected,
+            'stages': {stage: _ms_stats(values) for stage, values in stages.items()},
+            'total': _ms_stats(totals),
+            'peak_kb': peak_kb,
+        }
+
+    def bench_matching(self, options, sizes):
+        results = []
+        for n in sizes:
+            started = time.perf_counter()
+            snapshot = synthetic_gallery(n, seed=options['seed'])
+            build_ms = (time.perf_counter() - started) * 1000
+            rng = np.random.default_rng(options['seed'] + 1)
+            rows = rng.integers(n, size=options['queries'])
+            queries = snapshot.matrix[rows] + rng.normal(
+                0, 0.03, size=(rows.size, snapshot.matrix.shape[1])
+            ).astype(np.float32)
+
+            def search(snap, exact):
+                times = []
+                for q in queries:
+                    started = time.perf_counter()
+                    nearest(snap, q, exact=exact)
+                    times.append(time.perf_counter() - started)
+                return times
+
+            times, peak_kb = _measure(lambda: search(snapshot, True), options['memory'])
+            entry = {
+                'gallery_size': n,
+                'snapshot_build_ms': round(build_ms, 1),
+                'exact': {**_ms_stats(times), 'peak_kb': peak_kb},
+            }
+            if options['ivf']:
+                started = time.perf_counter()
+                index = IVFIndex(seed=options['seed']).fit(snapshot.matrix)
+                fit_ms = (time.perf_counter() - started) * 1000
+                times, peak_kb = _measure(lambda: search(snapshot._replace(index=index), False), options['memory'])
+                entry['ivf'] = {**_ms_stats(times), 'fit_ms': round(fit_ms, 1),
+                                'n_lists': index.n_lists, 'peak_kb': peak_kb}
+            results.append(entry)
+        return results
+
+    def bench_register(self, options, sizes):
+        users = [
+            [synthetic_face(options['seed'] + 1000 + u * options['samples'] + s)
+             for s in range(options['samples'])]
+            for u in range(options['users'])
+        ]
+
+        def run():
+            times, ok = [], 0
+            for samples in users:
+                started = time.perf_counter()
+                embeddings, _ = _compute_embeddings_batch(samples)
+                times.append(time.perf_counter() - started)
+                ok += sum(1 for e in embeddings if e is not None)
+            return times, ok
+
+        (times, ok), peak_kb = _measure(run, options['memory'])
+        total = sum(times)
+        return {
+            'users': len(users),
+            'samples_per_user': options['samples'],
+            'samples_ok': ok,
+            'per_user': _ms_stats(times),
+            'samples_per_s': round(len(users) * options['samples'] / total, 2) if total else None,
+            'peak_kb': peak_kb,
+        }
+
+    def bench_load(self, options, sizes):
+        results = []
+        for n in sizes:
+            rng = np.random.default_rng(options['seed'])
+            blocks = [rng.normal(0, 0.1, size=(3, 128)).astype(np.float32) for _ in range(n)]
+            json_rows = [json.dumps(b.tolist()) for b in blocks]
+            blob_rows = [pack_embeddings(b) for b in blocks]
+
+            def from_json():
+                return build_snapshot(
+                    (uid, np.asarray(json.loads(raw), dtype=np.float32))
+                    for uid, raw in enumerate(json_rows, 1)
+                )
+
+            def from_blob():
+                return build_snapshot(
+                    (uid, unpack_embeddings(blob, dim, '<f4'))
+                    for uid, (blob, dim) in enumerate(blob_rows, 1)
+                )
+
+            entry = {'gallery_size': n, 'samples': 3 * n}
+            for name, fn in (('json', from_json), ('binary', from_blob)):
+                def timed(fn=fn):
+                    started = time.perf_counter()
+                    fn()
+                    return time.perf_counter() - started
+                elapsed, peak_kb = _measure(timed, options['memory'])
+                entry[name] = {'ms': round(elapsed * 1000, 1), 'peak_kb': peak_kb}
+            results.append(entry)
+        return results
+
+    # --- Salida ----------------------------------------------------------
+
+    def write_summary(self, report):
+        meta = report['meta']
+        self.stdout.write(f"commit {meta['commit']} · python {meta['python']} · numpy {meta['numpy']}")
+        if 'pipeline' in report:
+            p = report['pipeline']
+            self.stdout.write(f"\nPipeline ({p['detected']}/{p['frames']} rostros, pico {p['peak_kb']} KB)")
+            for stage, s in list(p['stages'].items()) + [('total', p['total'])]:
+                self.stdout.write(f"  {stage:>9}: media {s['mean_ms']:>8.2f} ms  p95 {s['p95_ms']:>8.2f} ms")
+        if 'matching' in report:
+            self.stdout.write('\nMatching 1:N')
+            for m in report['matching']:
+                line = (f"  {m['gallery_size']:>7} usuarios: exacta p50 {m['exact']['p50_ms']:.3f} ms, "
+                        f"p95 {m['exact']['p95_ms']:.3f} ms")
+                if 'ivf' in m:
+                    line += f" · ivf p50 {m['ivf']['p50_ms']:.3f} ms"
+                self.stdout.write(line)
+        if 'register' in report:
+            r = report['register']
+            self.stdout.write(
+                f"\nRegistro: {r['samples_per_s']} muestras/s, p95 {r['per_user']['p95_ms']:.1f} ms "
+                f"por usuario, pico {r['peak_kb']} KB"
+            )
+        if 'load' in report:
+            self.stdout.write('\nCarga de galería')
+            for entry in report['load']:
+                self.stdout.write(
+                    f"  {entry['gallery_size']:>7} usuarios: json {entry['json']['ms']:.1f} ms "
+                    f"({entry['json']['peak_kb']} KB) · binario {entry['binary']['ms']:.1f} ms "
+                    f"({entry['binary']['peak_kb']} KB)"
+                )
+
+    def write_comparison(self, base, report):
+        """Imprime la variación de cada métrica numérica común a ambos reportes."""
+        def flatten(node, prefix=''):
+            if isinstance(node, dict):
+                for key, value in node.items():
+                    yield from flatten(value, f'{prefix}.{key}' if prefix else key)
+            elif isinstance(node, list):
+                for item in node:
+                    label = item.get('gallery_size', '') if isinstance(item, dict) else ''
+                    yield from flatten(item, f'{prefix}[{label}]')
+            elif isinstance(node, (int, float)) and not isinstance(node, bool):
+                yield prefix, node
+
+        old = {k: v for k, v in flatten(base) if not k.startswith('meta.')}
+        new = {k: v for k, v in flatten(report) if not k.startswith('meta.')}
+        self.stdout.write(f"base {base.get('meta', {}).get('commit')} -> actual {report['meta']['commit']}")
+        for key in sorted(old.keys() & new.keys()):
+            before, after = old[key], new[key]
+            delta = f'{(after - before) / before * 100:+.1f}%' if before else '-'
+            self.stdout.write(f'  {key:<45} {before:>12} {after:>12} {delta:>8}')
@@ -0,0 +1,91 @@
+"""Compara la pirámide de detección contra la ruta a resolución completa.
+
+Para cada imagen de `--images` ejecuta el pipeline facial con cada
+combinación de `--scales` y `--max-sides`, y reporta los ms medios por
+etapa (`decode`, `downscale`, `detect`, `encode`), la tasa de detección y la
+distancia del embedding frente a la configuración base (escala 1, sin límite).
+
+Ejemplo:
+    python manage.py facial_detection_report --images ./capturas --scales 1,2,4 --max-sides 0,320
+"""
+import base64
+import json
+from pathlib import Path
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from login_facial.views import _compute_embedding_from_b64
+
+STAGES = ('decode', 'downscale', 'detect', 'encode')
+
+
+class Command(BaseCommand):
+    help = 'Latencia por etapa y precisión de la detección a escala reducida'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', required=True, help='Directorio con imágenes .jpg/.png')
+        parser.add_argument('--scales', default='1,2,4')
+        parser.add_argument('--max-sides', default='0')
+        parser.add_argument('--repeat', type=int, default=3, help='Repeticiones por imagen')
+        parser.add_argument('--json', action='store_true', help='Emitir el reporte como JSON')
+
+    def handle(self, *args, **options):
+        paths = sorted(
+            p for p in Path(options['images']).iterdir()
+            if p.suffix.lower() in ('.jpg', '.jpeg', '.png')
+        )
+        if not paths:
+            raise CommandError('No se encontraron imágenes')
+        frames = [base64.b64encode(p.read_bytes()).decode() for p in paths]
+
+        configs = [
+            (int(scale), int(max_side))
+            for scale in options['scales'].split(',')
+            for max_side in options['max_sides'].split(',')
+        ]
+        if (1, 0) not in configs:
+            configs.insert(0, (1, 0))
+
+        baseline = [_compute_embedding_from_b64(f, None, 1, 0) for f in frames]
+        report = []
+        for scale, max_side in configs:
+            totals = dict.fromkeys(STAGES, 0.0)
+            found, distances = 0, []
+            for i, frame in enumerate(frames):
+                for _ in range(options['repeat']):
+                    timings = {}
+                    emb = _compute_embedding_from_b64(frame, timings, scale, max_side)
+                    for stage in STAGES:
+                        totals[stage] += timings.get(stage, 0.0)
+                if emb is not None:
+                    found += 1
+                    if baseline[i] is not None:
+                        distances.append(float(np.linalg.norm(emb - baseline[i])))
+            runs = len(frames) * options['repeat']
+            stages = {stage: round(total / runs, 2) for stage, total in totals.items()}
+            report.append({
+                'scale': scale,
+                'max_side': max_side,
+                'detected': found,
+                'images': len(frames),
+                'stages_ms': stages,
+                'total_ms': round(sum(stages.values()), 2),
+                'max_distance_vs_full': round(max(distances), 4) if distances else None,
+            })
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(
+            f"{'escala':>6} {'lado':>5} {'rostros':>8} "
+            + ' '.join(f'{s:>9}' for s in STAGES)
+            + f" {'total':>8} {'dist.máx':>9}"
+        )
+        for r in report:
+            dist = '-' if r['max_distance_vs_full'] is None else f"{r['max_distance_vs_full']:.4f}"
+            self.stdout.write(
+                f"{r['scale']:>6} {r['max_side']:>5} {r['detected']:>4}/{r['images']:<3} "
+                + ' '.join(f"{r['stages_ms'][s]:>9.2f}" for s in STAGES)
+                + f" {r['total_ms']:>8.2f} {dist:>9}"
+            )
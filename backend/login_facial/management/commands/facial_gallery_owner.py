@@ -0,0 +1,54 @@
+"""Dueño de la galería facial en memoria compartida del host.
+
+Publica la galería activa en `multiprocessing.shared_memory` para que todos
+los workers del host la adjunten en solo lectura (ver
+`login_facial.gallery_shm`). Verifica la marca de versión de la BD cada
+`--interval` segundos y publica una generación nueva al cambiar (altas,
+re-enrolamientos, bajas). Correr uno por host, junto a los workers.
+
+Ejemplo:
+    python manage.py facial_gallery_owner --interval 1
+"""
+import signal
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from login_facial import gallery_shm, gallery_store
+from login_facial.gallery import gallery_version, load_snapshot_from_db
+
+
+class Command(BaseCommand):
+    help = 'Publica la galería facial en memoria compartida para los workers del host'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--name', help='Nombre de la galería (por defecto FACIAL_GALLERY_SHM_NAME)')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Segundos entre verificaciones de versión en BD')
+
+    def handle(self, *args, **options):
+        name = options['name'] or gallery_shm.shm_name()
+        if not name:
+            raise CommandError('Indique --name o configure FACIAL_GALLERY_SHM_NAME')
+        # SIGTERM (gunicorn/systemd) sale por el `finally` y retira la galería
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        owner = gallery_shm.GalleryOwner(name)
+        published = None
+        try:
+            while True:
+                version = gallery_version()
+                if version != published:
+                    started = time.perf_counter()
+                    snapshot = gallery_store.load(version) or load_snapshot_from_db(version)
+                    generation = owner.publish(snapshot)
+                    published = version
+                    self.stdout.write(
+                        f'{name}: generación {generation} con {snapshot.matrix.shape[0]} muestras '
+                        f'en {(time.perf_counter() - started) * 1000:.0f} ms'
+                    )
+                time.sleep(max(0.05, options['interval']))
+                close_old_connections()
+        finally:
+            owner.close()
@@ -0,0 +1,55 @@
+"""Exporta la galería facial activa a un snapshot en disco para los workers.
+
+Los workers lo mapean con `np.load(mmap_mode='r')` al arrancar en lugar de
+leer `datos_faciales` (ver `login_facial.gallery_store`). Con `--watch` queda
+corriendo como proceso de fondo y reexporta cada vez que cambia la marca de
+versión de la BD.
+
+Ejemplo:
+    python manage.py facial_gallery_snapshot --dir /var/lib/facial/galeria
+    python manage.py facial_gallery_snapshot --watch --interval 10
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from login_facial import gallery_store
+from login_facial.gallery import gallery_version, load_snapshot_from_db
+
+
+class Command(BaseCommand):
+    help = 'Escribe la galería facial activa como snapshot .npy versionado'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help='Directorio destino (por defecto FACIAL_GALLERY_SNAPSHOT_DIR)')
+        parser.add_argument('--keep', type=int, default=2, help='Versiones a conservar en disco')
+        parser.add_argument('--watch', action='store_true',
+                            help='Seguir corriendo y reexportar al cambiar la versión en BD')
+        parser.add_argument('--interval', type=float, default=30.0,
+                            help='Segundos entre verificaciones de versión con --watch')
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or gallery_store.snapshot_dir()
+        if not directory:
+            raise CommandError('Indique --dir o configure FACIAL_GALLERY_SNAPSHOT_DIR')
+        exported = None
+        while True:
+            version = gallery_version()
+            if version != exported:
+                started = time.perf_counter()
+                try:
+                    manifest = gallery_store.export(
+                        directory, load_snapshot_from_db(version), keep=max(1, options['keep'])
+                    )
+                except OSError as exc:
+                    raise CommandError(f'No se pudo escribir el snapshot en {directory}: {exc}')
+                exported = version
+                self.stdout.write(
+                    f"{manifest['name']}: {manifest['rows']} muestras de dimensión {manifest['dim']} "
+                    f'en {(time.perf_counter() - started) * 1000:.0f} ms'
+                )
+            if not options['watch']:
+                return
+            time.sleep(max(0.1, options['interval']))
+            close_old_connections()
@@ -0,0 +1,53 @@
+"""Importa usuarios en masa desde un CSV.
+
+Columnas requeridas: dni, nombres, apellidos, email; opcionales: rol, estado,
+password. Ver `login_facial.bulk_import`.
+
+Ejemplo:
+    python manage.py import_users clientes.csv --workers 8
+    python manage.py import_users clientes.csv --dry-run --errors errores.json
+"""
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from login_facial.bulk_import import ImportFormatError, import_users
+
+
+class Command(BaseCommand):
+    help = 'Importa usuarios desde un CSV por lotes (bulk_create + hash en pool de procesos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Archivo CSV (UTF-8, con encabezado)')
+        parser.add_argument('--batch-size', type=int, default=None, help='Filas por lote')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Procesos para el hash de contraseñas (0 = en línea)')
+        parser.add_argument('--dry-run', action='store_true', help='Solo validar, sin insertar')
+        parser.add_argument('--errors', help='Escribir los errores por línea en este archivo JSON')
+
+    def handle(self, *args, **options):
+        def progress(state):
+            self.stderr.write(f"  {state['total']} filas leídas, {state['created']} creadas, "
+                              f"{state['failed']} con error")
+
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig') as fh:
+                report = import_users(fh, batch_size=options['batch_size'], workers=options['workers'],
+                                      dry_run=options['dry_run'], progress=progress)
+        except OSError as exc:
+            raise CommandError(f'No se pudo leer {options["path"]}: {exc}')
+        except (ImportFormatError, UnicodeDecodeError, csv.Error) as exc:
+            raise CommandError(str(exc))
+
+        verb = 'válidas' if options['dry_run'] else 'creadas'
+        self.stdout.write(f"{report['created']} {verb}, {report['failed']} con error de {report['total']} filas "
+                          f"en {report['elapsed_ms']:.0f} ms")
+        for item in report['errors'][:20]:
+            detalle = '; '.join(f'{campo}: {", ".join(msgs)}' for campo, msgs in item['errors'].items())
+            self.stdout.write(f"  línea {item['line']}: {detalle}")
+        if report['failed'] > 20:
+            self.stdout.write(f"  ... {report['failed'] - 20} errores más")
+        if options['errors']:
+            with open(options['errors'], 'w') as fh:
+                json.dump(report['errors'], fh, indent=2, ensure_ascii=False)
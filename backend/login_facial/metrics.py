@@ -0,0 +1,207 @@
+"""Métricas del proceso en formato de texto de Prometheus.
+
+- `auth_stage_duration_seconds`: histograma por endpoint y etapa, alimentado
+  con los dicts de `timings` (ms) que ya arman las vistas y el pipeline
+  facial (`decode`, `detect`, `encode`, `match`, `jwt`, `serialize`, `total`...).
+- `auth_requests_total`: respuestas por endpoint y código HTTP.
+- Gauges evaluados en cada scrape (galería, caché de embeddings, pool de
+  procesos), registrados con `register_gauge`.
+
+Las métricas viven en memoria de cada proceso: con varios workers cada uno
+expone las suyas.
+"""
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Segundos; cubre desde una búsqueda en galería hasta un hash de contraseña
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Histograma acumulativo con buckets fijos (sin dependencias externas)."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # último: > mayor bucket
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Pares `(le, cuenta_acumulada)` incluyendo `+Inf`."""
+        total = 0
+        for le, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield le, total
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    body = ','.join(
+        '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in labels.items()
+    )
+    return '{' + body + '}'
+
+
+def _value(v) -> str:
+    return '+Inf' if v == float('inf') else str(v)
+
+
+class MetricsRegistry:
+    """Registro de histogramas, contadores y gauges, seguro entre hilos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[Tuple[str, str], Histogram] = {}
+        self._requests: Dict[Tuple[str, str], int] = {}
+        self._gauges = []
+
+    def observe(self, endpoint: str, stage: str, seconds: float):
+        with self._lock:
+            hist = self._stages.get((endpoint, stage))
+            if hist is None:
+                hist = self._stages[(endpoint, stage)] = Histogram()
+            hist.observe(seconds)
+
+    def record_timings(self, endpoint: str, timings_ms: Dict[str, float]):
+        """Observa cada etapa de un dict `{etapa: ms}`."""
+        for stage, ms in (timings_ms or {}).items():
+            self.observe(endpoint, stage, ms / 1000.0)
+
+    def count_request(self, endpoint: str, status_code: int):
+        key = (endpoint, str(status_code))
+        with self._lock:
+            self._requests[key] = self._requests.get(key, 0) + 1
+
+    def register_gauge(self, name: str, help_text: str, fn: Callable, kind: str = 'gauge'):
+        """Registra una métrica evaluada al exponer.
+
+        `fn()` retorna un número, `None` (se omite) o una lista de
+        `(labels_dict, valor)`. `kind` es `gauge` o `counter`.
+        """
+        with self._lock:
+            self._gauges = [g for g in self._gauges if g[0] != name]
+            self._gauges.append((name, help_text, fn, kind))
+
+    def reset(self):
+        """Vacía histogramas y contadores (los gauges se conservan)."""
+        with self._lock:
+            self._stages.clear()
+            self._requests.clear()
+
+    def render(self) -> str:
+        with self._lock:
+            stages = {k: (list(h.cumulative()), h.sum, h.count) for k, h in self._stages.items()}
+            requests = dict(self._requests)
+            gauges = list(self._gauges)
+
+        lines = [
+            '# HELP auth_stage_duration_seconds Duración de cada etapa por endpoint.',
+            '# TYPE auth_stage_duration_seconds histogram',
+        ]
+        for (endpoint, stage), (buckets, total, count) in sorted(stages.items()):
+            base = {'endpoint': endpoint, 'stage': stage}
+            for le, cumulative in buckets:
+                lines.append(f'auth_stage_duration_seconds_bucket{_labels({**base, "le": _value(le)})} {cumulative}')
+            lines.append(f'auth_stage_duration_seconds_sum{_labels(base)} {total!r}')
+            lines.append(f'auth_stage_duration_seconds_count{_labels(base)} {count}')
+
+        lines += [
+            '# HELP auth_requests_total Respuestas por endpoint y código HTTP.',
+            '# TYPE auth_requests_total counter',
+        ]
+        for (endpoint, code), count in sorted(requests.items()):
+            lines.append(f'auth_requests_total{_labels({"endpoint": endpoint, "status": code})} {count}')
+
+        for name, help_text, fn, kind in gauges:
+            try:
+                value = fn()
+            except Exception:
+                continue
+            if value is None:
+                continue
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+            samples = value if isinstance(value, (list, tuple)) else [({}, value)]
+            for labels, v in samples:
+                lines.append(f'{name}{_labels(labels)} {_value(v)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+observe = registry.observe
+record_timings = registry.record_timings
+count_request = registry.count_request
+register_gauge = registry.register_gauge
+render = registry.render
+
+
+_gallery_users_count = (None, 0)  # (versión de la galería, usuarios distintos)
+
+
+def _gallery_users():
+    global _gallery_users_count
+    import numpy as np
+    from .gallery import get_gallery
+    snap = get_gallery().current()
+    if snap is None:
+        return 0
+    version, count = _gallery_users_count
+    if version != snap.version:
+        count = int(np.unique(snap.user_ids).size)
+        _gallery_users_count = (snap.version, count)
+    return count
+
+
+def _gallery_samples():
+    from .gallery import get_gallery
+    return len(get_gallery())
+
+
+def _cache_stat(key):
+    def read():
+        from .embedding_cache import get_embedding_cache
+        cache = get_embedding_cache()
+        return None if cache is None else cache.stats()[key]
+    return read
+
+
+def _cache_lookups():
+    from .embedding_cache import get_embedding_cache
+    cache = get_embedding_cache()
+    if cache is None:
+        return None
+    stats = cache.stats()
+    return [({'result': r}, stats[k]) for r, k in (('hit', 'hits'), ('miss', 'misses'), ('coalesced', 'coalesced'))]
+
+
+def _pool_stat(attr):
+    def read():
+        from .embedding_service import get_embedding_service
+        service = get_embedding_service()
+        if service is None:
+            return None
+        if attr == 'capacity':
+            return service.workers + service.queue_depth
+        return getattr(service, attr)
+    return read
+
+
+register_gauge('facial_gallery_samples', 'Muestras cargadas en la galería 1:N.', _gallery_samples)
+register_gauge('facial_gallery_users', 'Usuarios distintos en la galería 1:N.', _gallery_users)
+register_gauge('facial_embedding_cache_entries', 'Embeddings en la caché por hash de frame.', _cache_stat('size'))
+register_gauge('facial_embedding_cache_hit_ratio', 'Fracción de consultas a la caché resueltas sin cómputo.',
+               _cache_stat('hit_rate'))
+register_gauge('facial_embedding_cache_lookups_total', 'Consultas a la caché de embeddings por resultado.',
+               _cache_lookups, kind='counter')
+register_gauge('facial_embedding_pool_pending', 'Frames en cola o en proceso en el pool.', _pool_stat('pending'))
+register_gauge('facial_embedding_pool_capacity', 'Frames admitidos por el pool (workers + cola).',
+               _pool_stat('capacity'))
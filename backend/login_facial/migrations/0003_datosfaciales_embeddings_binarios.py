@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:43
+
+from django.db import migrations, models
+
+
+def json_a_binario(apps, schema_editor):
+    """Convierte `embeddings` (lista JSON) al blob float32 de ancho fijo."""
+    import numpy as np
+    DatosFaciales = apps.get_model('login_facial', 'DatosFaciales')
+    for datos in DatosFaciales.objects.all().iterator():
+        vectores = [np.asarray(e, dtype='<f4').reshape(-1) for e in datos.embeddings or []]
+        if vectores:
+            dims = [v.shape[0] for v in vectores]
+            dim = max(set(dims), key=dims.count)
+            matriz = np.stack([v for v in vectores if v.shape[0] == dim])
+            datos.embeddings_blob = matriz.tobytes()
+            datos.embedding_dim = dim
+            datos.num_muestras = matriz.shape[0]
+        else:
+            datos.embeddings_blob = b''
+            datos.embedding_dim = 0
+            datos.num_muestras = 0
+        datos.embedding_dtype = '<f4'
+        datos.save(update_fields=['embeddings_blob', 'embedding_dim', 'embedding_dtype', 'num_muestras'])
+
+
+def binario_a_json(apps, schema_editor):
+    """Reconstruye la lista JSON desde el blob binario."""
+    import numpy as np
+    DatosFaciales = apps.get_model('login_facial', 'DatosFaciales')
+    for datos in DatosFaciales.objects.all().iterator():
+        if datos.embeddings_blob and datos.embedding_dim:
+            matriz = np.frombuffer(datos.embeddings_blob, dtype=datos.embedding_dtype)
+            datos.embeddings = matriz.reshape(-1, datos.embedding_dim).tolist()
+        else:
+            datos.embeddings = []
+        datos.save(update_fields=['embeddings'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('login_facial', '0002_alter_usuario_managers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datosfaciales',
+            name='embedding_dim',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Dimensión de cada embedding almacenado'),
+        ),
+        migrations.AddField(
+            model_name='datosfaciales',
+            name='embedding_dtype',
+            field=models.CharField(default='<f4', help_text='dtype NumPy de los embeddings almacenados', max_length=8),
+        ),
+        migrations.AddField(
+            model_name='datosfaciales',
+            name='embeddings_blob',
+            field=models.BinaryField(default=b'', help_text='Embeddings faciales del usuario (múltiples muestras) en binario'),
+        ),
+        # Nullable para que la migración sea reversible con filas existentes
+        migrations.AlterField(
+            model_name='datosfaciales',
+            name='embeddings',
+            field=models.JSONField(blank=True, null=True, help_text='Lista de embeddings faciales del usuario (múltiples muestras)'),
+        ),
+        migrations.RunPython(json_a_binario, binario_a_json),
+        migrations.RemoveField(
+            model_name='datosfaciales',
+            name='embeddings',
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:01
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('login_facial', '0003_datosfaciales_embeddings_binarios'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sesionfacial',
+            name='timestamp',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
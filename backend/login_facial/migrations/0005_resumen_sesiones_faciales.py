@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('login_facial', '0004_sesionfacial_timestamp_intento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenSesionFacial',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodo', models.CharField(choices=[('hora', 'Hora'), ('dia', 'Día')], max_length=4)),
+                ('inicio', models.DateTimeField(help_text='Inicio de la hora o del día (zona horaria del proyecto)')),
+                ('resultado', models.CharField(choices=[('exitoso', 'Exitoso'), ('fallido', 'Fallido'), ('error', 'Error')], max_length=10)),
+                ('rol', models.CharField(blank=True, max_length=20)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('con_confianza', models.PositiveIntegerField(default=0, help_text='Intentos con confianza registrada')),
+                ('suma_confianza', models.FloatField(default=0)),
+                ('hist_0', models.PositiveIntegerField(default=0)),
+                ('hist_1', models.PositiveIntegerField(default=0)),
+                ('hist_2', models.PositiveIntegerField(default=0)),
+                ('hist_3', models.PositiveIntegerField(default=0)),
+                ('hist_4', models.PositiveIntegerField(default=0)),
+                ('hist_5', models.PositiveIntegerField(default=0)),
+                ('hist_6', models.PositiveIntegerField(default=0)),
+                ('hist_7', models.PositiveIntegerField(default=0)),
+                ('hist_8', models.PositiveIntegerField(default=0)),
+                ('hist_9', models.PositiveIntegerField(default=0)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_faciales', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Resumen de Sesiones Faciales',
+                'verbose_name_plural': 'Resúmenes de Sesiones Faciales',
+                'db_table': 'resumen_sesiones_faciales',
+                'indexes': [models.Index(fields=['periodo', 'inicio'], name='resumen_ses_periodo_eb7ede_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('login_facial', '0005_resumen_sesiones_faciales'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(fields=['created_at', 'id'], name='usuarios_creado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(fields=['rol', 'created_at', 'id'], name='usuarios_rol_creado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(fields=['estado', 'created_at', 'id'], name='usuarios_estado_creado_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+
+def crear_indice(apps, schema_editor):
+    """Índice FTS5 trigram de usuarios (solo SQLite con FTS5 disponible)."""
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS usuarios_busqueda USING fts5("
+                "email, dni, nombres, apellidos, tokenize='trigram')"
+            )
+        except Exception:
+            # SQLite sin FTS5 o anterior a 3.34 (sin trigram): búsqueda portable
+            return
+        cursor.execute(
+            'INSERT INTO usuarios_busqueda (rowid, email, dni, nombres, apellidos) '
+            'SELECT id, email, dni, nombres, apellidos FROM registro_usuarios'
+        )
+
+
+def eliminar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS usuarios_busqueda')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('login_facial', '0006_usuarios_indices_listado'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
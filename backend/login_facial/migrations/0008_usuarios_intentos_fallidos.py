@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('login_facial', '0007_usuarios_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='failed_attempts',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Logins faciales 1:1 fallidos consecutivos (umbral adaptativo)'),
+        ),
+    ]
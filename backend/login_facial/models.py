@@ -1,6 +1,36 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser, BaseUserManager
-import json
+
+from . import roles
+
+
+# dtype de almacenamiento de embeddings: float32 little-endian de ancho fijo
+EMBEDDING_DTYPE = '<f4'
+
+
+def pack_embeddings(embeddings):
+    """Serializa una colección de embeddings como `(bytes, dim)` float32.
+
+    Acepta una matriz 2D o una lista de vectores de igual dimensión.
+    """
+    import numpy as np
+    if embeddings is None or len(embeddings) == 0:
+        return b'', 0
+    matrix = np.asarray(embeddings, dtype=EMBEDDING_DTYPE)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    if matrix.ndim != 2:
+        raise ValueError('Los embeddings deben ser vectores de igual dimensión')
+    return np.ascontiguousarray(matrix).tobytes(), int(matrix.shape[1])
+
+
+def unpack_embeddings(blob, dim, dtype=EMBEDDING_DTYPE):
+    """Vista `(n, dim)` de solo lectura sobre un blob de embeddings."""
+    import numpy as np
+    if not blob or not dim:
+        return np.empty((0, dim or 0), dtype=dtype)
+    return np.frombuffer(blob, dtype=dtype).reshape(-1, dim)
 
 
 class UsuarioManager(BaseUserManager):
@@ -65,6 +95,9 @@ class Usuario(AbstractUser):
     rol = models.CharField(max_length=20, choices=ROLES, default='Analista')
     estado = models.CharField(max_length=10, choices=ESTADOS, default='Activo')
     face_registered = models.BooleanField(default=False, help_text="Indica si el usuario tiene registro facial")
+    failed_attempts = models.PositiveSmallIntegerField(
+        default=0, help_text="Logins faciales 1:1 fallidos consecutivos (umbral adaptativo)"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     
     # Sobrescribir campos de AbstractUser para usar email como username
@@ -81,6 +114,12 @@ class Usuario(AbstractUser):
         db_table = 'registro_usuarios'
         verbose_name = 'Usuario'
         verbose_name_plural = 'Usuarios'
+        # Listado paginado por (created_at, id), con o sin filtro de rol/estado
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='usuarios_creado_idx'),
+            models.Index(fields=['rol', 'created_at', 'id'], name='usuarios_rol_creado_idx'),
+            models.Index(fields=['estado', 'created_at', 'id'], name='usuarios_estado_creado_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         # Auto-generar username basado en email si no se proporciona
@@ -96,19 +135,8 @@ class Usuario(AbstractUser):
         return f"{self.nombres} {self.apellidos}"
     
     def has_permission(self, permission):
-        """Verifica permisos basados en rol según documentación"""
-        admin_permissions = [
-            'view_dashboard', 'view_transactions', 'view_alerts', 
-            'view_models', 'view_configuration', 'manage_users',
-            'retrain_models'
-        ]
-        analyst_permissions = ['view_dashboard', 'view_transactions']
-        
-        if self.rol == 'Administrador':
-            return permission in admin_permissions
-        elif self.rol == 'Analista':
-            return permission in analyst_permissions
-        return False
+        """Verifica permisos basados en rol según documentación (ver `roles`)"""
+        return roles.has_permission(self.rol, permission)
 
 
 class DatosFaciales(models.Model):
@@ -122,9 +150,20 @@ class DatosFaciales(models.Model):
         related_name='datos_faciales'
     )
     
-    # Embeddings faciales (almacenados como JSON para flexibilidad)
-    embeddings = models.JSONField(
-        help_text="Lista de embeddings faciales del usuario (múltiples muestras)"
+    # Embeddings faciales: matriz (num_muestras x embedding_dim) serializada
+    # como bytes contiguos de ancho fijo, sin decodificación JSON por fila
+    embeddings_blob = models.BinaryField(
+        default=b'',
+        help_text="Embeddings faciales del usuario (múltiples muestras) en binario"
+    )
+    embedding_dim = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="Dimensión de cada embedding almacenado"
+    )
+    embedding_dtype = models.CharField(
+        max_length=8,
+        default=EMBEDDING_DTYPE,
+        help_text="dtype NumPy de los embeddings almacenados"
     )
     
     # Posiciones faciales para validación
@@ -146,26 +185,31 @@ class DatosFaciales(models.Model):
     def __str__(self):
         return f"Datos faciales de {self.usuario.nombre_completo}"
     
+    def matriz_embeddings(self):
+        """Retorna los embeddings como matriz `(num_muestras, dim)` de solo lectura.
+
+        Es una vista `np.frombuffer` sobre el blob almacenado (sin copias).
+        """
+        return unpack_embeddings(self.embeddings_blob, self.embedding_dim, self.embedding_dtype)
+    
+    def establecer_embeddings(self, embeddings):
+        """Reemplaza la colección de embeddings (no guarda el modelo)"""
+        self.embeddings_blob, self.embedding_dim = pack_embeddings(embeddings)
+        self.embedding_dtype = EMBEDDING_DTYPE
+        self.num_muestras = self.matriz_embeddings().shape[0]
+    
     def agregar_muestra(self, embedding, posicion):
         """Agrega una nueva muestra facial"""
-        if not self.embeddings:
-            self.embeddings = []
         if not self.posiciones:
             self.posiciones = []
-            
-        # Convertir numpy array a lista si es necesario
-        if hasattr(embedding, 'tolist'):
-            embedding = embedding.tolist()
-            
-        self.embeddings.append(embedding)
+        
+        self.establecer_embeddings(list(self.obtener_embeddings()) + [embedding])
         self.posiciones.append(posicion)
-        self.num_muestras = len(self.embeddings)
         self.save()
     
     def obtener_embeddings(self):
-        """Retorna los embeddings como lista de arrays numpy"""
-        import numpy as np
-        return [np.array(emb, dtype=np.float32) for emb in self.embeddings or []]
+        """Retorna los embeddings como lista de arrays numpy (vistas sin copia)"""
+        return list(self.matriz_embeddings())
 
 
 class SesionFacial(models.Model):
@@ -189,7 +233,8 @@ class SesionFacial(models.Model):
     confianza = models.FloatField(null=True, blank=True, help_text="Nivel de confianza del reconocimiento")
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Hora del intento (no de la escritura diferida en `audit.AuditWriter`)
+    timestamp = models.DateTimeField(default=timezone.now, db_index=True)
     detalles = models.JSONField(null=True, blank=True, help_text="Detalles adicionales del intento")
     
     class Meta:
@@ -201,3 +246,52 @@ class SesionFacial(models.Model):
     def __str__(self):
         usuario_str = self.usuario.nombre_completo if self.usuario else "Usuario desconocido"
         return f"{usuario_str} - {self.resultado} ({self.timestamp})"
+
+
+class ResumenSesionFacial(models.Model):
+    """
+    Agregados incrementales de `SesionFacial` por hora y por día.
+    Una fila por (periodo, inicio, resultado, usuario, rol); los endpoints de
+    tendencias suman estas filas en lugar de recorrer la tabla de sesiones.
+    Se mantienen al escribir la auditoría (`rollups.aplicar`) y se pueden
+    reconstruir con el comando `facial_audit_rollup`.
+    """
+    PERIODOS = [
+        ('hora', 'Hora'),
+        ('dia', 'Día'),
+    ]
+    
+    periodo = models.CharField(max_length=4, choices=PERIODOS)
+    inicio = models.DateTimeField(help_text="Inicio de la hora o del día (zona horaria del proyecto)")
+    resultado = models.CharField(max_length=10, choices=SesionFacial.RESULTADOS)
+    usuario = models.ForeignKey(
+        Usuario,
+        on_delete=models.CASCADE,
+        related_name='resumenes_faciales',
+        null=True, blank=True
+    )
+    rol = models.CharField(max_length=20, blank=True)
+    
+    total = models.PositiveIntegerField(default=0)
+    con_confianza = models.PositiveIntegerField(default=0, help_text="Intentos con confianza registrada")
+    suma_confianza = models.FloatField(default=0)
+    # Histograma de confianza en 10 tramos de 0.1 (el último incluye 1.0)
+    hist_0 = models.PositiveIntegerField(default=0)
+    hist_1 = models.PositiveIntegerField(default=0)
+    hist_2 = models.PositiveIntegerField(default=0)
+    hist_3 = models.PositiveIntegerField(default=0)
+    hist_4 = models.PositiveIntegerField(default=0)
+    hist_5 = models.PositiveIntegerField(default=0)
+    hist_6 = models.PositiveIntegerField(default=0)
+    hist_7 = models.PositiveIntegerField(default=0)
+    hist_8 = models.PositiveIntegerField(default=0)
+    hist_9 = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'resumen_sesiones_faciales'
+        verbose_name = 'Resumen de Sesiones Faciales'
+        verbose_name_plural = 'Resúmenes de Sesiones Faciales'
+        indexes = [models.Index(fields=['periodo', 'inicio'])]
+    
+    def __str__(self):
+        return f"{self.periodo} {self.inicio:%Y-%m-%d %H:%M} {self.resultado}: {self.total}"
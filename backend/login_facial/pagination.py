@@ -0,0 +1,148 @@
+"""Paginación por clave (keyset) para el listado de usuarios.
+
+`PageNumberPagination` ejecuta `COUNT(*)` y `OFFSET` en cada página: el costo
+crece con la profundidad. `UsuarioKeysetPagination` ofrece además un modo
+keyset que ordena por `(created_at, id)` y pide la página siguiente con
+`WHERE (created_at, id) > (cursor)`, que el índice resuelve en tiempo
+constante sin importar cuántas filas quedan atrás.
+
+- Por defecto (y con `?page=N`) la respuesta conserva el formato numérico
+  `{count, next, previous, results}`.
+- `?mode=keyset` inicia el modo keyset y `?cursor=<opaco>` continúa desde la
+  página anterior (`next` de la respuesta); responde `{next, results}`.
+- `?page_size=N` (máximo `max_page_size`).
+- En modo keyset, `?count=1` agrega `count` aproximado: en PostgreSQL sin
+  filtros se lee de las estadísticas del planner; en otro caso es un
+  `COUNT(*)` cacheado `USERS_COUNT_TTL` segundos por combinación de filtros
+  (como máximo `COUNT_CACHE_SIZE` combinaciones, LRU).
+"""
+import base64
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_cursor(created_at, pk) -> str:
+    raw = f'{created_at.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(value):
+    """`(created_at, id)` del cursor; lanza `ValueError` si es inválido."""
+    try:
+        raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)).decode()
+        created_at, pk = raw.rsplit('|', 1)
+        moment = parse_datetime(created_at)
+        if moment is None:
+            raise ValueError(value)
+        return moment, int(pk)
+    except (UnicodeDecodeError, base64.binascii.Error) as exc:
+        raise ValueError(value) from exc
+
+
+COUNT_CACHE_SIZE = 256
+_counts = OrderedDict()  # filtros -> (vence, total)
+_counts_lock = threading.Lock()
+
+
+def approximate_count(queryset, key) -> int:
+    """Total aproximado de `queryset`; `key` identifica sus filtros."""
+    if not key and connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                           [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return int(row[0])
+    ttl = float(getattr(settings, 'USERS_COUNT_TTL', 60))
+    now = time.monotonic()
+    with _counts_lock:
+        cached = _counts.get(key)
+        if cached is not None:
+            if cached[0] > now:
+                _counts.move_to_end(key)
+                return cached[1]
+            del _counts[key]
+    total = queryset.count()
+    with _counts_lock:
+        _counts[key] = (now + ttl, total)
+        _counts.move_to_end(key)
+        while len(_counts) > COUNT_CACHE_SIZE:
+            _counts.popitem(last=False)
+    return total
+
+
+class UsuarioKeysetPagination(BasePagination):
+    """Numérica por defecto; keyset por `(created_at, id)` con `?cursor=` o `?mode=keyset`."""
+    page_size = api_settings.PAGE_SIZE or 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    mode_query_param = 'mode'
+    ordering = ('created_at', 'id')
+
+    def __init__(self):
+        self._legacy = None
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        keyset = self.cursor_query_param in params or params.get(self.mode_query_param) == 'keyset'
+        if not keyset:
+            self._legacy = PageNumberPagination()
+            return self._legacy.paginate_queryset(queryset.order_by(*self.ordering), request, view)
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.count = None
+        if request.query_params.get('count') in ('1', 'true'):
+            key = tuple(sorted((k, v) for k, v in request.query_params.items()
+                               if k not in (self.cursor_query_param, self.page_size_query_param,
+                                            self.mode_query_param, 'count')))
+            self.count = approximate_count(queryset, key)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            try:
+                created_at, pk = decode_cursor(cursor)
+            except ValueError:
+                raise NotFound('Cursor inválido')
+            # `created_at >= c` acota el rango del índice; el OR desempata por id
+            queryset = queryset.filter(Q(created_at__gt=created_at) | Q(id__gt=pk), created_at__gte=created_at)
+
+        rows = list(queryset.order_by(*self.ordering)[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.last = rows[-1] if rows else None
+        return rows
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param,
+                                   encode_cursor(self.last.created_at, self.last.pk))
+
+    def get_paginated_response(self, data):
+        if self._legacy is not None:
+            return self._legacy.get_paginated_response(data)
+        body = {'next': self.get_next_link(), 'results': data}
+        if self.count is not None:
+            body = {'count': self.count, **body}
+        return Response(body)
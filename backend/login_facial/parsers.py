@@ -0,0 +1,70 @@
+"""Parsers para los endpoints faciales.
+
+Además del contrato JSON con frames en base64, los endpoints faciales aceptan
+la imagen en binario:
+
+- `multipart/form-data`: archivo(s) en el mismo campo que el JSON
+  (`facial_data` o `facial_samples`).
+- `application/octet-stream`: el cuerpo completo es un único JPEG/PNG; el
+  campo destino lo define la vista con `raw_upload_field`/`raw_upload_many`.
+
+Todos rechazan con 413 los cuerpos mayores a `FACIAL_MAX_UPLOAD_BYTES` antes
+de leerlos, usando `Content-Length`.
+"""
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import BaseParser, JSONParser, MultiPartParser
+
+
+class PayloadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'La imagen facial excede el tamaño permitido.'
+    default_code = 'payload_too_large'
+
+
+def max_upload_bytes() -> int:
+    return int(getattr(settings, 'FACIAL_MAX_UPLOAD_BYTES', 5 * 1024 * 1024))
+
+
+class UploadSizeLimitMixin:
+    """Valida `Content-Length` contra `FACIAL_MAX_UPLOAD_BYTES` antes de parsear."""
+
+    def check_size(self, parser_context):
+        request = (parser_context or {}).get('request')
+        meta = getattr(request, 'META', {}) if request is not None else {}
+        try:
+            length = int(meta.get('CONTENT_LENGTH') or 0)
+        except (TypeError, ValueError):
+            length = 0
+        if length > max_upload_bytes():
+            raise PayloadTooLarge()
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        self.check_size(parser_context)
+        return super().parse(stream, media_type, parser_context)
+
+
+class FacialJSONParser(UploadSizeLimitMixin, JSONParser):
+    """JSON con frames base64 (contrato original)."""
+
+
+class FacialMultiPartParser(UploadSizeLimitMixin, MultiPartParser):
+    """Frames como archivos `multipart/form-data`."""
+
+
+class FacialImageParser(UploadSizeLimitMixin, BaseParser):
+    """Cuerpo `application/octet-stream` con un único frame JPEG/PNG."""
+    media_type = 'application/octet-stream'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        self.check_size(parser_context)
+        limit = max_upload_bytes()
+        body = stream.read(limit + 1) if stream is not None else b''
+        if len(body) > limit:
+            raise PayloadTooLarge()
+        view = (parser_context or {}).get('view')
+        field = getattr(view, 'raw_upload_field', 'facial_data')
+        if getattr(view, 'raw_upload_many', False):
+            return {field: [body]}
+        return {field: body}
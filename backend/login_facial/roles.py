@@ -0,0 +1,46 @@
+"""Tabla de permisos por rol, precalculada al importar.
+
+Cada permiso tiene un bit fijo (su posición en `PERMISSIONS`); cada rol, un
+`frozenset` y una máscara. El modelo, los serializers y las vistas consultan
+esta tabla en lugar de armar listas en cada llamada. Los permisos se
+resuelven siempre desde el rol actual del usuario (cacheado por
+`CachedJWTAuthentication`), así que un cambio de rol aplica en la siguiente
+petición sin esperar a que expire el token.
+"""
+
+# El orden define los bits: agregar permisos siempre al final
+PERMISSIONS = (
+    'view_dashboard', 'view_transactions', 'view_alerts',
+    'view_models', 'view_configuration', 'manage_users', 'retrain_models',
+)
+PERMISSION_BITS = {perm: 1 << i for i, perm in enumerate(PERMISSIONS)}
+
+ROLE_PERMISSIONS = {
+    'Administrador': frozenset(PERMISSIONS),
+    'Analista': frozenset({'view_dashboard', 'view_transactions'}),
+}
+ROLE_MASKS = {
+    rol: sum(PERMISSION_BITS[perm] for perm in perms) for rol, perms in ROLE_PERMISSIONS.items()
+}
+# Permisos de cada rol en el orden de `PERMISSIONS` (para serializar)
+ROLE_PERMISSION_LIST = {
+    rol: tuple(perm for perm in PERMISSIONS if perm in perms) for rol, perms in ROLE_PERMISSIONS.items()
+}
+
+
+def permissions_for(rol):
+    """Permisos del rol, ordenados; vacío si el rol no existe."""
+    return ROLE_PERMISSION_LIST.get(rol, ())
+
+
+def mask_for(rol) -> int:
+    return ROLE_MASKS.get(rol, 0)
+
+
+def has_permission(rol, permission) -> bool:
+    return permission in ROLE_PERMISSIONS.get(rol, ())
+
+
+def mask_has(mask: int, permission) -> bool:
+    bit = PERMISSION_BITS.get(permission)
+    return bit is not None and bool(mask & bit)
@@ -0,0 +1,193 @@
+"""Agregados de auditoría facial (`ResumenSesionFacial`) por hora y por día.
+
+- `aplicar(sesiones)`: suma un lote recién escrito de `SesionFacial` a sus
+  filas de resumen con `UPDATE ... SET total = total + n` (atómico entre
+  procesos); si la fila no existe se crea. Dos procesos pueden crear a la
+  vez la misma fila: las consultas siempre suman filas, así que un duplicado
+  no altera los resultados.
+- `reconstruir(desde)`: recalcula los resúmenes desde las sesiones crudas.
+- `tendencias` y `por_rol`: leen solo filas de resumen.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDay, TruncHour
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import ResumenSesionFacial, SesionFacial, Usuario
+
+BINS = 10
+HIST_FIELDS = tuple(f'hist_{i}' for i in range(BINS))
+RESULTADOS = tuple(code for code, _ in SesionFacial.RESULTADOS)
+PERIODOS = {'hora': TruncHour, 'dia': TruncDay}
+
+
+def inicio_periodo(ts, periodo):
+    """Inicio de la hora o del día de `ts` en la zona horaria actual."""
+    local = timezone.localtime(ts).replace(minute=0, second=0, microsecond=0)
+    return local.replace(hour=0) if periodo == 'dia' else local
+
+
+def parse_fecha(value):
+    """Fecha u hora ISO a `datetime` con zona horaria; `None` si está vacía.
+
+    Lanza `ValueError` si el formato no es válido.
+    """
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        moment = datetime.combine(day, time.min)
+    return moment if timezone.is_aware(moment) else timezone.make_aware(moment)
+
+
+def tramo_confianza(confianza):
+    return min(max(int(confianza * BINS), 0), BINS - 1)
+
+
+def _acumular(sesiones, roles):
+    grupos = defaultdict(lambda: {'total': 0, 'con_confianza': 0, 'suma_confianza': 0.0,
+                                  **dict.fromkeys(HIST_FIELDS, 0)})
+    for sesion in sesiones:
+        ts = sesion.timestamp or timezone.now()
+        rol = roles.get(sesion.usuario_id, '')
+        for periodo in PERIODOS:
+            clave = (periodo, inicio_periodo(ts, periodo), sesion.resultado, sesion.usuario_id, rol)
+            grupo = grupos[clave]
+            grupo['total'] += 1
+            if sesion.confianza is not None:
+                grupo['con_confianza'] += 1
+                grupo['suma_confianza'] += float(sesion.confianza)
+                grupo[HIST_FIELDS[tramo_confianza(sesion.confianza)]] += 1
+    return grupos
+
+
+def aplicar(sesiones):
+    """Suma un lote de `SesionFacial` (ya guardadas o por guardar) a los resúmenes."""
+    ids = {s.usuario_id for s in sesiones if s.usuario_id is not None}
+    roles = dict(Usuario.objects.filter(pk__in=ids).values_list('id', 'rol')) if ids else {}
+    with transaction.atomic():
+        for (periodo, inicio, resultado, usuario_id, rol), grupo in _acumular(sesiones, roles).items():
+            clave = {'periodo': periodo, 'inicio': inicio, 'resultado': resultado,
+                     'usuario_id': usuario_id, 'rol': rol}
+            incrementos = {campo: F(campo) + valor for campo, valor in grupo.items() if valor}
+            fila = ResumenSesionFacial.objects.filter(**clave).order_by('pk')[:1].values_list('pk', flat=True)
+            if not ResumenSesionFacial.objects.filter(pk__in=list(fila)).update(**incrementos):
+                ResumenSesionFacial.objects.create(**clave, **grupo)
+
+
+def reconstruir(desde=None) -> int:
+    """Reemplaza los resúmenes (desde el inicio del día de `desde`) recalculándolos.
+
+    Retorna las filas creadas.
+    """
+    resumenes = ResumenSesionFacial.objects.all()
+    sesiones = SesionFacial.objects.all()
+    if desde is not None:
+        desde = inicio_periodo(desde, 'dia')
+        resumenes = resumenes.filter(inicio__gte=desde)
+        sesiones = sesiones.filter(timestamp__gte=desde)
+
+    histograma = {
+        campo: Count('id', filter=Q(confianza__gte=i / BINS) & (Q() if i == BINS - 1 else Q(confianza__lt=(i + 1) / BINS)))
+        for i, campo in enumerate(HIST_FIELDS)
+    }
+    creadas = 0
+    with transaction.atomic():
+        resumenes.delete()
+        for periodo, trunc in PERIODOS.items():
+            filas = (
+                sesiones
+                .annotate(inicio=trunc('timestamp'), rol_usuario=Coalesce('usuario__rol', Value('')))
+                .values('inicio', 'resultado', 'usuario_id', 'rol_usuario')
+                .annotate(
+                    total=Count('id'),
+                    con_confianza=Count('confianza'),
+                    suma_confianza=Coalesce(Sum('confianza'), Value(0.0)),
+                    **histograma,
+                )
+                .order_by()
+            )
+            lote = [
+                ResumenSesionFacial(periodo=periodo, rol=fila.pop('rol_usuario'), **fila)
+                for fila in filas.iterator()
+            ]
+            ResumenSesionFacial.objects.bulk_create(lote, batch_size=1000)
+            creadas += len(lote)
+    return creadas
+
+
+def rango_por_defecto(periodo, desde=None, hasta=None):
+    """`(desde, hasta)` por defecto: 48 horas o 30 días hasta ahora."""
+    hasta = hasta or timezone.now()
+    desde = desde or hasta - (timedelta(hours=48) if periodo == 'hora' else timedelta(days=30))
+    return desde, hasta
+
+
+def _media(suma, n):
+    return round(suma / n, 4) if n else None
+
+
+def tendencias(periodo, desde, hasta, usuario_id=None, rol=None):
+    """Serie temporal `[{inicio, total, exitoso, fallido, error, confianza_media}]`.
+
+    `desde` se lleva al inicio de su hora o día (como en `por_rol`): el primer
+    punto cubre su periodo completo.
+    """
+    filas = ResumenSesionFacial.objects.filter(
+        periodo=periodo, inicio__gte=inicio_periodo(desde, periodo), inicio__lt=hasta
+    )
+    if usuario_id is not None:
+        filas = filas.filter(usuario_id=usuario_id)
+    if rol:
+        filas = filas.filter(rol=rol)
+    filas = (
+        filas.values('inicio', 'resultado')
+        .annotate(n=Sum('total'), suma=Sum('suma_confianza'), con=Sum('con_confianza'))
+        .order_by('inicio')
+    )
+    serie = {}
+    for fila in filas:
+        punto = serie.setdefault(fila['inicio'], {
+            'inicio': fila['inicio'], 'total': 0, **dict.fromkeys(RESULTADOS, 0), '_suma': 0.0, '_con': 0,
+        })
+        punto[fila['resultado']] = punto.get(fila['resultado'], 0) + fila['n']
+        punto['total'] += fila['n']
+        punto['_suma'] += fila['suma'] or 0.0
+        punto['_con'] += fila['con'] or 0
+    for punto in serie.values():
+        punto['confianza_media'] = _media(punto.pop('_suma'), punto.pop('_con'))
+    return list(serie.values())
+
+
+def por_rol(desde, hasta):
+    """Agregados por rol: conteos por resultado, confianza media e histograma."""
+    filas = (
+        ResumenSesionFacial.objects
+        .filter(periodo='dia', inicio__gte=inicio_periodo(desde, 'dia'), inicio__lt=hasta)
+        .values('rol', 'resultado')
+        .annotate(n=Sum('total'), suma=Sum('suma_confianza'), con=Sum('con_confianza'),
+                  **{campo: Sum(campo) for campo in HIST_FIELDS})
+        .order_by('rol')
+    )
+    roles = {}
+    for fila in filas:
+        item = roles.setdefault(fila['rol'], {
+            'rol': fila['rol'] or None, 'total': 0, **dict.fromkeys(RESULTADOS, 0),
+            'histograma_confianza': [0] * BINS, '_suma': 0.0, '_con': 0,
+        })
+        item[fila['resultado']] = item.get(fila['resultado'], 0) + fila['n']
+        item['total'] += fila['n']
+        item['_suma'] += fila['suma'] or 0.0
+        item['_con'] += fila['con'] or 0
+        for i, campo in enumerate(HIST_FIELDS):
+            item['histograma_confianza'][i] += fila[campo] or 0
+    for item in roles.values():
+        item['confianza_media'] = _media(item.pop('_suma'), item.pop('_con'))
+    return list(roles.values())
@@ -0,0 +1,119 @@
+"""Búsqueda de usuarios por email, DNI, nombres y apellidos.
+
+`icontains` sobre cuatro columnas se traduce en `LIKE '%q%'`, que recorre
+toda la tabla. En SQLite se mantiene un índice FTS5 con tokenizer `trigram`
+(`usuarios_busqueda`, creado en la migración 0007) cuyo `rowid` es el id del
+usuario: cualquier subcadena de 3 o más caracteres se resuelve con el índice.
+
+- Cada término de la consulta debe aparecer en alguna de las columnas (AND).
+- Términos de menos de 3 caracteres (o bases de datos sin FTS5) usan el
+  filtro portable `icontains`.
+- Las señales de `Usuario` mantienen el índice (`index_user`/`unindex_user`);
+  las escrituras masivas sin señales (`bulk_create`, `update`) deben llamar a
+  `index_users` o `rebuild`.
+"""
+import logging
+from functools import reduce
+from operator import and_, or_
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+log = logging.getLogger('facial')
+
+TABLE = 'usuarios_busqueda'
+FIELDS = ('email', 'dni', 'nombres', 'apellidos')
+MIN_TERM = 3  # el tokenizer trigram no indexa subcadenas más cortas
+
+_available = None
+
+
+def fts_available() -> bool:
+    """`True` si la BD es SQLite y existe la tabla FTS5 (se evalúa una vez)."""
+    global _available
+    if _available is None:
+        _available = connection.vendor == 'sqlite' and TABLE in connection.introspection.table_names()
+    return _available
+
+
+def _terms(query):
+    return [t for t in (query or '').split() if t]
+
+
+def _match_expression(terms):
+    # Cada término como frase literal: FTS5 no interpreta operadores dentro de comillas
+    return ' '.join('"{}"'.format(t.replace('"', '""')) for t in terms)
+
+
+def _portable_filter(terms):
+    return reduce(and_, (reduce(or_, (Q(**{f'{f}__icontains': t}) for f in FIELDS)) for t in terms))
+
+
+def filter_queryset(queryset, query):
+    """Filtra `queryset` de `Usuario` por `query` usando el índice si es posible."""
+    terms = _terms(query)
+    if not terms:
+        return queryset
+    indexed = [t for t in terms if len(t) >= MIN_TERM] if fts_available() else []
+    short = [t for t in terms if t not in indexed]
+    if indexed:
+        ids = RawSQL(f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s', [_match_expression(indexed)])
+        queryset = queryset.filter(id__in=ids)
+    if short:
+        queryset = queryset.filter(_portable_filter(short))
+    return queryset
+
+
+def _values(user):
+    return [user.pk] + [getattr(user, f) or '' for f in FIELDS]
+
+
+def index_user(user):
+    """Inserta o reemplaza la fila del índice de `user`."""
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [user.pk])
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, {", ".join(FIELDS)}) VALUES (%s, %s, %s, %s, %s)', _values(user)
+        )
+
+
+def unindex_user(pk):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [pk])
+
+
+def index_users(users):
+    """Indexa un lote de usuarios (para escrituras que no emiten señales)."""
+    if not fts_available():
+        return
+    rows = [_values(u) for u in users]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {TABLE} WHERE rowid = %s', [[r[0]] for r in rows])
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, {", ".join(FIELDS)}) VALUES (%s, %s, %s, %s, %s)', rows
+        )
+
+
+def rebuild() -> int:
+    """Reconstruye el índice completo desde `registro_usuarios`; retorna las filas."""
+    if not fts_available():
+        return 0
+    from .models import Usuario
+    table = Usuario._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, {", ".join(FIELDS)}) '
+            f'SELECT id, {", ".join(FIELDS)} FROM {table}'
+        )
+        cursor.execute(f'SELECT count(*) FROM {TABLE}')
+        total = cursor.fetchone()[0]
+    log.info(f'search: índice de usuarios reconstruido con {total} filas')
+    return total
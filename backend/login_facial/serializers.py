@@ -1,5 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
+from django.core.files.uploadedfile import InMemoryUploadedFile, UploadedFile
+from . import roles
 from .models import Usuario, DatosFaciales, SesionFacial
 
 
@@ -67,23 +69,81 @@ class LoginSerializer(serializers.Serializer):
         return attrs
 
 
+def _upload_bytes(upload):
+    """Contenido de un archivo subido; sin copia si está en memoria."""
+    if isinstance(upload, InMemoryUploadedFile) and hasattr(upload.file, 'getvalue'):
+        return upload.file.getvalue()
+    upload.seek(0)
+    return upload.read()
+
+
+class FacialFrameField(serializers.Field):
+    """Frame facial como texto base64 o binario (archivo multipart / bytes)"""
+    default_error_messages = {
+        'invalid': 'Datos faciales inválidos',
+    }
+    
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            data = _upload_bytes(data)
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            return data
+        if isinstance(data, str):
+            return data.strip()
+        self.fail('invalid')
+    
+    def to_representation(self, value):
+        return value
+
+
+class FaceBoxSerializer(serializers.Serializer):
+    """Caja del rostro detectada en el cliente, normalizada al frame (0-1)"""
+    x = serializers.FloatField(min_value=0.0, max_value=1.0)
+    y = serializers.FloatField(min_value=0.0, max_value=1.0)
+    width = serializers.FloatField(min_value=0.0, max_value=1.0)
+    height = serializers.FloatField(min_value=0.0, max_value=1.0)
+
+
 class FacialLoginSerializer(serializers.Serializer):
     """Serializer para login facial"""
-    facial_data = serializers.CharField(help_text="Datos faciales en base64")
+    facial_data = FacialFrameField(help_text="Frame facial en base64 o como archivo binario")
+    face_box = FaceBoxSerializer(
+        required=False,
+        help_text="Caja del rostro detectada en el cliente (evita la detección en servidor)"
+    )
+    dni = serializers.CharField(
+        required=False, max_length=8,
+        help_text="DNI del usuario a verificar (1:1); sin él se busca en toda la galería"
+    )
+    user_id = serializers.IntegerField(
+        required=False, min_value=1,
+        help_text="Id del usuario a verificar (alternativa al DNI)"
+    )
     
     def validate_facial_data(self, value):
         if not value or len(value) < 100:  # Validación básica
             raise serializers.ValidationError("Datos faciales inválidos")
         return value
 
+    def validate(self, attrs):
+        if attrs.get('dni') and attrs.get('user_id'):
+            raise serializers.ValidationError("Indique solo DNI o user_id, no ambos")
+        return attrs
+
 
 class FacialRegisterSerializer(serializers.Serializer):
     """Serializer para registro facial"""
     facial_samples = serializers.ListField(
-        child=serializers.CharField(),
+        child=FacialFrameField(),
         min_length=1,
         max_length=10,
-        help_text="Lista de muestras faciales en base64"
+        help_text="Lista de muestras faciales en base64 o como archivos binarios"
+    )
+    face_boxes = serializers.ListField(
+        child=FaceBoxSerializer(allow_null=True),
+        required=False,
+        max_length=10,
+        help_text="Cajas del rostro por muestra (mismo orden que facial_samples)"
     )
     
     def validate_facial_samples(self, value):
@@ -95,6 +155,12 @@ class FacialRegisterSerializer(serializers.Serializer):
                 raise serializers.ValidationError("Muestra facial inválida")
         
         return value
+    
+    def validate(self, attrs):
+        boxes = attrs.get('face_boxes')
+        if boxes is not None and len(boxes) != len(attrs['facial_samples']):
+            raise serializers.ValidationError("face_boxes debe tener una caja por muestra")
+        return attrs
 
 
 class DatosFacialesSerializer(serializers.ModelSerializer):
@@ -124,17 +190,28 @@ class SesionFacialSerializer(serializers.ModelSerializer):
 
 
 class PermissionCheckSerializer(serializers.Serializer):
-    """Serializer para verificación de permisos"""
-    permission = serializers.CharField(help_text="Permiso a verificar")
+    """Serializer para verificación de permisos (uno o varios por petición)"""
+    permission = serializers.CharField(required=False, help_text="Permiso a verificar")
+    permissions = serializers.ListField(
+        child=serializers.CharField(), required=False, allow_empty=False, max_length=len(roles.PERMISSIONS),
+        help_text="Permisos a verificar en una sola petición"
+    )
     
-    def validate_permission(self, value):
-        valid_permissions = [
-            'view_dashboard', 'view_transactions', 'view_alerts', 
-            'view_models', 'view_configuration', 'manage_users', 'retrain_models'
-        ]
-        if value not in valid_permissions:
-            raise serializers.ValidationError(f"Permiso inválido. Válidos: {valid_permissions}")
+    def _validate_name(self, value):
+        if value not in roles.PERMISSION_BITS:
+            raise serializers.ValidationError(f"Permiso inválido. Válidos: {list(roles.PERMISSIONS)}")
         return value
+    
+    def validate_permission(self, value):
+        return self._validate_name(value)
+    
+    def validate_permissions(self, value):
+        return [self._validate_name(v) for v in value]
+    
+    def validate(self, attrs):
+        if ('permission' in attrs) == ('permissions' in attrs):
+            raise serializers.ValidationError("Envíe 'permission' o 'permissions'")
+        return attrs
 
 
 class UserProfileSerializer(serializers.ModelSerializer):
@@ -152,8 +229,4 @@ class UserProfileSerializer(serializers.ModelSerializer):
     
     def get_permissions(self, obj):
         """Retorna los permisos del usuario basados en su rol"""
-        all_permissions = [
-            'view_dashboard', 'view_transactions', 'view_alerts', 
-            'view_models', 'view_configuration', 'manage_users', 'retrain_models'
-        ]
-        return [perm for perm in all_permissions if obj.has_permission(perm)]
\ No newline at end of file
+        return list(roles.permissions_for(obj.rol))
\ No newline at end of file
@@ -0,0 +1,42 @@
+"""Señales de la app login_facial.
+
+Mantienen coherentes las cachés locales del proceso cuando cambian los
+datos de los que dependen.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from . import search
+from .authentication import get_user_cache
+from .gallery import get_gallery
+from .models import DatosFaciales, Usuario
+
+
+@receiver(post_save, sender=DatosFaciales)
+@receiver(post_delete, sender=DatosFaciales)
+def invalidar_galeria(sender, **kwargs):
+    """Fuerza la recarga de la galería facial tras un alta, cambio o baja."""
+    get_gallery().invalidate()
+
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+def invalidar_usuario(sender, instance, **kwargs):
+    """Descarta al usuario de la caché de autenticación JWT."""
+    cache = get_user_cache()
+    if cache is not None:
+        cache.invalidate(getattr(instance, jwt_settings.USER_ID_FIELD))
+
+
+@receiver(post_save, sender=Usuario)
+def indexar_usuario(sender, instance, update_fields=None, **kwargs):
+    """Actualiza el índice de búsqueda si cambió algún campo buscable."""
+    if update_fields is not None and not set(update_fields) & set(search.FIELDS):
+        return
+    search.index_user(instance)
+
+
+@receiver(post_delete, sender=Usuario)
+def desindexar_usuario(sender, instance, **kwargs):
+    search.unindex_user(instance.pk)
@@ -1,15 +1,47 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
+import base64
+import io
+import json
+import os
+import shutil
+import tempfile
+
+import cv2
 import numpy as np
 
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from rest_framework.test import APIClient
+
+from . import gallery_shm, gallery_store
+from .ann import IVFIndex
+from .embedding_cache import EmbeddingCache, content_key
+from .embedding_service import EmbeddingService, EmbeddingServiceBusy, EmbeddingServiceTimeout
+from .gallery import build_index, build_snapshot, gallery_version, get_gallery, load_snapshot_from_db, nearest
+from .models import DatosFaciales, SesionFacial, Usuario
+from .serializers import FacialRegisterSerializer
 from .views import (
+    _box_hint_location,
+    _compute_embedding_from_b64,
+    _compute_embeddings_batch,
+    _detection_image,
+    _frame_buffer,
     _compare_embeddings,
     _compare_to_collection,
     _validate_position_collection,
     _validate_position,
+    get_tokens_for_user,
 )
 
 
+def _frame_b64(seed=0, size=(480, 640)):
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(0, 255, size=(*size, 3), dtype=np.uint8)
+    ok, buf = cv2.imencode('.jpg', frame)
+    return 'data:image/jpeg;base64,' + base64.b64encode(buf.tobytes()).decode()
+
+
 class DummyUser:
     def __init__(self):
         self.facial_data = None
@@ -36,6 +68,24 @@ class FacialUtilsTests(TestCase):
         live = base + 0.5
         self.assertFalse(_compare_to_collection(user, live))
 
+    def test_match_collection_returns_index_and_margin_in_one_pass(self):
+        from .views import _match_collection
+        rng = np.random.default_rng(3)
+        user = DummyUser()
+        user.facial_embeddings = [rng.normal(size=129).astype(np.float32) for _ in range(12)]
+        live = user.facial_embeddings[7][:128] + 0.01
+        match = _match_collection(user, live)
+        expected = sorted(np.linalg.norm(e[:128] - live) for e in user.facial_embeddings)
+        self.assertEqual(match.index, 7)
+        self.assertAlmostEqual(match.distance, expected[0], places=3)
+        self.assertAlmostEqual(match.margin, expected[1] - expected[0], places=3)
+        collection = user._embedding_collection[3]
+        _match_collection(user, live)
+        self.assertIs(user._embedding_collection[3], collection)  # reutilizada
+        user.facial_embeddings = user.facial_embeddings[:3]
+        _match_collection(user, live)
+        self.assertIsNot(user._embedding_collection[3], collection)  # muestras nuevas
+
     def test_validate_position_collection(self):
         user = DummyUser()
         user.positions = [
@@ -52,3 +102,967 @@ class FacialUtilsTests(TestCase):
         self.assertTrue(_validate_position(stored, live))
         live_bad = {'x': 0.8, 'y': 0.2, 'scale': 1.5}
         self.assertFalse(_validate_position(stored, live_bad))
+
+
+class FacialGalleryTests(TestCase):
+    def _user(self, dni):
+        return Usuario.objects.create_user(
+            email=f'{dni}@test.com', dni=dni, nombres='N', apellidos='A', password='x'
+        )
+
+    def test_nearest_matches_bruteforce(self):
+        rng = np.random.default_rng(0)
+        rows = [(uid, [rng.random(128), rng.random(128)]) for uid in range(1, 51)]
+        snap = build_snapshot(rows)
+        live = rows[17][1][1] + 0.001
+        user_id, dist = nearest(snap, live)
+        expected = min(
+            (float(np.linalg.norm(np.asarray(e, dtype=np.float32) - live)), uid)
+            for uid, embs in rows for e in embs
+        )
+        self.assertEqual(user_id, 18)
+        self.assertAlmostEqual(dist, expected[0], places=3)
+
+    def test_identify_reloads_after_signal(self):
+        gallery = get_gallery()
+        user = self._user('12345678')
+        base = np.full(128, 0.1, dtype=np.float32)
+        self.assertEqual(gallery.identify(base, 0.6), (None, float('inf')))
+        datos = DatosFaciales(usuario=user, posiciones=[])
+        datos.establecer_embeddings([base])
+        datos.save()
+        user_id, dist = gallery.identify(base + 0.001, 0.6)
+        self.assertEqual(user_id, user.id)
+        self.assertLess(dist, 0.1)
+        user_id, _ = gallery.identify(base + 1.0, 0.6)
+        self.assertIsNone(user_id)
+
+    def test_binary_embeddings_roundtrip(self):
+        user = self._user('87654321')
+        samples = np.random.rand(3, 128).astype(np.float32)
+        datos = DatosFaciales(usuario=user, posiciones=[])
+        datos.establecer_embeddings(samples)
+        datos.save()
+        datos.refresh_from_db()
+        matrix = datos.matriz_embeddings()
+        self.assertEqual(datos.num_muestras, 3)
+        self.assertEqual(matrix.shape, (3, 128))
+        self.assertEqual(len(bytes(datos.embeddings_blob)), 3 * 128 * 4)
+        np.testing.assert_array_equal(matrix, samples)
+        self.assertFalse(matrix.flags.writeable)
+        datos.agregar_muestra(samples[0], {'x': 0.5, 'y': 0.5, 'scale': 1.0})
+        self.assertEqual(len(datos.obtener_embeddings()), 4)
+
+    @override_settings(FACIAL_GALLERY_INDEX='ivf', FACIAL_IVF_MIN_SIZE=100, FACIAL_IVF_NPROBE=4)
+    def test_ivf_index_agrees_with_exact_search(self):
+        rng = np.random.default_rng(1)
+        rows = [(uid, rng.normal(0, 0.1, size=(2, 128))) for uid in range(1, 301)]
+        snap = build_index(build_snapshot(rows))
+        self.assertIsNotNone(snap.index)
+        self.assertIsNone(build_index(build_snapshot(rows[:10])).index)
+
+        index = IVFIndex(n_lists=snap.index.n_lists).fit(snap.matrix)
+        for uid, block in rows[::30]:
+            live = block[0] + 0.001
+            row, sq = index.search(live, nprobe=index.n_lists)
+            self.assertEqual(int(snap.user_ids[row]), nearest(snap, live, exact=True)[0])
+            self.assertEqual(nearest(snap, live)[0], uid)
+
+
+    @override_settings(FACIAL_GALLERY_INDEX='ivf', FACIAL_IVF_MIN_SIZE=100)
+    def test_ivf_index_is_built_off_the_request_path(self):
+        import threading
+        from unittest import mock
+        from . import gallery as gallery_module
+        rng = np.random.default_rng(2)
+        rows = [(uid, rng.normal(0, 0.1, size=(2, 128))) for uid in range(1, 101)]
+        gallery = gallery_module.FacialGallery(ttl=0)
+        gallery._load = lambda version: build_snapshot(rows, version)
+        release = threading.Event()
+        real_build = gallery_module.build_index
+
+        def slow_build(snapshot):
+            release.wait(5)
+            return real_build(snapshot)
+
+        with mock.patch.object(gallery_module, 'build_index', slow_build), \
+                mock.patch.object(gallery_module, 'gallery_version', return_value=(1,)) as version:
+            first = gallery.snapshot()  # sin índice previo: búsqueda exacta mientras tanto
+            self.assertIsNone(first.index)
+            release.set()
+            gallery._builder.join(5)
+            self.assertIsNotNone(gallery.snapshot().index)
+
+            release.clear()
+            version.return_value = (2,)
+            served = gallery.snapshot()  # se sigue sirviendo la versión indexada anterior
+            self.assertEqual(served.version, (1,))
+            self.assertIsNotNone(served.index)
+            release.set()
+            gallery._builder.join(5)
+            self.assertEqual(gallery.snapshot().version, (2,))
+            self.assertIsNotNone(gallery.snapshot().index)
+
+
+class GallerySnapshotStoreTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        user = Usuario.objects.create_user(
+            email='snap@test.com', dni='11223344', nombres='N', apellidos='A', password='x'
+        )
+        self.base = np.full(128, 0.2, dtype=np.float32)
+        self.datos = DatosFaciales(usuario=user, posiciones=[])
+        self.datos.establecer_embeddings([self.base, self.base + 0.5])
+        self.datos.save()
+
+    def test_export_and_load_memory_mapped(self):
+        call_command('facial_gallery_snapshot', dir=self.dir, stdout=io.StringIO())
+        version = gallery_version()
+        snap = gallery_store.load(version, self.dir)
+        self.assertIsInstance(snap.matrix, np.memmap)
+        self.assertFalse(snap.matrix.flags.writeable)
+        self.assertEqual(snap.matrix.shape, (2, 128))
+        self.assertEqual(nearest(snap, self.base + 0.001)[0], self.datos.usuario_id)
+        np.testing.assert_array_equal(snap.sq_norms, load_snapshot_from_db(version).sq_norms)
+
+    def test_stale_snapshot_is_ignored(self):
+        gallery_store.export(self.dir)
+        self.datos.activo = False
+        self.datos.save()
+        self.assertIsNone(gallery_store.load(gallery_version(), self.dir))
+        with override_settings(FACIAL_GALLERY_SNAPSHOT_DIR=self.dir):
+            get_gallery().invalidate()
+            self.assertEqual(get_gallery().identify(self.base, 0.6)[0], None)
+            gallery_store.export()
+            self.assertEqual(len(os.listdir(self.dir)), 3)  # dos versiones + current.json
+            self.assertIsNotNone(gallery_store.load(gallery_version()))
+
+
+class SharedMemoryGalleryTests(TestCase):
+    def setUp(self):
+        self.name = f'facial_test_{os.getpid()}_{self._testMethodName[-12:]}'
+        self.owner = gallery_shm.GalleryOwner(self.name)
+        self.addCleanup(gallery_shm.unlink, self.name)
+        self.addCleanup(self.owner.close)
+        rng = np.random.default_rng(5)
+        self.rows = [(uid, rng.random((2, 128))) for uid in range(1, 21)]
+
+    def test_reader_attaches_published_generation_read_only(self):
+        snap = build_snapshot(self.rows, version=(40, 40, 'v1'))
+        self.assertEqual(self.owner.publish(snap), 1)
+        reader = gallery_shm.GalleryReader(self.name)
+        shared = reader.load((40, 40, 'v1'))
+        self.assertFalse(shared.matrix.flags.writeable)
+        np.testing.assert_array_equal(shared.matrix, snap.matrix)
+        np.testing.assert_array_equal(shared.user_ids, snap.user_ids)
+        live = self.rows[4][1][1] + 0.001
+        self.assertEqual(nearest(shared, live), nearest(snap, live))
+        self.assertIsNone(reader.load((40, 40, 'otra')))
+
+    def test_new_generations_do_not_tear_attached_readers(self):
+        reader = gallery_shm.GalleryReader(self.name)
+        self.owner.publish(build_snapshot(self.rows, version=(1,)))
+        first = reader.load((1,))
+        expected = first.matrix.copy()
+        for generation in range(2, 5):
+            self.owner.publish(build_snapshot(self.rows[:generation], version=(generation,)))
+        self.assertEqual(reader.generation(), 4)
+        np.testing.assert_array_equal(first.matrix, expected)  # g1 ya eliminada, sigue mapeada
+        self.assertEqual(reader.load((4,)).matrix.shape, (8, 128))
+        self.owner.close()
+        self.assertIsNone(reader.load((4,)))
+        self.assertEqual(gallery_shm.GalleryOwner(self.name).generation, 5)
+
+    def test_gallery_uses_shared_memory_when_version_matches(self):
+        user = Usuario.objects.create_user(
+            email='shm@test.com', dni='55667788', nombres='N', apellidos='A', password='x'
+        )
+        base = np.full(128, 0.3, dtype=np.float32)
+        datos = DatosFaciales(usuario=user, posiciones=[])
+        datos.establecer_embeddings([base])
+        datos.save()
+        self.owner.publish(load_snapshot_from_db(gallery_version()))
+        with override_settings(FACIAL_GALLERY_SHM_NAME=self.name):
+            gallery = get_gallery()
+            gallery.invalidate()
+            self.assertEqual(gallery.identify(base + 0.001, 0.6)[0], user.id)
+            self.assertFalse(gallery.current().matrix.flags.writeable)
+        gallery.invalidate()
+
+
+class DetectionPyramidTests(TestCase):
+    def test_reduced_decode_and_max_side(self):
+        frame_b64 = _frame_b64(size=(480, 640))
+        buffer = _frame_buffer(frame_b64)
+        frame = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+        small, factor = _detection_image(buffer, frame, scale=2)
+        self.assertEqual(small.shape[:2], (240, 320))
+        self.assertEqual(factor, 2.0)
+        small, factor = _detection_image(buffer, frame, scale=1, max_side=160)
+        self.assertEqual(small.shape[:2], (120, 160))
+        self.assertEqual(factor, 4.0)
+        small, factor = _detection_image(buffer, frame)
+        self.assertIs(small, frame)
+
+    def test_timings_cover_pipeline_stages(self):
+        timings = {}
+        self.assertIsNotNone(_compute_embedding_from_b64(_frame_b64(), timings))
+        self.assertTrue({'decode', 'encode'} <= set(timings))
+
+
+class FaceBoxHintTests(TestCase):
+    def test_box_hint_is_padded_and_clamped(self):
+        box = {'x': 0.25, 'y': 0.25, 'width': 0.3, 'height': 0.4}
+        self.assertEqual(_box_hint_location(box, (480, 640, 3)), (101, 371, 331, 141))
+        edge = {'x': 0.0, 'y': 0.0, 'width': 0.3, 'height': 0.4}
+        self.assertEqual(_box_hint_location(edge, (480, 640, 3))[::3], (0, 0))
+
+    def test_implausible_box_hints_are_rejected(self):
+        shape = (480, 640, 3)
+        self.assertIsNone(_box_hint_location(None, shape))
+        self.assertIsNone(_box_hint_location({'x': 0.2, 'y': 0.2, 'width': 0.02, 'height': 0.03}, shape))
+        self.assertIsNone(_box_hint_location({'x': 0.1, 'y': 0.1, 'width': 0.8, 'height': 0.1}, shape))
+        self.assertIsNone(_box_hint_location({'x': 0.9, 'y': 0.2, 'width': 0.3, 'height': 0.4}, shape))
+        self.assertIsNone(_box_hint_location({'x': 0.2}, shape))
+
+    def test_register_serializer_requires_one_box_per_sample(self):
+        sample = _frame_b64()
+        box = {'x': 0.25, 'y': 0.25, 'width': 0.3, 'height': 0.4}
+        ok = FacialRegisterSerializer(data={'facial_samples': [sample, sample], 'face_boxes': [box, None]})
+        self.assertTrue(ok.is_valid(), ok.errors)
+        bad = FacialRegisterSerializer(data={'facial_samples': [sample, sample], 'face_boxes': [box]})
+        self.assertFalse(bad.is_valid())
+
+
+class EmbeddingServiceTests(TestCase):
+    def test_pool_matches_inline_embedding(self):
+        service = EmbeddingService(workers=1, queue_depth=0, timeout=30)
+        try:
+            frame = _frame_b64(3)
+            embedding, timings = service.compute(frame)
+            np.testing.assert_allclose(embedding, _compute_embedding_from_b64(frame))
+            self.assertIn('encode', timings)
+            self.assertEqual(service.pending, 0)
+        finally:
+            service.shutdown()
+
+    def test_rejects_when_queue_is_full(self):
+        service = EmbeddingService(workers=1, queue_depth=1)
+        service._slots.acquire()
+        service._slots.acquire()
+        with self.assertRaises(EmbeddingServiceBusy):
+            service.compute(_frame_b64())
+
+    def test_map_windows_batches_larger_than_capacity(self):
+        from .embedding_service import _embed_sample
+        service = EmbeddingService(workers=1, queue_depth=1, timeout=30)
+        try:
+            frames = [_frame_b64(seed) for seed in range(5)]
+            embedded = service.map(_embed_sample, [(frame, None) for frame in frames])
+            self.assertEqual([error for _, error in embedded], [None] * 5)
+            self.assertEqual(service.pending, 0)
+            service._slots.acquire()
+            service._slots.acquire()
+            with self.assertRaises(EmbeddingServiceBusy):
+                service.map(_embed_sample, [(frames[0], None)])
+        finally:
+            service.shutdown()
+
+    def test_register_encodes_in_the_pool(self):
+        from unittest import mock
+        from . import embedding_service
+        user = Usuario.objects.create_user(
+            email='pool@test.com', dni='30000001', nombres='N', apellidos='A', password='x'
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+        self.addCleanup(setattr, embedding_service, '_service', None)
+        # 'spawn': los workers no heredan el mock del proceso que atiende la petición
+        with self.settings(FACIAL_EMBEDDING_WORKERS=1, FACIAL_EMBEDDING_START_METHOD='spawn'), \
+                mock.patch('login_facial.views._encode_faces') as encode:
+            try:
+                response = client.post('/api/auth/facial-register/',
+                                       {'facial_samples': [_frame_b64(1), _frame_b64(2)]}, format='json')
+            finally:
+                if embedding_service._service is not None:
+                    embedding_service._service.shutdown()
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['samples_processed'], 2)
+        encode.assert_not_called()
+        self.assertEqual(DatosFaciales.objects.get(usuario=user).num_muestras, 2)
+
+    def test_map_cancels_pending_work_on_failure(self):
+        from concurrent.futures import Future
+        service = EmbeddingService(workers=1, queue_depth=2, timeout=0.01)
+        futures = []
+
+        def submit(fn, *args):
+            futures.append(Future())
+            return futures[-1]
+
+        service.submit = submit
+        with self.assertRaises(EmbeddingServiceTimeout):
+            service.map(abs, [(1,), (2,), (3,)])
+        self.assertTrue(all(future.cancelled() for future in futures))
+
+    def test_batch_reports_failed_samples(self):
+        frames = [_frame_b64(1), 'data:image/jpeg;base64,' + 'A' * 200, _frame_b64(2)]
+        embeddings, failures = _compute_embeddings_batch(frames)
+        self.assertEqual(failures, [{'index': 1, 'error': 'decode_error'}])
+        self.assertIsNone(embeddings[1])
+        np.testing.assert_allclose(embeddings[0], _compute_embedding_from_b64(frames[0]))
+        np.testing.assert_allclose(embeddings[2], _compute_embedding_from_b64(frames[2]))
+
+
+class EmbeddingCacheTests(TestCase):
+    def test_counts_hits_and_caches_no_face(self):
+        cache = EmbeddingCache(maxsize=2, ttl=60)
+        calls = []
+        key = content_key(b'frame', None)
+        for _ in range(3):
+            self.assertIsNone(cache.get_or_compute(key, lambda: calls.append(1)))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+        self.assertNotEqual(key, content_key(b'frame', (0.1, 0.1, 0.5, 0.5)))
+
+    def test_concurrent_identical_frames_compute_once(self):
+        import threading
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        cache = EmbeddingCache()
+        started, release, calls = threading.Event(), threading.Event(), []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'emb'
+
+        with ThreadPoolExecutor(4) as pool:
+            leader = pool.submit(cache.get_or_compute, b'k', compute)
+            started.wait(5)
+            followers = [pool.submit(cache.get_or_compute, b'k', compute) for _ in range(3)]
+            while cache.coalesced < 3:
+                time.sleep(0.001)
+            release.set()
+            results = [leader.result()] + [f.result() for f in followers]
+        self.assertEqual(results, ['emb'] * 4)
+        self.assertEqual(len(calls), 1)
+
+    def test_errors_are_not_cached(self):
+        cache = EmbeddingCache()
+        with self.assertRaises(RuntimeError):
+            cache.get_or_compute(b'k', lambda: (_ for _ in ()).throw(RuntimeError()))
+        self.assertEqual(cache.get_or_compute(b'k', lambda: 'ok'), 'ok')
+
+
+class FacialBenchmarkCommandTests(TestCase):
+    def test_emits_json_report(self):
+        out = io.StringIO()
+        call_command('facial_benchmark', sizes='50', frames=2, queries=5, users=1, samples=2,
+                     json=True, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(set(report), {'meta', 'pipeline', 'matching', 'register', 'load'})
+        self.assertEqual(report['matching'][0]['gallery_size'], 50)
+        self.assertGreater(report['load'][0]['binary']['peak_kb'], 0)
+
+
+class AuthLoadTestCommandTests(TestCase):
+    def test_seed_users_enrolls_faces_and_returns_fixture(self):
+        from .management.commands.auth_load_test import seed_users
+        fixture = seed_users(3, 'clave-carga')
+        self.assertEqual([u['dni'] for u in fixture['users']], ['90000000', '90000001', '90000002'])
+        self.assertEqual(DatosFaciales.objects.filter(usuario__email__endswith='@loadtest.local').count(), 3)
+        self.assertTrue(Usuario.objects.get(dni='90000001').check_password('clave-carga'))
+
+    def test_summarize_percentiles_and_errors(self):
+        from django.core.management.base import CommandError
+        from .management.commands.auth_load_test import parse_mix, summarize
+        self.assertEqual(parse_mix('login=2,me=0,users'), {'login': 2.0, 'users': 1.0})
+        with self.assertRaises(CommandError):
+            parse_mix('otro=1')
+        records = [('me', 200, i / 1000) for i in range(1, 100)] + [('me', 500, 0.1), ('me', None, 0.2)]
+        me = summarize(records, elapsed=2.0)['me']
+        self.assertEqual((me['requests'], me['errors'], me['non_2xx']), (101, 2, 2))
+        self.assertEqual(me['status'], {'200': 99, '500': 1, 'conn_error': 1})
+        self.assertAlmostEqual(me['p50_ms'], 51.0)
+
+
+class MetricsTests(TestCase):
+    def test_histogram_buckets_are_cumulative(self):
+        from .metrics import MetricsRegistry
+        registry = MetricsRegistry()
+        registry.record_timings('facial_login', {'decode': 0.5, 'total': 30.0})
+        registry.record_timings('facial_login', {'decode': 2.0, 'total': 3000.0})
+        text = registry.render()
+        self.assertIn('auth_stage_duration_seconds_bucket{endpoint="facial_login",stage="decode",le="0.001"} 1', text)
+        self.assertIn('auth_stage_duration_seconds_bucket{endpoint="facial_login",stage="decode",le="0.0025"} 2', text)
+        self.assertIn('auth_stage_duration_seconds_bucket{endpoint="facial_login",stage="total",le="2.5"} 1', text)
+        self.assertIn('auth_stage_duration_seconds_count{endpoint="facial_login",stage="total"} 2', text)
+
+    def test_metrics_endpoint_exposes_stages_and_gauges(self):
+        user = Usuario.objects.create_user(
+            email='metricas@test.com', dni='22334455', nombres='N', apellidos='A', password='secreta123'
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+        client.get('/api/auth/me/')
+        text = client.get('/api/metrics/').content.decode()
+        self.assertIn('auth_requests_total{endpoint="me",status="200"}', text)
+        self.assertIn('stage="serialize"', text)
+        self.assertIn('facial_gallery_samples', text)
+        self.assertIn('facial_embedding_cache_hit_ratio', text)
+        self.assertEqual(client.get('/api/metrics/', REMOTE_ADDR='10.0.0.9').status_code, 403)
+
+    def test_gallery_users_counted_once_per_version(self):
+        from types import SimpleNamespace
+        from unittest import mock
+        from . import metrics
+        snaps = [SimpleNamespace(version=('v1',), user_ids=np.array([1, 1, 2])),
+                 SimpleNamespace(version=('v1',), user_ids=np.array([1, 2, 3])),
+                 SimpleNamespace(version=('v2',), user_ids=np.array([1, 2, 3]))]
+        gallery = mock.Mock(current=mock.Mock(side_effect=snaps))
+        with mock.patch('login_facial.gallery.get_gallery', return_value=gallery), \
+                mock.patch.object(metrics, '_gallery_users_count', (None, 0)):
+            self.assertEqual([metrics._gallery_users() for _ in snaps], [2, 2, 3])
+
+
+class AuditWriterTests(TestCase):
+    def test_flushes_in_batches_and_counts_drops(self):
+        from .audit import AuditWriter
+        writer = AuditWriter(batch_size=2, max_pending=3, background=False)
+        accepted = [writer.enqueue(resultado='fallido', detalles={'i': i}) for i in range(5)]
+        self.assertEqual(accepted, [True, True, True, False, False])
+        self.assertEqual(writer.flush(), 3)
+        self.assertEqual(writer.stats(), {'pending': 0, 'written': 3, 'dropped': 2, 'failed': 0})
+        self.assertEqual(SesionFacial.objects.count(), 3)
+
+    def test_facial_login_enqueues_attempt_without_writing(self):
+        from unittest import mock
+        from .audit import AuditWriter
+        writer = AuditWriter(background=False)
+        frame = _frame_b64(21)
+        user = Usuario.objects.create_user(
+            email='auditado@test.com', dni='33445566', nombres='N', apellidos='A', password='x'
+        )
+        datos = DatosFaciales(usuario=user, posiciones=[])
+        datos.establecer_embeddings([_compute_embedding_from_b64(frame)])
+        datos.save()
+        with mock.patch('login_facial.views.get_audit_writer', return_value=writer):
+            response = APIClient().post('/api/auth/facial-login/', {'facial_data': frame, 'dni': '33445566'},
+                                        format='json', HTTP_USER_AGENT='pruebas')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((writer.pending, SesionFacial.objects.count()), (1, 0))
+        writer.flush()
+        sesion = SesionFacial.objects.get()
+        self.assertEqual((sesion.usuario, sesion.resultado, sesion.user_agent), (user, 'exitoso', 'pruebas'))
+        self.assertEqual(sesion.detalles['modo'], '1:1')
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        from .authentication import get_user_cache
+        get_user_cache().invalidate()
+        self.user = Usuario.objects.create_user(
+            email='jwt@test.com', dni='55443322', nombres='J', apellidos='W', password='x'
+        )
+        self.access = get_tokens_for_user(self.user)['access']
+
+    def _authenticate(self):
+        from rest_framework.test import APIRequestFactory
+        from .authentication import CachedJWTAuthentication
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {self.access}')
+        return CachedJWTAuthentication().authenticate(request)[0]
+
+    def test_cached_user_skips_query_and_save_invalidates(self):
+        self.assertEqual(self._authenticate().rol, 'Analista')
+        with self.assertNumQueries(0):
+            cached = self._authenticate()
+        cached.rol = 'Administrador'  # copia por petición: no altera la caché
+        self.assertEqual(self._authenticate().rol, 'Analista')
+
+        self.user.rol, self.user.estado = 'Administrador', 'Inactivo'
+        self.user.save()
+        with self.assertNumQueries(1):
+            fresh = self._authenticate()
+        self.assertEqual((fresh.rol, fresh.estado), ('Administrador', 'Inactivo'))
+
+    def test_deleted_user_is_rejected(self):
+        from rest_framework.exceptions import AuthenticationFailed
+        self._authenticate()
+        self.user.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self._authenticate()
+
+
+class RolePermissionTests(TestCase):
+    def setUp(self):
+        self.user = Usuario.objects.create_user(
+            email='perm@test.com', dni='66778899', nombres='P', apellidos='R', password='x'
+        )
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {get_tokens_for_user(self.user)['access']}")
+
+    def test_profile_permissions_follow_role_table(self):
+        from .roles import PERMISSIONS, permissions_for
+        from .serializers import UserProfileSerializer
+        self.assertEqual(UserProfileSerializer(self.user).data['permissions'], ['view_dashboard', 'view_transactions'])
+        self.assertEqual(permissions_for('Administrador'), PERMISSIONS)
+        self.assertFalse(self.user.has_permission('manage_users'))
+
+    def test_batch_check_follows_role_changes(self):
+        url = '/api/auth/permissions/'
+        batch = self.client.post(url, {'permissions': ['view_dashboard', 'manage_users']}, format='json')
+        self.assertEqual(batch.data['permissions'], {'view_dashboard': True, 'manage_users': False})
+        self.assertTrue(self.client.post(url, {'permission': 'view_transactions'}, format='json').data['has_permission'])
+        self.assertEqual(self.client.post(url, {'permissions': ['borrar_todo']}, format='json').status_code, 400)
+        self.assertEqual(self.client.post(url, {}, format='json').status_code, 400)
+
+        # El token emitido como Analista sigue el rol actual del usuario
+        self.user.rol = 'Administrador'
+        self.user.save()
+        response = self.client.post(url, {'permission': 'manage_users'}, format='json')
+        self.assertEqual((response.data['has_permission'], response.data['user_role']), (True, 'Administrador'))
+
+
+class UsuarioKeysetPaginationTests(TestCase):
+    def setUp(self):
+        from django.utils import timezone
+        self.admin = Usuario.objects.create_user(
+            email='lista@test.com', dni='10000000', nombres='L', apellidos='A', password='x', rol='Administrador'
+        )
+        for i in range(1, 6):
+            Usuario.objects.create_user(
+                email=f'u{i}@test.com', dni=f'1000000{i}', nombres='U', apellidos=str(i), password='x',
+                estado='Inactivo' if i % 2 else 'Activo'
+            )
+        # Mismo created_at para todos: el desempate por id debe mantener el orden
+        Usuario.objects.update(created_at=timezone.now())
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_walks_all_pages_by_cursor_without_loading_passwords(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        seen, url = [], '/api/users/?mode=keyset&page_size=2&count=1'
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data['count'], 6)
+                seen += [u['id'] for u in response.data['results']]
+                url = response.data['next']
+        self.assertEqual(seen, sorted(Usuario.objects.values_list('id', flat=True)))
+        self.assertFalse(any('"password"' in q['sql'] for q in queries.captured_queries))
+
+    def test_filters_and_legacy_page_numbers(self):
+        inactivos = self.client.get('/api/users/', {'estado': 'Inactivo', 'mode': 'keyset'}).data
+        self.assertEqual(len(inactivos['results']), 3)
+        self.assertIsNone(inactivos['next'])
+        self.assertEqual(self.client.get('/api/users/', {'rol': 'Jefe'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/users/', {'cursor': 'basura'}).status_code, 404)
+        self.assertEqual(self.client.get('/api/users/', {'page': 1}).data['count'], 6)
+        # Sin parámetros se conserva el formato numérico de siempre
+        default = self.client.get('/api/users/').data
+        self.assertEqual(set(default), {'count', 'next', 'previous', 'results'})
+        self.assertEqual(default['count'], 6)
+
+    def test_count_cache_is_bounded(self):
+        from unittest import mock
+        from . import pagination
+        with mock.patch.object(pagination, 'COUNT_CACHE_SIZE', 3):
+            for i in range(6):
+                self.client.get('/api/users/', {'mode': 'keyset', 'count': '1', 'q': f'term{i}'})
+            self.assertEqual(len(pagination._counts), 3)
+
+
+class UsuarioSearchTests(TestCase):
+    def setUp(self):
+        self.admin = Usuario.objects.create_user(
+            email='maria.lopez@empresa.pe', dni='40123456', nombres='María José', apellidos='López Ruiz',
+            password='x', rol='Administrador'
+        )
+        Usuario.objects.create_user(
+            email='jperez@otra.pe', dni='70999888', nombres='Juan', apellidos='Pérez', password='x'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _emails(self, q):
+        return [u['email'] for u in self.client.get('/api/users/', {'q': q}).data['results']]
+
+    def test_substring_prefix_and_multi_term_queries(self):
+        from . import search
+        self.assertTrue(search.fts_available())
+        self.assertEqual(self._emails('lopez@emp'), ['maria.lopez@empresa.pe'])
+        self.assertEqual(self._emails('4012'), ['maria.lopez@empresa.pe'])
+        self.assertEqual(self._emails('juan PÉREZ'), ['jperez@otra.pe'])
+        self.assertEqual(self._emails('pe'), ['maria.lopez@empresa.pe', 'jperez@otra.pe'])  # corto: icontains
+        self.assertEqual(self._emails('"; DROP'), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        user = Usuario.objects.get(dni='70999888')
+        user.apellidos = 'Quispe'
+        user.save()
+        self.assertEqual(self._emails('Pérez'), [])
+        self.assertEqual(self._emails('quispe'), ['jperez@otra.pe'])
+        user.delete()
+        self.assertEqual(self._emails('quispe'), [])
+
+    def test_admin_uses_index(self):
+        from django.contrib.admin.sites import site
+        from django.test import RequestFactory
+        model_admin = site._registry[Usuario]
+        queryset, distinct = model_admin.get_search_results(RequestFactory().get('/'), Usuario.objects.all(), 'López Ru')
+        self.assertEqual((list(queryset), distinct), ([self.admin], False))
+
+
+class BulkImportTests(TestCase):
+    CSV = (
+        'dni,nombres,apellidos,email,rol,password\n'
+        '20000001,Ana,Díaz,ana@cliente.pe,Administrador,clave-1\n'
+        '20000002,Luis,Rojas,luis@cliente.pe,,\n'
+        '2000003,Mal,Dni,mal@cliente.pe,,\n'
+        '20000004,Dup,Email,ana@cliente.pe,,\n'
+        '20000005,Ya,Existe,existe@cliente.pe,Jefe,\n'
+    )
+
+    def setUp(self):
+        self.admin = Usuario.objects.create_user(
+            email='existe@cliente.pe', dni='20000009', nombres='E', apellidos='X', password='x', rol='Administrador'
+        )
+
+    def test_imports_valid_rows_and_reports_errors_by_line(self):
+        from .bulk_import import import_users
+        progress = []
+        report = import_users(io.StringIO(self.CSV), batch_size=2, workers=0, progress=progress.append)
+        self.assertEqual((report['total'], report['created'], report['failed']), (5, 2, 3))
+        self.assertEqual({e['line']: sorted(e['errors']) for e in report['errors']},
+                         {4: ['dni'], 5: ['email'], 6: ['rol']})
+        self.assertEqual(progress[-2:], [{'total': 5, 'created': 2, 'failed': 3}] * 2)
+        ana = Usuario.objects.get(dni='20000001')
+        self.assertTrue(ana.check_password('clave-1'))
+        self.assertEqual((ana.rol, ana.username), ('Administrador', 'ana@cliente.pe'))
+        self.assertFalse(Usuario.objects.get(dni='20000002').has_usable_password())
+        from .search import filter_queryset
+        self.assertEqual(list(filter_queryset(Usuario.objects.all(), 'Rojas')), [Usuario.objects.get(dni='20000002')])
+
+    def test_dry_run_skips_hashing_and_pool_is_shared(self):
+        from unittest import mock
+        from . import bulk_import
+        with mock.patch.object(bulk_import, 'make_password') as make_password:
+            report = bulk_import.import_users(io.StringIO(self.CSV), workers=0, dry_run=True)
+        make_password.assert_not_called()
+        self.assertEqual(report['created'], 2)
+        self.assertIs(bulk_import.get_hash_pool(1), bulk_import.get_hash_pool(1))
+        self.assertIsNone(bulk_import.get_hash_pool(0))
+
+    def test_endpoint_requires_manage_users_and_supports_dry_run(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        upload = SimpleUploadedFile('u.csv', self.CSV.encode('utf-8-sig'), content_type='text/csv')
+        response = client.post('/api/users/import/', {'file': upload, 'dry_run': 'true'}, format='multipart')
+        self.assertEqual((response.status_code, response.data['created'], response.data['dry_run']), (200, 2, True))
+        self.assertEqual(Usuario.objects.count(), 1)
+        bad = SimpleUploadedFile('u.csv', b'nombre,correo\nA,a@b.pe\n', content_type='text/csv')
+        self.assertEqual(client.post('/api/users/import/', {'file': bad}, format='multipart').status_code, 400)
+
+        with override_settings(USERS_IMPORT_MAX_ROWS=4):
+            upload.seek(0)
+            too_big = client.post('/api/users/import/', {'file': upload}, format='multipart')
+            self.assertEqual(too_big.status_code, 413)
+        self.assertEqual(Usuario.objects.count(), 1)
+
+        self.admin.rol = 'Analista'
+        self.admin.save()
+        upload.seek(0)
+        self.assertEqual(client.post('/api/users/import/', {'file': upload}, format='multipart').status_code, 403)
+
+
+class AdmissionControlTests(TestCase):
+    def _saturated(self, **kwargs):
+        from .admission import AdmissionPool
+        pool = AdmissionPool('hash', concurrency=1, **kwargs)
+        holder = pool.admit()
+        holder.__enter__()
+        return pool, holder
+
+    def test_queue_is_served_earliest_deadline_first(self):
+        import threading
+        import time
+        from .admission import request_started
+        pool, holder = self._saturated(max_queue=4, deadline=5.0)
+        order = []
+
+        def worker(name, started):
+            with request_started(started), pool.admit():
+                order.append(name)
+
+        now = time.monotonic()
+        late = threading.Thread(target=worker, args=('tarde', now))
+        early = threading.Thread(target=worker, args=('temprano', now - 2))  # llegó antes
+        late.start()
+        while pool.queued < 1:
+            time.sleep(0.001)
+        early.start()
+        while pool.queued < 2:
+            time.sleep(0.001)
+        holder.__exit__(None, None, None)
+        late.join()
+        early.join()
+        self.assertEqual(order, ['temprano', 'tarde'])
+        self.assertEqual((pool.active, pool.queued, pool.admitted), (0, 0, 3))
+
+    def test_rejects_when_queue_full_or_deadline_unreachable(self):
+        import asyncio
+        from .admission import AdmissionRejected
+        pool, holder = self._saturated(max_queue=0, deadline=5.0)
+        with self.assertRaises(AdmissionRejected) as ctx:
+            with pool.admit():
+                pass
+        self.assertEqual(ctx.exception.reason, 'queue_full')
+
+        pool, holder = self._saturated(max_queue=8, deadline=0.05)
+        with self.assertRaises(AdmissionRejected) as ctx:
+            with pool.admit():
+                pass
+        self.assertEqual(ctx.exception.reason, 'expired')
+        pool.service_time = 3.0  # espera estimada 3 s > plazo
+        with self.assertRaises(AdmissionRejected) as ctx:
+            with pool.admit():
+                pass
+        self.assertEqual((ctx.exception.reason, ctx.exception.retry_after), ('deadline', 3))
+
+        async def async_admit():
+            async with pool.aadmit():
+                return 'ok'
+        with self.assertRaises(AdmissionRejected):
+            asyncio.run(async_admit())
+        holder.__exit__(None, None, None)
+        self.assertEqual(asyncio.run(async_admit()), 'ok')
+        self.assertEqual(pool.rejected, {'queue_full': 0, 'deadline': 2, 'expired': 1})
+
+    def test_login_returns_429_with_retry_after(self):
+        from unittest import mock
+        pool, holder = self._saturated(max_queue=0, deadline=5.0)
+        pool.service_time = 1.5
+        with mock.patch('login_facial.admission.get_pool', return_value=pool):
+            response = APIClient().post('/api/auth/login/', {'email': 'a@b.pe', 'password': 'x'}, format='json')
+        self.assertEqual((response.status_code, response['Retry-After']), (429, '2'))
+        holder.__exit__(None, None, None)
+
+
+class AuditRollupTests(TestCase):
+    def setUp(self):
+        self.admin = Usuario.objects.create_user(
+            email='admin@test.com', dni='44556677', nombres='A', apellidos='D', password='x', rol='Administrador'
+        )
+
+    def _write(self):
+        from .audit import AuditWriter
+        writer = AuditWriter(batch_size=3, background=False)
+        for confianza in (0.95, 0.91, 0.42):
+            writer.enqueue(usuario=self.admin, resultado='exitoso', confianza=confianza)
+        writer.enqueue(resultado='fallido', detalles={'motivo': 'sin_coincidencia'})
+        writer.flush()
+
+    def test_flush_updates_rollups_and_rebuild_matches(self):
+        from .models import ResumenSesionFacial
+        from .rollups import reconstruir
+        self._write()
+        def snapshot():
+            return sorted(ResumenSesionFacial.objects.values_list('periodo', 'resultado', 'rol', 'total', 'hist_9'))
+        incremental = snapshot()
+        self.assertIn(('dia', 'exitoso', 'Administrador', 3, 2), incremental)
+        self.assertIn(('hora', 'fallido', '', 1, 0), incremental)
+        reconstruir()
+        self.assertEqual(snapshot(), incremental)
+
+    def test_trends_include_the_bucket_containing_desde(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .rollups import inicio_periodo, por_rol, tendencias
+        self._write()
+        ahora = timezone.now()
+        for periodo in ('hora', 'dia'):
+            inicio = inicio_periodo(ahora, periodo)
+            desde = inicio + timedelta(seconds=1)  # a mitad del primer periodo
+            serie = tendencias(periodo, desde, ahora + timedelta(minutes=1))
+            self.assertEqual([(p['inicio'], p['total']) for p in serie], [(inicio, 4)])
+        self.assertEqual(sum(r['total'] for r in por_rol(ahora, ahora + timedelta(minutes=1))), 4)
+
+    def test_trends_and_by_role_endpoints(self):
+        self._write()
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        trends = client.get('/api/audit/trends/', {'periodo': 'hora'})
+        self.assertEqual(trends.status_code, 200)
+        punto = trends.data['series'][-1]
+        self.assertEqual((punto['total'], punto['exitoso'], punto['fallido']), (4, 3, 1))
+        roles = {r['rol']: r for r in client.get('/api/audit/views-by-role/').data['roles']}
+        self.assertEqual(roles['Administrador']['histograma_confianza'][9], 2)
+        self.assertEqual(client.get('/api/audit/trends/', {'periodo': 'semana'}).status_code, 400)
+
+        analista = Usuario.objects.create_user(
+            email='analista@test.com', dni='77665544', nombres='A', apellidos='N', password='x', rol='Analista'
+        )
+        client.force_authenticate(analista)
+        self.assertEqual(client.get('/api/audit/trends/').status_code, 403)
+
+
+@override_settings(FACIAL_AUDIT_ENABLED=False)
+class FacialUploadTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.frame_b64 = _frame_b64(7)
+        self.frame_bytes = base64.b64decode(self.frame_b64.split(',')[1])
+        user = Usuario.objects.create_user(
+            email='upload@test.com', dni='11223344', nombres='N', apellidos='A', password='x'
+        )
+        datos = DatosFaciales(usuario=user, posiciones=[])
+        datos.establecer_embeddings([_compute_embedding_from_b64(self.frame_b64)])
+        datos.save()
+
+    def test_facial_login_accepts_json_multipart_and_octet_stream(self):
+        url = '/api/auth/facial-login/'
+        responses = [
+            self.client.post(url, {'facial_data': self.frame_b64}, format='json'),
+            self.client.post(url, {'facial_data': SimpleUploadedFile('f.jpg', self.frame_bytes)}, format='multipart'),
+            self.client.post(url, self.frame_bytes, content_type='application/octet-stream'),
+        ]
+        for response in responses:
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertEqual(response.data['user']['email'], 'upload@test.com')
+
+    @override_settings(FACIAL_MAX_UPLOAD_BYTES=1000)
+    def test_rejects_oversized_body_before_parsing(self):
+        response = self.client.post(
+            '/api/auth/facial-login/', self.frame_bytes, content_type='application/octet-stream'
+        )
+        self.assertEqual(response.status_code, 413)
+
+
+@override_settings(FACIAL_AUDIT_ENABLED=False)
+class FacialVerificationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.frame_b64 = _frame_b64(11)
+        for dni, seed in (('10000001', 11), ('10000002', 12)):
+            user = Usuario.objects.create_user(
+                email=f'{dni}@test.com', dni=dni, nombres='N', apellidos='A', password='x'
+            )
+            datos = DatosFaciales(usuario=user, posiciones=[])
+            datos.establecer_embeddings([_compute_embedding_from_b64(_frame_b64(seed))])
+            datos.save()
+
+    @override_settings(FACIAL_VERIFY_TOLERANCE=0.001)
+    def test_verifies_only_against_given_dni(self):
+        url = '/api/auth/facial-login/'
+        ok = self.client.post(url, {'facial_data': self.frame_b64, 'dni': '10000001'}, format='json')
+        self.assertEqual(ok.status_code, 200, ok.content)
+        self.assertEqual(ok.data['user']['dni'], '10000001')
+        other = self.client.post(url, {'facial_data': self.frame_b64, 'dni': '10000002'}, format='json')
+        self.assertEqual(other.status_code, 401)
+        unknown = self.client.post(url, {'facial_data': self.frame_b64, 'dni': '99999999'}, format='json')
+        self.assertEqual(unknown.status_code, 401)
+
+    def test_failed_attempts_loosen_verify_tolerance(self):
+        from login_facial.views import _match_tolerance
+
+        url = '/api/auth/facial-login/'
+        near = _frame_b64(12)
+        user = Usuario.objects.get(dni='10000001')
+        distance = np.linalg.norm(
+            user.datos_faciales.matriz_embeddings()[0] - _compute_embedding_from_b64(near)
+        )
+        # Base apenas por debajo de la distancia: 1 intento fallido (+0.03) alcanza
+        with self.settings(FACIAL_VERIFY_TOLERANCE=distance / _match_tolerance(1.0) - 0.01):
+            denied = self.client.post(url, {'facial_data': near, 'dni': '10000001'}, format='json')
+            self.assertEqual(denied.status_code, 401)
+            user.refresh_from_db()
+            self.assertEqual(user.failed_attempts, 1)
+            ok = self.client.post(url, {'facial_data': near, 'dni': '10000001'}, format='json')
+            self.assertEqual(ok.status_code, 200, ok.content)
+            self.assertEqual(ok.data['user']['dni'], '10000001')
+        user.refresh_from_db()
+        self.assertEqual(user.failed_attempts, 0)
+
+    def test_identification_skips_deactivated_users(self):
+        for url in ('/api/auth/facial-login/', '/api/auth/async/facial-login/'):
+            ok = self.client.post(url, {'facial_data': self.frame_b64}, format='json')
+            self.assertEqual(ok.status_code, 200, ok.content)
+            self.assertEqual(ok.json()['user']['dni'], '10000001')
+        # La galería ya cargada aún contiene al usuario: la búsqueda lo revalida
+        Usuario.objects.filter(dni='10000001').update(estado='Inactivo')
+        for url in ('/api/auth/facial-login/', '/api/auth/async/facial-login/'):
+            denied = self.client.post(url, {'facial_data': self.frame_b64}, format='json')
+            self.assertEqual(denied.status_code, 401, url)
+        get_gallery().invalidate()
+        self.assertNotIn(
+            Usuario.objects.get(dni='10000001').pk, get_gallery().snapshot().user_ids.tolist()
+        )
+        Usuario.objects.filter(dni='10000002').update(is_active=False)
+        denied = self.client.post('/api/auth/facial-login/', {'facial_data': self.frame_b64, 'dni': '10000002'},
+                                  format='json')
+        self.assertEqual(denied.status_code, 401)
+
+    @override_settings(FACIAL_IDENTIFICATION_ENABLED=False)
+    def test_identification_requires_opt_in(self):
+        response = self.client.post('/api/auth/facial-login/', {'facial_data': self.frame_b64}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('dni', response.data['errors'])
+
+
+
+@override_settings(FACIAL_AUDIT_ENABLED=False)
+class AsyncAuthViewTests(TestCase):
+    def setUp(self):
+        self.frame_b64 = _frame_b64(9)
+        self.user = Usuario.objects.create_user(
+            email='async@test.com', dni='55667788', nombres='N', apellidos='A', password='secreta123'
+        )
+
+    def test_async_password_login(self):
+        ok = self.client.post('/api/auth/async/login/', {'email': 'async@test.com', 'password': 'secreta123'},
+                              content_type='application/json')
+        self.assertEqual(ok.status_code, 200, ok.content)
+        self.assertIn('access', ok.json()['tokens'])
+        bad = self.client.post('/api/auth/async/login/', {'email': 'async@test.com', 'password': 'otra'},
+                               content_type='application/json')
+        self.assertEqual(bad.status_code, 400)
+        self.assertEqual(self.client.get('/api/auth/async/login/').status_code, 405)
+
+    def test_async_login_matches_sync_validation_and_signals(self):
+        from django.contrib.auth.signals import user_login_failed
+        failed = []
+
+        def receiver(sender, credentials, **kwargs):
+            failed.append(credentials['username'])
+
+        user_login_failed.connect(receiver)
+        self.addCleanup(user_login_failed.disconnect, receiver)
+        for url in ('/api/auth/login/', '/api/auth/async/login/'):
+            invalid = self.client.post(url, {'email': 'no-es-email', 'password': 'x'},
+                                       content_type='application/json')
+            self.assertEqual(invalid.status_code, 400)
+            self.assertIn('email', invalid.json()['errors'])
+            self.client.post(url, {'email': 'async@test.com', 'password': 'otra'}, content_type='application/json')
+        self.assertEqual(failed, ['async@test.com', 'async@test.com'])
+
+    def test_async_facial_register_then_login(self):
+        access = self.client.post('/api/auth/async/login/', {'email': 'async@test.com', 'password': 'secreta123'},
+                                  content_type='application/json').json()['tokens']['access']
+        self.assertEqual(self.client.post('/api/auth/async/facial-register/', {'facial_samples': [self.frame_b64]},
+                                          content_type='application/json').status_code, 401)
+        registered = self.client.post(
+            '/api/auth/async/facial-register/', {'facial_samples': [self.frame_b64]},
+            content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {access}'
+        )
+        self.assertEqual(registered.status_code, 200, registered.content)
+        self.assertEqual(registered.json()['samples_processed'], 1)
+
+        login = self.client.post('/api/auth/async/facial-login/', {'facial_data': self.frame_b64},
+                                 content_type='application/json')
+        self.assertEqual(login.status_code, 200, login.content)
+        self.assertEqual(login.json()['user']['email'], 'async@test.com')
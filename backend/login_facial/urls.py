@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = 'login_facial'
 
@@ -13,11 +13,24 @@ urlpatterns = [
     # Registro facial (solo post-login)
     path('auth/facial-register/', views.FacialRegisterView.as_view(), name='facial_register'),
     
+    # Variantes asíncronas para despliegues ASGI
+    path('auth/async/login/', async_views.login_async, name='login_async'),
+    path('auth/async/facial-login/', async_views.facial_login_async, name='facial_login_async'),
+    path('auth/async/facial-register/', async_views.facial_register_async, name='facial_register_async'),
+    
     # Gestión de usuarios (solo administradores)
     path('users/', views.UsuarioListCreateView.as_view(), name='user_list_create'),
+    path('users/import/', views.UsuarioImportView.as_view(), name='user_import'),
     path('users/<int:pk>/', views.UsuarioDetailView.as_view(), name='user_detail'),
     path('users/dni/<str:dni>/', views.usuario_by_dni, name='user_by_dni'),
     
+    # Auditoría (leída de los resúmenes por hora/día)
+    path('audit/trends/', views.AuditTrendsView.as_view(), name='audit_trends'),
+    path('audit/views-by-role/', views.AuditByRoleView.as_view(), name='audit_views_by_role'),
+    
     # Verificación de permisos
     path('auth/permissions/', views.PermissionCheckView.as_view(), name='permission_check'),
+    
+    # Métricas (Prometheus)
+    path('metrics/', views.metrics_view, name='metrics'),
 ]
\ No newline at end of file
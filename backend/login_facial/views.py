@@ -7,22 +7,44 @@ Las funciones internas (prefijo `_`) se diseñan para ser reutilizables desde
 vistas y pruebas, manteniendo firmas y umbrales de la implementación previa.
 """
 import base64
+import csv
 import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
 from typing import Optional
 from datetime import datetime, timedelta
+from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
 from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
 from rest_framework import status, generics, permissions
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.parsers import MultiPartParser
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from . import admission, metrics, roles, rollups, search
+from .admission import AdmissionRejected
+from .authentication import CachedJWTAuthentication
+from .bulk_import import ImportFormatError, count_lines, import_users
+from .audit import get_audit_writer
 from .models import Usuario, DatosFaciales, SesionFacial
+from .embedding_cache import content_key, get_embedding_cache
+from .gallery import NO_MATCH, Match, cached_collection, collection_for, get_gallery
+from .pagination import UsuarioKeysetPagination
+from .parsers import FacialImageParser, FacialJSONParser, FacialMultiPartParser
+from .embedding_service import (
+    EmbeddingServiceBusy, EmbeddingServiceTimeout, _embed_sample, get_embedding_service
+)
 from .serializers import (
     UsuarioSerializer, UsuarioCreateSerializer, LoginSerializer,
     FacialLoginSerializer, FacialRegisterSerializer, DatosFacialesSerializer,
@@ -48,101 +70,431 @@ except Exception:  # pragma: no cover
 # Utilidades de embeddings
 # -----------------------------
 
-def _compute_embedding_from_b64(b64_str) -> Optional['np.ndarray']:
-    """Genera un embedding facial (np.ndarray float32) desde un frame base64.
+@contextmanager
+def _stage(timings, name):
+    """Acumula en `timings[name]` los milisegundos del bloque (si `timings`)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + (time.perf_counter() - started) * 1000
 
-    - Si `face_recognition` está disponible: produce un vector de 128 dims.
-    - Fallback sin `face_recognition`: vector normalizado del recorte central.
-    - Retorna `None` si no se puede decodificar o no hay rostro.
+
+def _detection_config(scale=None, max_side=None):
+    """Parámetros de la pirámide de detección: `(escala, lado_máximo)`.
+
+    - `FACIAL_DETECTION_SCALE`: 1 (resolución completa), 2, 4 u 8 para
+      decodificar con `cv2.IMREAD_REDUCED_COLOR_N`.
+    - `FACIAL_DETECTION_MAX_SIDE`: lado máximo de la imagen de detección
+      (0 sin límite); se reduce con `INTER_AREA`.
     """
-    log = logging.getLogger('facial')
-    if not b64_str:
-        log.debug('compute_embedding: b64_str vacío')
+    if scale is None:
+        scale = getattr(settings, 'FACIAL_DETECTION_SCALE', 1)
+    if max_side is None:
+        max_side = getattr(settings, 'FACIAL_DETECTION_MAX_SIDE', 0)
+    return int(scale), int(max_side)
+
+
+def _frame_bytes(frame_data):
+    """Bytes JPEG/PNG de un frame base64 (con o sin prefijo data URL) o binario.
+
+    Los datos binarios se retornan tal cual, sin copiarlos.
+    """
+    if frame_data is None or len(frame_data) == 0:
+        logging.getLogger('facial').debug('compute_embedding: frame vacío')
+        return None
+    if isinstance(frame_data, (bytes, bytearray, memoryview)):
+        return frame_data
+    header, encoded = frame_data.split(',') if ',' in frame_data else ('', frame_data)
+    return base64.b64decode(encoded)
+
+
+def _frame_buffer(frame_data) -> Optional['np.ndarray']:
+    """Bytes JPEG/PNG de un frame como arreglo `uint8` (ver `_frame_bytes`).
+
+    Se envuelven con `np.frombuffer` sin copiarlos.
+    """
+    if np is None or cv2 is None:
+        logging.getLogger('facial').debug('compute_embedding: numpy/cv2 no disponible')
+        return None
+    raw = _frame_bytes(frame_data)
+    if raw is None:
+        return None
+    return np.frombuffer(raw, dtype=np.uint8)
+
+
+def _decode_frame(frame_data) -> Optional['np.ndarray']:
+    """Decodifica un frame (base64 o bytes, ver `_frame_buffer`) a BGR."""
+    image = _frame_buffer(frame_data)
+    if image is None:
+        return None
+    frame = cv2.imdecode(image, cv2.IMREAD_COLOR)
+    if frame is None:
+        logging.getLogger('facial').debug('compute_embedding: cv2.imdecode devolvió None')
+    return frame
+
+
+def _detection_image(buffer, frame, scale=1, max_side=0):
+    """Imagen reducida para detectar y factor para volver a resolución completa.
+
+    Retorna `(imagen, factor)`; con `scale == 1` y sin `max_side` es el propio
+    frame con factor 1.
+    """
+    small = frame
+    if scale in (2, 4, 8):
+        flag = getattr(cv2, f'IMREAD_REDUCED_COLOR_{scale}')
+        reduced = cv2.imdecode(buffer, flag)
+        if reduced is not None:
+            small = reduced
+    if max_side and max(small.shape[:2]) > max_side:
+        ratio = max_side / max(small.shape[:2])
+        size = (max(1, round(small.shape[1] * ratio)), max(1, round(small.shape[0] * ratio)))
+        small = cv2.resize(small, size, interpolation=cv2.INTER_AREA)
+    return small, frame.shape[1] / small.shape[1]
+
+
+def _box_hint_location(face_box, shape):
+    """Convierte la caja normalizada del cliente en `(top, right, bottom, left)`.
+
+    La caja `{x, y, width, height}` (0-1 sobre el frame) se amplía con
+    `FACIAL_BOX_HINT_PADDING` por lado y se recorta al frame. Retorna `None`
+    si es inverosímil: lado menor que `FACIAL_BOX_HINT_MIN_SIDE` del frame,
+    proporción fuera de 1:2-2:1 o fuera del frame.
+    """
+    if not face_box:
+        return None
+    try:
+        x, y, bw, bh = (float(face_box[k]) for k in ('x', 'y', 'width', 'height'))
+    except (KeyError, TypeError, ValueError):
         return None
-    if np is None:
-        log.debug('compute_embedding: numpy no disponible')
+    h, w = shape[:2]
+    px_w, px_h = bw * w, bh * h
+    min_side = float(getattr(settings, 'FACIAL_BOX_HINT_MIN_SIDE', 0.1)) * min(h, w)
+    if px_w <= 0 or px_h <= 0 or min(px_w, px_h) < min_side:
         return None
+    if not 0.5 <= px_w / px_h <= 2.0:
+        return None
+    if x < 0 or y < 0 or x + bw > 1.02 or y + bh > 1.02:
+        return None
+    pad = float(getattr(settings, 'FACIAL_BOX_HINT_PADDING', 0.1))
+    top = max(int(round(y * h - pad * px_h)), 0)
+    left = max(int(round(x * w - pad * px_w)), 0)
+    bottom = min(int(round((y + bh) * h + pad * px_h)), h)
+    right = min(int(round((x + bw) * w + pad * px_w)), w)
+    return top, right, bottom, left
+
+
+def _locate_face(frame, detect_image=None, factor=1.0, timings=None, hint=None):
+    """Localiza el rostro y retorna `(recorte, ubicación_en_recorte)`.
+
+    - Con `face_recognition` y `hint` (caja en píxeles del frame completo):
+      se omite la detección en servidor.
+    - Con `face_recognition` sin `hint`: HOG sobre `detect_image` (o el frame
+      completo); la caja se escala por `factor` al frame completo. El recorte RGB a
+      resolución completa incluye un margen de media caja por lado para que
+      los landmarks del encoder queden dentro. La ubicación es
+      `(top, right, bottom, left)`.
+    - Fallback: recorte central BGR de 200x200 y ubicación `None`.
+    - Retorna `(None, None)` si no hay rostro.
+    """
+    log = logging.getLogger('facial')
+    if face_recognition is not None:
+        if hint is not None:
+            boxes, factor = [hint], 1.0
+        else:
+            det = frame if detect_image is None else detect_image
+            with _stage(timings, 'detect'):
+                boxes = face_recognition.face_locations(det[:, :, ::-1], model='hog')
+            log.debug(f'compute_embedding: boxes={len(boxes)}')
+        if not boxes:
+            return None, None
+        h, w = frame.shape[:2]
+        top, right, bottom, left = (int(round(v * factor)) for v in boxes[0])
+        top, left = max(top, 0), max(left, 0)
+        bottom, right = min(bottom, h), min(right, w)
+        pad_y, pad_x = (bottom - top) // 2, (right - left) // 2
+        y0, x0 = max(top - pad_y, 0), max(left - pad_x, 0)
+        y1, x1 = min(bottom + pad_y, h), min(right + pad_x, w)
+        crop = np.ascontiguousarray(frame[y0:y1, x0:x1, ::-1])
+        return crop, (top - y0, right - x0, bottom - y0, left - x0)
+    # Fallback: recorte central como "huella" simple
+    h, w = frame.shape[:2]
+    cx, cy = w // 2, h // 2
+    crop = frame[max(cy-100, 0):cy+100, max(cx-100, 0):cx+100]
+    if crop.size == 0:
+        log.debug('compute_embedding: crop vacío en fallback')
+        return None, None
+    return crop, None
+
+
+def _encode_faces(crops) -> list:
+    """Codifica los recortes de `_locate_face`, cada uno por separado.
+
+    `face_encodings` procesa los rostros de a uno aunque reciba varios, así que
+    cada recorte se codifica solo: los landmarks no pueden invadir otro
+    recorte y un fallo afecta únicamente a su muestra. Retorna una lista
+    alineada con `crops` (`None` donde no hubo encoding).
+    """
+    if not crops:
+        return []
+    if face_recognition is not None:
+        embeddings = []
+        for crop, location in crops:
+            encs = face_recognition.face_encodings(crop, [location])
+            logging.getLogger('facial').debug(f'compute_embedding: encs={len(encs)}')
+            embeddings.append(np.array(encs[0], dtype=np.float32) if len(encs) == 1 else None)
+        return embeddings
+    embeddings = []
+    for crop, _ in crops:
+        emb = cv2.resize(crop, (16, 16)).astype('float32').reshape(-1)
+        embeddings.append(emb / (np.linalg.norm(emb) + 1e-6))
+    return embeddings
+
+
+def _detect_sample(frame_data, timings=None, scale=None, max_side=None, face_box=None):
+    """Etapa de decodificación + detección: `(recorte, ubicación, error)`.
+
+    `error` es `None`, `'decode_error'` o `'no_face'`. Si se pasa `timings`
+    acumula los ms de las etapas `decode`, `downscale` y `detect`. Una
+    `face_box` verosímil del cliente reemplaza la detección en servidor.
+    """
     try:
-        header, encoded = b64_str.split(',') if ',' in b64_str else ('', b64_str)
-        img_bytes = base64.b64decode(encoded)
-        image = np.frombuffer(img_bytes, dtype=np.uint8)
-        frame = cv2.imdecode(image, cv2.IMREAD_COLOR) if cv2 is not None else None
+        scale, max_side = _detection_config(scale, max_side)
+        with _stage(timings, 'decode'):
+            buffer = _frame_buffer(frame_data)
+            frame = cv2.imdecode(buffer, cv2.IMREAD_COLOR) if buffer is not None else None
         if frame is None:
-            log.debug('compute_embedding: cv2.imdecode devolvió None')
+            return None, None, 'decode_error'
+        if face_recognition is not None and face_box:
+            hint = _box_hint_location(face_box, frame.shape)
+            if hint is not None:
+                crop, location = _locate_face(frame, hint=hint)
+                return crop, location, None
+            logging.getLogger('facial').debug('detect_sample: face_box inverosímil, detección completa')
+        detect_image, factor = None, 1.0
+        if face_recognition is not None and (scale > 1 or max_side):
+            with _stage(timings, 'downscale'):
+                detect_image, factor = _detection_image(buffer, frame, scale, max_side)
+        crop, location = _locate_face(frame, detect_image, factor, timings)
+        if crop is None:
+            return None, None, 'no_face'
+        return crop, location, None
+    except Exception as e:
+        logging.getLogger('facial').exception(f'detect_sample: excepción {e}')
+        return None, None, 'decode_error'
+
+
+def _compute_embedding_from_b64(b64_str, timings=None, scale=None, max_side=None,
+                                face_box=None) -> Optional['np.ndarray']:
+    """Genera un embedding facial (np.ndarray float32) desde un frame base64 o binario.
+
+    - Si `face_recognition` está disponible: produce un vector de 128 dims.
+    - Fallback sin `face_recognition`: vector normalizado del recorte central.
+    - Retorna `None` si no se puede decodificar o no hay rostro.
+    - `timings` (dict opcional) recibe los ms por etapa, incluido `encode`.
+    - `face_box` (opcional): caja normalizada del cliente, ver `_box_hint_location`.
+    """
+    try:
+        crop, location, error = _detect_sample(b64_str, timings, scale, max_side, face_box)
+        if error:
             return None
-        if face_recognition is not None:
-            rgb = frame[:, :, ::-1]
-            boxes = face_recognition.face_locations(rgb, model='hog')
-            log.debug(f'compute_embedding: boxes={len(boxes)}')
-            if not boxes:
-                return None
-            encs = face_recognition.face_encodings(rgb, boxes)
-            log.debug(f'compute_embedding: encs={len(encs)}')
-            if not encs:
-                return None
-            return np.array(encs[0], dtype=np.float32)
-        else:
-            # Fallback: promedio de píxeles del recorte central como "huella" simple
-            h, w = frame.shape[:2]
-            cx, cy = w // 2, h // 2
-            crop = frame[max(cy-100, 0):cy+100, max(cx-100, 0):cx+100]
-            if crop.size == 0:
-                log.debug('compute_embedding: crop vacío en fallback')
-                return None
-            emb = cv2.resize(crop, (16, 16)).astype('float32').reshape(-1)
-            emb = emb / (np.linalg.norm(emb) + 1e-6)
-            return emb
+        with _stage(timings, 'encode'):
+            return _encode_faces([(crop, location)])[0]
     except Exception as e:
         logging.getLogger('facial').exception(f'compute_embedding: excepción {e}')
         return None
 
 
+_sample_executor = None
+
+
+def _get_sample_executor() -> ThreadPoolExecutor:
+    """Pool de hilos compartido para decodificar/detectar muestras en paralelo."""
+    global _sample_executor
+    if _sample_executor is None:
+        _sample_executor = ThreadPoolExecutor(
+            max_workers=int(getattr(settings, 'FACIAL_REGISTER_THREADS', 4)),
+            thread_name_prefix='facial-sample',
+        )
+    return _sample_executor
+
+
+def _compute_embeddings_batch(samples, face_boxes=None):
+    """Calcula los embeddings de varias muestras de registro.
+
+    Con el pool de procesos habilitado cada muestra se detecta y codifica
+    completa en un worker (sin exceder sus cupos libres); si no, se decodifican
+    y detectan de forma concurrente en un pool de hilos y luego se codifican
+    los rostros detectados. `face_boxes` (opcional) aporta una caja del
+    cliente por muestra.
+
+    Retorna `(embeddings, fallos)`: `embeddings` alineada con `samples`
+    (`None` en las fallidas) y `fallos` como `[{'index', 'error'}]`.
+    Propaga `EmbeddingServiceBusy`/`EmbeddingServiceTimeout` del pool.
+    """
+    boxes = face_boxes or [None] * len(samples)
+    service = get_embedding_service()
+    if service is not None:
+        results = service.map(_embed_sample, list(zip(samples, boxes)))
+        embeddings = [emb for emb, _ in results]
+        failures = [{'index': i, 'error': error} for i, (_, error) in enumerate(results) if error]
+        return embeddings, failures
+
+    detected = list(_get_sample_executor().map(
+        lambda args: _detect_sample(args[0], face_box=args[1]), zip(samples, boxes)
+    ))
+    failures = [
+        {'index': i, 'error': error}
+        for i, (_, _, error) in enumerate(detected) if error
+    ]
+    ok = [i for i, (_, _, error) in enumerate(detected) if not error]
+    embeddings = [None] * len(samples)
+    try:
+        encoded = _encode_faces([detected[i][:2] for i in ok])
+    except Exception as e:
+        logging.getLogger('facial').exception(f'compute_embeddings_batch: excepción {e}')
+        encoded = [None] * len(ok)
+    for i, emb in zip(ok, encoded):
+        if emb is None:
+            failures.append({'index': i, 'error': 'encode_error'})
+        embeddings[i] = emb
+    failures.sort(key=lambda f: f['index'])
+    return embeddings, failures
+
+
+def _embedding_cache_key(raw, face_box=None) -> bytes:
+    """Clave de caché del frame: contenido + parámetros que alteran el resultado."""
+    box = tuple(round(float(face_box[k]), 4) for k in ('x', 'y', 'width', 'height')) if face_box else None
+    return content_key(raw, _detection_config(), box)
+
+
+def _compute_embedding_uncached(frame_data, timings=None, face_box=None) -> Optional['np.ndarray']:
+    service = get_embedding_service()
+    with admission.admit('face', timings):
+        if service is None:
+            embedding = _compute_embedding_from_b64(frame_data, timings, face_box=face_box)
+        else:
+            embedding, stages = service.compute(frame_data, face_box)
+            if timings is not None:
+                timings.update(stages)
+    if embedding is not None:
+        embedding.setflags(write=False)  # compartido vía caché
+    return embedding
+
+
+def _compute_embedding(frame_data, timings=None, face_box=None) -> Optional['np.ndarray']:
+    """Calcula el embedding en el pool de procesos si está habilitado.
+
+    Sin pool (`FACIAL_EMBEDDING_WORKERS = 0`) se calcula en el hilo actual.
+    Los resultados (incluido "sin rostro") se guardan en la caché por hash de
+    contenido y los frames idénticos concurrentes comparten un solo cómputo.
+    Propaga `EmbeddingServiceBusy`/`EmbeddingServiceTimeout` del pool y
+    `AdmissionRejected` si no hay cupo de CPU a tiempo (ver `admission`).
+    `timings` (dict opcional) recibe los ms por etapa del pipeline.
+    """
+    try:
+        raw = _frame_bytes(frame_data)
+    except Exception as e:
+        logging.getLogger('facial').debug(f'compute_embedding: base64 inválido ({e})')
+        return None
+    if raw is None:
+        return None
+    cache = get_embedding_cache()
+    if cache is None:
+        return _compute_embedding_uncached(raw, timings, face_box)
+    return cache.get_or_compute(
+        _embedding_cache_key(raw, face_box),
+        lambda: _compute_embedding_uncached(raw, timings, face_box),
+    )
+
+
+def _admission_rejected_response(exc: AdmissionRejected) -> Response:
+    """429 con `Retry-After` para trabajo rechazado por el control de admisión."""
+    response = Response({
+        'success': False,
+        'message': f'Servidor ocupado, reintente en {exc.retry_after} s'
+    }, status=status.HTTP_429_TOO_MANY_REQUESTS)
+    response['Retry-After'] = str(exc.retry_after)
+    return response
+
+
+def _embedding_unavailable_response(exc) -> Response:
+    """Respuesta para frames rechazados o vencidos en el pool de embeddings."""
+    if isinstance(exc, AdmissionRejected):
+        return _admission_rejected_response(exc)
+    if isinstance(exc, EmbeddingServiceBusy):
+        response = Response({
+            'success': False,
+            'message': 'Servicio de reconocimiento facial saturado, reintente'
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        response['Retry-After'] = '1'
+        return response
+    return Response({
+        'success': False,
+        'message': 'Tiempo de procesamiento facial excedido'
+    }, status=status.HTTP_504_GATEWAY_TIMEOUT)
+
+
+@lru_cache(maxsize=1024)
+def _stored_unit_vector(stored_bytes: bytes):
+    """Embedding almacenado normalizado (cacheado por contenido del blob)."""
+    stored = np.frombuffer(stored_bytes, dtype=np.float32)
+    unit = stored / (np.linalg.norm(stored) + 1e-6)
+    unit.setflags(write=False)
+    return unit
+
+
 def _compare_embeddings(stored_bytes: bytes, live_emb) -> bool:
     """Compara un embedding almacenado (bytes) con uno vivo (`np.ndarray`).
 
     - Con `face_recognition`: distancia euclidiana en primeras 128 dims (<0.6).
-    - Fallback: similitud de coseno (>0.9).
+    - Fallback: similitud de coseno (>0.9); la norma del almacenado se cachea.
     """
     if stored_bytes is None or live_emb is None or np is None:
         return False
     try:
-        stored = np.frombuffer(stored_bytes, dtype=np.float32)
-        if face_recognition is not None and stored.shape[0] in (128, 129):
+        if face_recognition is not None and len(stored_bytes) // 4 in (128, 129):
+            stored = np.frombuffer(stored_bytes, dtype=np.float32)
             dist = np.linalg.norm(stored[:128] - live_emb[:128])
             return dist < 0.6
         else:
-            num = float(np.dot(stored, live_emb))
-            den = (np.linalg.norm(stored) * np.linalg.norm(live_emb) + 1e-6)
-            sim = num / den
+            live = np.asarray(live_emb, dtype=np.float32)
+            sim = float(_stored_unit_vector(bytes(stored_bytes)) @ live) / (np.linalg.norm(live) + 1e-6)
             return sim > 0.9
     except Exception:
         return False
 
+
+def _collection_threshold(user, base: float = 0.45) -> float:
+    """Umbral `base` (0.45) relajado 0.03 por intento fallido, hasta `base + 0.10`."""
+    attempts = getattr(user, 'failed_attempts', 0) or 0
+    return min(base + attempts * 0.03, base + 0.10)
+
+
+def _match_collection(user, live_emb) -> Match:
+    """Distancia mínima, índice y margen del embedding vivo frente a la
+    colección del usuario (primeras 128 dims), en una sola operación."""
+    embeddings = getattr(user, 'facial_embeddings', None)
+    if live_emb is None or not embeddings:
+        return NO_MATCH
+    return collection_for(user, embeddings, dims=128).nearest(live_emb)
+
+
 def _compare_to_collection(user, live_emb) -> bool:
     """Compara el embedding vivo con la colección registrada del usuario.
 
     - Si no hay colección, usa `_compare_embeddings` sobre `user.facial_data`.
-    - Umbral base 0.45 adaptado por intentos fallidos hasta 0.55.
+    - La colección se apila una vez por usuario (`gallery.collection_for`) y
+      se resuelve con `_match_collection`; encima se aplica el umbral
+      adaptativo de `_collection_threshold`.
     """
     try:
         if live_emb is None:
             return False
-        if np is None:
-            return _compare_embeddings(getattr(user, 'facial_data', None), live_emb)
-        if not getattr(user, 'facial_embeddings', None):
+        if np is None or not getattr(user, 'facial_embeddings', None):
             return _compare_embeddings(getattr(user, 'facial_data', None), live_emb)
-
-        base_thr = 0.45
-        attempts = getattr(user, 'failed_attempts', 0) or 0
-        thr = min(base_thr + attempts * 0.03, 0.55)
-
-        live = np.array(live_emb, dtype=np.float32)
-        for emb_list in getattr(user, 'facial_embeddings'):
-            stored = np.array(emb_list, dtype=np.float32)
-            dist = float(np.linalg.norm(stored[:128] - live[:128]))
-            if dist < thr:
-                return True
-        return False
+        return _match_collection(user, live_emb).distance < _collection_threshold(user)
     except Exception:
         return False
 
@@ -165,6 +517,99 @@ def _compare_faces(known_encoding, face_encoding, tolerance=0.6):
         return False, 1.0
 
 
+def _match_tolerance(tolerance=0.6) -> float:
+    """Distancia euclidiana máxima aceptada, coherente con `_compare_faces`."""
+    if FACE_RECOGNITION_AVAILABLE and face_recognition is not None:
+        return tolerance
+    return tolerance * 100  # Modo simulado
+
+
+def _identification_enabled() -> bool:
+    """Si se permite el login facial 1:N sin DNI ni user_id."""
+    return bool(getattr(settings, 'FACIAL_IDENTIFICATION_ENABLED', False))
+
+
+def _active_users():
+    """Usuarios que pueden iniciar sesión: la misma regla para 1:1 y 1:N."""
+    return Usuario.objects.filter(is_active=True, estado='Activo')
+
+
+def _verify_user(live_emb, dni=None, user_id=None):
+    """Verificación 1:1: compara solo contra la colección del usuario indicado.
+
+    Retorna `(usuario, distancia)`; `usuario` es `None` si no existe, está
+    inactivo, no tiene datos faciales o la distancia mínima supera
+    `FACIAL_VERIFY_TOLERANCE` (más estricta que la tolerancia 1:N) relajada
+    según `failed_attempts` (`_collection_threshold`). Los fallos incrementan
+    `failed_attempts` y un acierto lo reinicia.
+
+    La colección del usuario se apila y cachea por registro facial
+    (`gallery.cached_collection`) y se resuelve en un producto matriz-vector.
+    """
+    lookup = {'dni': dni} if dni else {'pk': user_id}
+    user = (
+        _active_users().filter(**lookup)
+        .select_related('datos_faciales')
+        .first()
+    )
+    datos = getattr(user, 'datos_faciales', None) if user is not None else None
+    if datos is None or not datos.activo or not datos.embeddings_blob:
+        return None, float('inf')
+
+    collection = cached_collection((datos.pk, datos.fecha_actualizacion), datos.matriz_embeddings)
+    match = collection.nearest(live_emb)
+    if match.index < 0:
+        return None, float('inf')
+    base = float(getattr(settings, 'FACIAL_VERIFY_TOLERANCE', 0.5))
+    if match.distance > _match_tolerance(_collection_threshold(user, base)):
+        Usuario.objects.filter(pk=user.pk).update(failed_attempts=F('failed_attempts') + 1)
+        return None, match.distance
+    if user.failed_attempts:
+        Usuario.objects.filter(pk=user.pk).update(failed_attempts=0)
+        user.failed_attempts = 0
+    return user, match.distance
+
+
+def _audit_attempt(request, resultado, usuario=None, confianza=None, **detalles):
+    """Encola el intento facial en la auditoría diferida (no toca la BD).
+
+    `detalles` solo conserva valores no nulos y distancias finitas.
+    """
+    writer = get_audit_writer()
+    if writer is None:
+        return
+    detalles = {
+        k: v for k, v in detalles.items()
+        if v is not None and not (isinstance(v, float) and not math.isfinite(v))
+    }
+    writer.enqueue(
+        usuario_id=getattr(usuario, 'pk', None),
+        resultado=resultado,
+        confianza=confianza,
+        ip_address=request.META.get('REMOTE_ADDR') or None,
+        user_agent=request.META.get('HTTP_USER_AGENT', '')[:512],
+        timestamp=timezone.now(),
+        detalles=detalles or None,
+    )
+
+
+def _save_facial_data(user, embeddings):
+    """Reemplaza la colección facial del usuario y lo marca como registrado."""
+    with transaction.atomic():
+        # Eliminar datos faciales anteriores
+        DatosFaciales.objects.filter(usuario=user).delete()
+        
+        # Crear nuevos datos faciales (colección de muestras)
+        datos_faciales = DatosFaciales(usuario=user, posiciones=[], activo=True)
+        datos_faciales.establecer_embeddings(embeddings)
+        datos_faciales.save()
+        
+        # Marcar usuario como registrado facialmente
+        user.face_registered = True
+        user.save()
+    return datos_faciales
+
+
 def get_tokens_for_user(user):
     """Genera tokens JWT para un usuario"""
     refresh = RefreshToken.for_user(user)
@@ -174,22 +619,59 @@ def get_tokens_for_user(user):
     }
 
 
-class LoginView(APIView):
+class _InstrumentedView:
+    """Mixin para `APIView`: registra la duración total y el código de respuesta.
+
+    Las vistas acumulan etapas adicionales en `self.timings` con `_stage`;
+    todo se publica en `metrics` bajo `metrics_endpoint`.
+    """
+    metrics_endpoint = ''
+
+    def dispatch(self, request, *args, **kwargs):
+        self.timings = {}
+        started = time.perf_counter()
+        with admission.request_started():
+            response = super().dispatch(request, *args, **kwargs)
+        self.timings['total'] = (time.perf_counter() - started) * 1000
+        endpoint = self.metrics_endpoint or type(self).__name__
+        metrics.record_timings(endpoint, self.timings)
+        metrics.count_request(endpoint, response.status_code)
+        return response
+
+
+def metrics_view(request):
+    """Métricas en formato de texto de Prometheus (solo `METRICS_ALLOWED_IPS`)."""
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', ('127.0.0.1', '::1'))
+    if request.META.get('REMOTE_ADDR') not in allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+class LoginView(_InstrumentedView, APIView):
     """Vista para login tradicional con email y contraseña"""
     permission_classes = [permissions.AllowAny]
     authentication_classes: list = []
+    metrics_endpoint = 'login'
     
     def post(self, request):
         serializer = LoginSerializer(data=request.data)
-        if serializer.is_valid():
+        try:
+            with admission.admit('hash', self.timings), _stage(self.timings, 'authenticate'):
+                valid = serializer.is_valid()
+        except AdmissionRejected as exc:
+            return _admission_rejected_response(exc)
+        if valid:
             user = serializer.validated_data['user']
-            tokens = get_tokens_for_user(user)
+            with _stage(self.timings, 'jwt'):
+                tokens = get_tokens_for_user(user)
+            with _stage(self.timings, 'serialize'):
+                user_data = UserProfileSerializer(user).data
             
             return Response({
                 'success': True,
                 'message': 'Login exitoso',
                 'tokens': tokens,
-                'user': UserProfileSerializer(user).data
+                'user': user_data
             })
         
         return Response({
@@ -198,10 +680,13 @@ class LoginView(APIView):
         }, status=status.HTTP_400_BAD_REQUEST)
 
 
-class FacialLoginView(APIView):
-    """Vista para login facial"""
+class FacialLoginView(_InstrumentedView, APIView):
+    """Vista para login facial (frame en base64, multipart u octet-stream)"""
     permission_classes = [permissions.AllowAny]
     authentication_classes: list = []
+    parser_classes = [FacialJSONParser, FacialMultiPartParser, FacialImageParser]
+    raw_upload_field = 'facial_data'
+    metrics_endpoint = 'facial_login'
     
     def post(self, request):
         serializer = FacialLoginSerializer(data=request.data)
@@ -212,52 +697,87 @@ class FacialLoginView(APIView):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         facial_data = serializer.validated_data['facial_data']
+        face_box = serializer.validated_data.get('face_box')
+        dni = serializer.validated_data.get('dni')
+        user_id = serializer.validated_data.get('user_id')
+        if not (dni or user_id) and not _identification_enabled():
+            return Response({
+                'success': False,
+                'errors': {'dni': ['Se requiere DNI o user_id para el login facial']}
+            }, status=status.HTTP_400_BAD_REQUEST)
         
         # Generar embedding de la imagen recibida
-        face_encoding = _compute_embedding_from_b64(facial_data)
+        timings = self.timings
+        modo = '1:1' if (dni or user_id) else '1:N'
+        try:
+            face_encoding = _compute_embedding(facial_data, timings, face_box)
+        except (AdmissionRejected, EmbeddingServiceBusy, EmbeddingServiceTimeout) as exc:
+            _audit_attempt(request, 'error', modo=modo, dni=dni, user_id=user_id, motivo=type(exc).__name__)
+            return _embedding_unavailable_response(exc)
+        logging.getLogger('facial').debug(
+            'facial_login: etapas ' + ', '.join(f'{k}={v:.1f}ms' for k, v in timings.items())
+        )
         if face_encoding is None:
+            _audit_attempt(request, 'fallido', modo=modo, dni=dni, user_id=user_id, motivo='sin_rostro')
             return Response({
                 'success': False,
                 'message': 'No se pudo procesar la imagen facial'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Buscar coincidencias en la base de datos
+        # Verificación 1:1 si se indicó el usuario; si no, búsqueda 1:N en la
+        # galería vectorizada
         best_match = None
         best_distance = float('inf')
         
         try:
-            for datos_faciales in DatosFaciales.objects.filter(activo=True):
-                if datos_faciales.embedding is not None:
-                    matches, distance = _compare_faces(datos_faciales.embedding, face_encoding)
-                    
-                    if matches and distance < best_distance:
-                        best_match = datos_faciales.usuario
-                        best_distance = distance
+            with _stage(timings, 'match'):
+                if dni or user_id:
+                    best_match, best_distance = _verify_user(face_encoding, dni=dni, user_id=user_id)
+                else:
+                    match_id, best_distance = get_gallery().identify(face_encoding, _match_tolerance())
+                    if match_id is not None:
+                        # La galería puede ser anterior a una desactivación: se revalida
+                        best_match = _active_users().filter(pk=match_id).first()
         except Exception:
-            pass
+            logging.getLogger('facial').exception('facial_login: error al consultar la galería')
+            _audit_attempt(request, 'error', modo=modo, dni=dni, user_id=user_id, motivo='galeria')
+            return Response({
+                'success': False,
+                'message': 'No se encontró coincidencia facial'
+            }, status=status.HTTP_401_UNAUTHORIZED)
         
         if best_match:
             confianza = max(0, 1 - best_distance)  # Convertir distancia a confianza
-            tokens = get_tokens_for_user(best_match)
+            with _stage(timings, 'jwt'):
+                tokens = get_tokens_for_user(best_match)
+            with _stage(timings, 'serialize'):
+                user_data = UserProfileSerializer(best_match).data
+            _audit_attempt(request, 'exitoso', best_match, confianza, modo=modo, distancia=best_distance)
             
             return Response({
                 'success': True,
                 'message': 'Login facial exitoso',
                 'tokens': tokens,
-                'user': UserProfileSerializer(best_match).data,
+                'user': user_data,
                 'confidence': confianza
             })
         else:
+            _audit_attempt(request, 'fallido', modo=modo, dni=dni, user_id=user_id,
+                           motivo='sin_coincidencia', distancia=best_distance)
             return Response({
                 'success': False,
                 'message': 'No se encontró coincidencia facial'
             }, status=status.HTTP_401_UNAUTHORIZED)
 
 
-class FacialRegisterView(APIView):
+class FacialRegisterView(_InstrumentedView, APIView):
     """Vista para registro facial (solo usuarios autenticados)"""
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [FacialJSONParser, FacialMultiPartParser, FacialImageParser]
+    raw_upload_field = 'facial_samples'
+    raw_upload_many = True
+    metrics_endpoint = 'facial_register'
     
     def post(self, request):
         serializer = FacialRegisterSerializer(data=request.data)
@@ -270,51 +790,32 @@ class FacialRegisterView(APIView):
         facial_samples = serializer.validated_data['facial_samples']
         user = request.user
         
-        # Procesar muestras faciales
-        embeddings = []
-        for sample in facial_samples:
-            embedding = _compute_embedding_from_b64(sample)
-            if embedding is not None:
-                embeddings.append(embedding)
+        # Procesar muestras faciales (detección concurrente + encoding en lote)
+        try:
+            with admission.admit('face', self.timings), _stage(self.timings, 'embeddings'):
+                embeddings, failed_samples = _compute_embeddings_batch(
+                    facial_samples, serializer.validated_data.get('face_boxes')
+                )
+        except (AdmissionRejected, EmbeddingServiceBusy, EmbeddingServiceTimeout) as exc:
+            return _embedding_unavailable_response(exc)
+        embeddings = [emb for emb in embeddings if emb is not None]
         
         if not embeddings:
             return Response({
                 'success': False,
-                'message': 'No se pudieron procesar las muestras faciales'
+                'message': 'No se pudieron procesar las muestras faciales',
+                'failed_samples': failed_samples
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Calcular embedding promedio
-        if np is not None:
-            avg_embedding = np.mean(embeddings, axis=0)
-        else:
-            avg_embedding = embeddings[0]
-        
         try:
-            with transaction.atomic():
-                # Eliminar datos faciales anteriores
-                try:
-                    DatosFaciales.objects.filter(usuario=user).delete()
-                except Exception:
-                    pass
-                
-                # Crear nuevos datos faciales
-                datos_faciales = DatosFaciales.objects.create(
-                    usuario=user,
-                    embedding=avg_embedding,
-                    num_muestras=len(embeddings),
-                    activo=True
-                )
-                
-                # Marcar usuario como registrado facialmente
-                user.face_registered = True
-                user.save()
-                
-                return Response({
-                    'success': True,
-                    'message': 'Registro facial completado exitosamente',
-                    'samples_processed': len(embeddings)
-                })
-                
+            with _stage(self.timings, 'save'):
+                _save_facial_data(user, embeddings)
+            return Response({
+                'success': True,
+                'message': 'Registro facial completado exitosamente',
+                'samples_processed': len(embeddings),
+                'failed_samples': failed_samples
+            })
         except Exception as e:
             return Response({
                 'success': False,
@@ -338,7 +839,7 @@ class FacialRegisterView(APIView):
 
 class LogoutView(APIView):
     """Vista para logout"""
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request):
@@ -359,19 +860,21 @@ class LogoutView(APIView):
             }, status=status.HTTP_400_BAD_REQUEST)
 
 
-class UserProfileView(APIView):
+class UserProfileView(_InstrumentedView, APIView):
     """Vista para obtener perfil del usuario actual"""
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
+    metrics_endpoint = 'me'
     
     def get(self, request):
-        serializer = UserProfileSerializer(request.user)
-        return Response(serializer.data)
+        with _stage(self.timings, 'serialize'):
+            data = UserProfileSerializer(request.user).data
+        return Response(data)
 
 
 class PermissionCheckView(APIView):
     """Vista para verificar permisos del usuario"""
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request):
@@ -382,21 +885,47 @@ class PermissionCheckView(APIView):
                 'errors': serializer.errors
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        permission = serializer.validated_data['permission']
-        has_permission = getattr(request.user, 'has_permission', lambda x: False)(permission)
+        user_role = getattr(request.user, 'rol', 'usuario')
+        mask = roles.mask_for(user_role)
+        if 'permissions' in serializer.validated_data:
+            return Response({
+                'permissions': {perm: roles.mask_has(mask, perm) for perm in serializer.validated_data['permissions']},
+                'user_role': user_role
+            })
         
+        permission = serializer.validated_data['permission']
         return Response({
-            'has_permission': has_permission,
+            'has_permission': roles.mask_has(mask, permission),
             'permission': permission,
-            'user_role': getattr(request.user, 'rol', 'usuario')
+            'user_role': user_role
         })
 
 
-class UsuarioListCreateView(generics.ListCreateAPIView):
+class UsuarioListCreateView(_InstrumentedView, generics.ListCreateAPIView):
     """Vista para listar y crear usuarios"""
     queryset = Usuario.objects.all()
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = UsuarioKeysetPagination
+    metrics_endpoint = 'users'
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method != 'GET':
+            return queryset
+        # Solo las columnas serializadas (sin hash de contraseña ni campos de auth)
+        queryset = queryset.only(*(f for f in UsuarioSerializer.Meta.fields if f != 'nombre_completo'))
+        errors = {}
+        for field, choices in (('rol', Usuario.ROLES), ('estado', Usuario.ESTADOS)):
+            value = self.request.query_params.get(field)
+            if value is None:
+                continue
+            if value not in dict(choices):
+                errors[field] = [f'Valor inválido. Válidos: {[c for c, _ in choices]}']
+            queryset = queryset.filter(**{field: value})
+        if errors:
+            raise ValidationError(errors)
+        return search.filter_queryset(queryset, self.request.query_params.get('q'))
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -410,11 +939,46 @@ class UsuarioListCreateView(generics.ListCreateAPIView):
         serializer.save()
 
 
+class UsuarioImportView(_InstrumentedView, APIView):
+    """Importación masiva de usuarios desde un CSV (campo `file`, multipart)"""
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser]
+    metrics_endpoint = 'users_import'
+    
+    def post(self, request):
+        if not getattr(request.user, 'has_permission', lambda x: False)('manage_users'):
+            raise PermissionDenied("No tiene permisos para importar usuarios")
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({
+                'success': False,
+                'errors': {'file': ['Adjunte un archivo CSV en el campo "file"']}
+            }, status=status.HTTP_400_BAD_REQUEST)
+        # Se importa dentro de la petición: los archivos grandes van por el comando
+        max_rows = int(getattr(settings, 'USERS_IMPORT_MAX_ROWS', 5000))
+        if count_lines(upload) - 1 > max_rows:
+            return Response({
+                'success': False,
+                'errors': {'file': [f'Máximo {max_rows} filas por importación; '
+                                    'para archivos mayores use "manage.py import_users"']}
+            }, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true')
+        try:
+            report = import_users(upload.file, dry_run=dry_run)
+        except (ImportFormatError, UnicodeDecodeError, csv.Error) as exc:
+            return Response({
+                'success': False,
+                'errors': {'file': [str(exc)]}
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'success': True, **report})
+
+
 class UsuarioDetailView(generics.RetrieveUpdateDestroyAPIView):
     """Vista para detalle, actualización y eliminación de usuarios"""
     queryset = Usuario.objects.all()
     serializer_class = UsuarioSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     
     def perform_update(self, serializer):
@@ -430,6 +994,47 @@ class UsuarioDetailView(generics.RetrieveUpdateDestroyAPIView):
         instance.delete()
 
 
+class _AuditView(APIView):
+    """Base de los endpoints de auditoría (requiere `view_configuration`)."""
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def _rango(self, request, periodo):
+        if not getattr(request.user, 'has_permission', lambda x: False)('view_configuration'):
+            raise PermissionDenied("No tiene permisos para ver la auditoría")
+        try:
+            desde = rollups.parse_fecha(request.query_params.get('desde'))
+            hasta = rollups.parse_fecha(request.query_params.get('hasta'))
+        except ValueError:
+            raise ValidationError({'fecha': ['Use formato ISO (AAAA-MM-DD o AAAA-MM-DDTHH:MM)']})
+        return rollups.rango_por_defecto(periodo, desde, hasta)
+
+
+class AuditTrendsView(_AuditView):
+    """Series de intentos faciales por hora o día, desde los resúmenes"""
+    
+    def get(self, request):
+        periodo = request.query_params.get('periodo', 'dia')
+        if periodo not in rollups.PERIODOS:
+            raise ValidationError({'periodo': ['Use "hora" o "dia"']})
+        desde, hasta = self._rango(request, periodo)
+        usuario = request.query_params.get('usuario')
+        serie = rollups.tendencias(
+            periodo, desde, hasta,
+            usuario_id=int(usuario) if usuario and usuario.isdigit() else None,
+            rol=request.query_params.get('rol'),
+        )
+        return Response({'periodo': periodo, 'desde': desde, 'hasta': hasta, 'series': serie})
+
+
+class AuditByRoleView(_AuditView):
+    """Intentos faciales agregados por rol, desde los resúmenes diarios"""
+    
+    def get(self, request):
+        desde, hasta = self._rango(request, 'dia')
+        return Response({'desde': desde, 'hasta': hasta, 'roles': rollups.por_rol(desde, hasta)})
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def usuario_by_dni(request, dni):